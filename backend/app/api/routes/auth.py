@@ -10,14 +10,15 @@ import uuid
 from datetime import datetime
 
 from app.core.csrf import validate_csrf_token
-from app.core.mfa import is_mfa_enabled, verify_totp, verify_backup_code
+from app.core.login import login
 
 from app.core.limiter import ip_login_limiter, ip_register_limiter, ip_refresh_token_limiter
 
 from app.core.auth import (
-    authenticate_user, create_access_token, get_password_hash, verify_password,
+    create_access_token, get_password_hash, verify_password,
     ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, Token, get_current_active_user,
-    create_refresh_token, get_refresh_token, revoke_refresh_token, revoke_all_user_tokens, RefreshToken
+    create_refresh_token, rotate_refresh_token, revoke_refresh_token, revoke_all_user_tokens, RefreshToken,
+    invalidate_user, get_user_by_id, refresh_token_store
 )
 from app.db.mongo import mongodb
 from app.models.user import UserCreate, UserInDB, UserResponse, UserProfileUpdate
@@ -51,7 +52,7 @@ async def register_user(user_data: UserCreate, request: Request) -> Any:
             )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     user_in_db = UserInDB(
         **user_data.dict(exclude={"password"}),
         hashed_password=hashed_password
@@ -76,60 +77,24 @@ async def login_for_access_token(
     OAuth2 compatible token login, get an access token for future requests.
     Sets HttpOnly cookies for both access and refresh tokens.
     """
-    user = await authenticate_user(form_data.username, form_data.password)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Check if MFA is enabled for this user
-    mfa_enabled = await is_mfa_enabled(user.id)
-    
-    # If MFA is enabled, verify the code
-    if mfa_enabled:
-        # If no MFA code provided, return a special response indicating MFA is required
-        if not mfa_code:
-            return {
-                "detail": "MFA verification required",
-                "mfa_required": True,
-                "username": user.username
-            }
-        
-        # Verify the MFA code
-        if not await verify_totp(user.mfa_secret, mfa_code) and not await verify_backup_code(user.id, mfa_code):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid MFA code",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    
-    # Update last login time
-    users_collection = mongodb.get_collection("users")
-    await users_collection.update_one(
-        {"username": user.username},
-        {"$set": {"last_login": user.dict()["created_at"]}}
-    )
-    
-    # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username, "user_id": user.id},
-        expires_delta=access_token_expires
-    )
-    
-    # Get client info for the refresh token
-    user_agent = request.headers.get("user-agent", "")
-    client_host = request.client.host if request.client else ""
-    
-    # Create refresh token
-    refresh_token_obj = await create_refresh_token(
-        user_id=user.id,
-        username=user.username,
-        user_agent=user_agent,
-        ip_address=client_host
+    result = await login(
+        form_data.username,
+        form_data.password,
+        mfa_code=mfa_code,
+        user_agent=request.headers.get("user-agent", ""),
+        ip_address=request.client.host if request.client else ""
     )
+    user = result.user
+    
+    # If MFA is enabled and no code was provided, tell the client to ask for one
+    if result.mfa_required:
+        return {
+            "detail": "MFA verification required",
+            "mfa_required": True,
+            "username": user.username
+        }
+    access_token = result.access_token
+    refresh_token_obj = result.refresh_token
     
     # Set cookies
     response.set_cookie(
@@ -187,9 +152,13 @@ async def refresh_access_token(response: Response, request: Request) -> Any:
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Validate refresh token
-    token_obj = await get_refresh_token(refresh_token)
-    if not token_obj or token_obj.revoked:
+    # Exchange the refresh token for a new one; a used or revoked token is rejected
+    new_refresh_token = await rotate_refresh_token(
+        refresh_token,
+        user_agent=request.headers.get("user-agent", ""),
+        ip_address=request.client.host if request.client else ""
+    )
+    if not new_refresh_token:
         # Clear invalid cookies
         response.delete_cookie(key="access_token", path="/")
         response.delete_cookie(key="refresh_token", path="/")
@@ -200,37 +169,19 @@ async def refresh_access_token(response: Response, request: Request) -> Any:
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Check if token is expired
-    if token_obj.expires_at < datetime.utcnow():
-        # Revoke expired token
-        await revoke_refresh_token(refresh_token)
-        
-        # Clear expired cookies
-        response.delete_cookie(key="access_token", path="/")
-        response.delete_cookie(key="refresh_token", path="/")
-        
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Refresh token expired",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
     # Get user
-    users_collection = mongodb.get_collection("users")
-    user_dict = await users_collection.find_one({"_id": token_obj.user_id})
-    if not user_dict:
+    user = await get_user_by_id(new_refresh_token.user_id)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = UserInDB(**user_dict)
-    
     # Create new access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username, "user_id": user.id},
+        data={"sub": user.username, "user_id": user.id, "ver": user.token_version},
         expires_delta=access_token_expires
     )
     
@@ -246,9 +197,21 @@ async def refresh_access_token(response: Response, request: Request) -> Any:
         path="/"
     )
     
-    # Return the new access token
+    response.set_cookie(
+        key="refresh_token",
+        value=new_refresh_token.token,
+        httponly=True,
+        max_age=REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
+        expires=REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
+        samesite="lax",
+        secure=True,  # Set to False in development if not using HTTPS
+        path="/"
+    )
+    
+    # Return the new tokens
     return {
         "access_token": access_token,
+        "refresh_token": new_refresh_token.token,
         "token_type": "bearer",
         "user_id": user.id,
         "username": user.username,
@@ -292,14 +255,7 @@ async def get_active_sessions(current_user: UserInDB = Depends(get_current_activ
     """
     Get all active sessions for the current user.
     """
-    refresh_tokens_collection = mongodb.get_collection("refresh_tokens")
-    cursor = refresh_tokens_collection.find(
-        {"user_id": current_user.id, "revoked": False},
-        {"_id": 0, "token": 0}  # Exclude sensitive fields
-    )
-    
-    sessions = await cursor.to_list(length=100)
-    return sessions
+    return await refresh_token_store.list_sessions(current_user.id, limit=100)
 
 @router.put("/auth/me", response_model=UserResponse, dependencies=[Depends(validate_csrf_token)])
 async def update_user_profile(profile_data: UserProfileUpdate, current_user: UserInDB = Depends(get_current_active_user)) -> Any:
@@ -312,7 +268,7 @@ async def update_user_profile(profile_data: UserProfileUpdate, current_user: Use
     # Handle email update
     if profile_data.email and profile_data.email != current_user.email:
         # Check if email is already used by another user
-        existing_email = await users_collection.find_one({"email": profile_data.email, "_id": {"$ne": current_user.id}})
+        existing_email = await users_collection.find_one({"email": profile_data.email, "id": {"$ne": current_user.id}})
         if existing_email:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -333,23 +289,24 @@ async def update_user_profile(profile_data: UserProfileUpdate, current_user: Use
                 detail="Current password is required to change password"
             )
             
-        if not verify_password(profile_data.current_password, current_user.hashed_password):
+        if not await verify_password(profile_data.current_password, current_user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Incorrect current password"
             )
             
-        update_data["hashed_password"] = get_password_hash(profile_data.password)
+        update_data["hashed_password"] = await get_password_hash(profile_data.password)
     
     # Update user in database if there are changes
     if update_data:
         await users_collection.update_one(
-            {"_id": current_user.id},
+            {"id": current_user.id},
             {"$set": update_data}
         )
+        invalidate_user(current_user.id)
         
         # Get updated user data
-        updated_user = await users_collection.find_one({"_id": current_user.id})
+        updated_user = await users_collection.find_one({"id": current_user.id})
         if not updated_user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Path, HTTPException, Depends, BackgroundTasks
-from typing import List, Dict, Any
+from fastapi import APIRouter, Path, Query, HTTPException, Depends, BackgroundTasks, Request, Response
+from typing import List, Dict, Any, Optional
 from app.db.mongo import mongodb
-from app.db.qdrant import qdrant_db
+from app.db.qdrant import qdrant
+from app.db.text_store import text_store
 from app.core.utils import S3Storage
-from app.models.document import DocumentResponse, DocumentUpdate
+from app.models.document import DocumentResponse, DocumentUpdate, DocumentSearchResponse, DocumentSearchResult
 from app.tasks.document_processing import reprocess_document
 from app.core.auth import get_current_active_user
+from app.core.recommendations import user_centroids
+from app.core.counters import citation_counter
+from app.core.cache import etag_matches
+from app.core.config import settings
+from app.core.document_cache import document_cache
 from app.models.user import UserInDB
 import logging
 
@@ -23,25 +29,81 @@ class DocumentStatusResponse(BaseModel):
 
 @router.get("/document/{doc_id}", response_model=DocumentResponse)
 async def get_document(
+    request: Request,
+    response: Response,
     doc_id: str = Path(..., description="Document ID")
 ):
     """
     Retrieve a document by its ID.
     This endpoint can be accessed without authentication.
+    Responses carry an ETag; a matching If-None-Match gets 304 Not Modified.
     """
-    documents_collection = mongodb.get_collection("documents")
-    document = await documents_collection.find_one({"id": doc_id})
+    entry = await document_cache.get(doc_id)
+    if entry is None:
+        generation = await document_cache.generation(doc_id)
+        documents_collection = mongodb.get_collection("documents")
+        document = await documents_collection.find_one({"id": doc_id}, max_time_ms=settings.MONGODB_MAX_TIME_MS)
+        
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        entry = await document_cache.set(doc_id, document, generation)
     
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    # Count the citation; buffered and flushed to MongoDB in the background
+    citation_counter.increment(doc_id)
     
-    # Increment AI citation count
-    await documents_collection.update_one(
-        {"id": doc_id},
-        {"$inc": {"ai_citation_count": 1}}
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": f"public, max-age={settings.DOCUMENT_CACHE_MAX_AGE}"
+    }
+    if etag_matches(request.headers.get("If-None-Match"), entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return entry["document"]
+
+@router.get("/document/{doc_id}/similar", response_model=DocumentSearchResponse)
+async def get_similar_documents(
+    doc_id: str = Path(..., description="Document ID"),
+    limit: int = Query(10, ge=1, le=100, description="Maximum number of results to return"),
+    tags: Optional[List[str]] = Query(None, description="Only return documents with any of these tags"),
+    user_id: Optional[str] = Query(None, description="Only return documents of this user"),
+    min_score: Optional[float] = Query(None, description="Minimum similarity score"),
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Find documents similar to a document ("more like this").
+    Searches with the document's stored vector, so no embedding is computed.
+    """
+    search_results = await qdrant.recommend_similar(
+        doc_id, limit=limit, tags=tags, user_id=user_id, score_threshold=min_score
     )
+    if search_results is None:
+        raise HTTPException(status_code=404, detail="Document not found or not yet embedded")
     
-    return document
+    # Retrieve documents from MongoDB, keeping the ranking of the search results
+    doc_ids = [str(result.id) for result in search_results]
+    documents_collection = mongodb.get_collection("documents", read_preference=settings.MONGODB_SEARCH_READ_PREFERENCE)
+    documents = await documents_collection.find(
+        {"id": {"$in": doc_ids}}, max_time_ms=settings.MONGODB_MAX_TIME_MS
+    ).to_list(length=len(doc_ids))
+    documents_by_id = {document["id"]: document for document in documents}
+    
+    results = []
+    for result in search_results:
+        document = documents_by_id.get(str(result.id))
+        if not document:
+            continue
+        results.append(DocumentSearchResult(
+            id=document["id"],
+            title=document["title"],
+            summary=document.get("summary") or "",
+            url=f"/document/{document['id']}",
+            embedding_similarity=result.score,
+            tags=document.get("tags", []),
+            ai_citation_count=document.get("ai_citation_count", 0),
+            trust_score=document.get("trust_score", 0.0)
+        ))
+    
+    return DocumentSearchResponse(results=results)
 
 @router.put("/document/{doc_id}", response_model=DocumentResponse)
 async def update_document(
@@ -71,6 +133,7 @@ async def update_document(
             {"id": doc_id},
             {"$set": update_data}
         )
+        await document_cache.invalidate(doc_id)
     
     # Get updated document
     updated_document = await documents_collection.find_one({"id": doc_id})
@@ -86,7 +149,9 @@ async def get_document_status(
     Returns the current status (pending, processing, completed, failed) and any error message.
     """
     documents_collection = mongodb.get_collection("documents")
-    document = await documents_collection.find_one({"id": doc_id}, {"id": 1, "processing_status": 1, "processing_error": 1})
+    document = await documents_collection.find_one(
+        {"id": doc_id}, {"id": 1, "processing_status": 1, "processing_error": 1}, max_time_ms=settings.MONGODB_MAX_TIME_MS
+    )
     
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -101,11 +166,13 @@ async def get_document_status(
 async def reprocess_document_endpoint(
     background_tasks: BackgroundTasks,
     doc_id: str = Path(..., description="Document ID"),
+    force: bool = Query(False, description="Rerun every stage, even those that are up to date"),
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """
     Reprocess a document to update its summary, tags, and embeddings.
     This is useful if the document processing failed or if you want to update the document with new AI models.
+    Only stages whose content or model version changed are rerun unless `force` is set.
     """
     documents_collection = mongodb.get_collection("documents")
     
@@ -124,9 +191,10 @@ async def reprocess_document_endpoint(
         {"id": doc_id},
         {"$set": {"processing_status": "pending", "processing_error": None}}
     )
+    await document_cache.invalidate(doc_id)
     
     # Queue document for reprocessing
-    background_tasks.add_task(reprocess_document, doc_id)
+    background_tasks.add_task(reprocess_document, doc_id, force)
     
     return {
         "message": "Document queued for reprocessing",
@@ -141,8 +209,8 @@ async def delete_document(
 ):
     """
     Delete a document by its ID.
-    This will delete the document metadata from MongoDB, the document vector from Qdrant,
-    and the document file from S3 if it exists.
+    This will delete the document metadata from MongoDB, its stored full text, the document
+    vector from Qdrant, and the document file from S3 if it exists.
     """
     documents_collection = mongodb.get_collection("documents")
     
@@ -165,29 +233,36 @@ async def delete_document(
     # 1. Delete document from MongoDB
     try:
         await documents_collection.delete_one({"id": doc_id})
+        await document_cache.invalidate(doc_id)
         deletion_results["mongodb"] = True
         logger.info(f"Successfully deleted document {doc_id} from MongoDB")
     except Exception as e:
         logger.error(f"Failed to delete document {doc_id} from MongoDB: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to delete document from database: {str(e)}")
     
-    # 2. Delete vector from Qdrant
+    # 2. Delete the full text if no other document shares it
     try:
-        # Get Qdrant client
-        qdrant_client = qdrant_db.connect_to_qdrant()
-        
-        # Delete the vector by its ID (which is the same as the document ID)
-        await qdrant_client.delete(
-            collection_name=qdrant_db.collection_name,
-            points_selector=[doc_id]
-        )
-        deletion_results["qdrant"] = True
-        logger.info(f"Successfully deleted document vector {doc_id} from Qdrant")
+        await text_store.release(existing_document.get("content_hash"))
+    except Exception as e:
+        logger.error(f"Failed to delete full text for document {doc_id}: {e}")
+    
+    # 3. Delete vector from Qdrant and take it out of the owner's centroid
+    try:
+        # The vector ID is the same as the document ID
+        vector = (await qdrant.get_vectors([doc_id])).get(doc_id)
+        if await qdrant.delete_vector(doc_id):
+            deletion_results["qdrant"] = True
+            logger.info(f"Successfully deleted document vector {doc_id} from Qdrant")
+            if vector is not None:
+                await user_centroids.update(existing_document.get("user_id"), removed=[vector])
+        else:
+            logger.error(f"Failed to delete document vector {doc_id} from Qdrant")
     except Exception as e:
         logger.error(f"Failed to delete document vector {doc_id} from Qdrant: {e}")
         # Continue with deletion process even if Qdrant deletion fails
+    user_centroids.invalidate(existing_document.get("user_id"))
     
-    # 3. Delete file from S3 if it exists
+    # 4. Delete file from S3 if it exists
     if "s3_url" in existing_document and existing_document["s3_url"]:
         try:
             s3_storage = S3Storage()
@@ -0,0 +1,25 @@
+"""
+Operational metrics routes for BlueWhale.
+"""
+from fastapi import APIRouter, Depends
+from typing import Any
+
+from app.core.auth import get_current_admin_user, password_hasher
+from app.core.counters import citation_counter
+from app.core.llm_client import llm_client
+from app.db.mongo import mongodb
+from app.models.user import UserInDB
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def get_metrics(current_user: UserInDB = Depends(get_current_admin_user)) -> Any:
+    """
+    Get in-process operational metrics for this worker.
+    """
+    return {
+        "llm_providers": llm_client.scheduler.get_metrics(),
+        "citation_counter": citation_counter.get_metrics(),
+        "mongodb_pool": mongodb.get_pool_metrics(),
+        "password_hashing": password_hasher.get_metrics()
+    }
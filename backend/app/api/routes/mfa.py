@@ -49,7 +49,7 @@ async def enable_mfa_route(
     
     # Get updated user
     users_collection = mongodb.get_collection("users")
-    user_data = await users_collection.find_one({"_id": current_user.id})
+    user_data = await users_collection.find_one({"id": current_user.id})
     
     return UserResponse(**UserInDB(**user_data).dict())
 
@@ -78,7 +78,7 @@ async def disable_mfa_route(
     
     # Get updated user
     users_collection = mongodb.get_collection("users")
-    user_data = await users_collection.find_one({"_id": current_user.id})
+    user_data = await users_collection.find_one({"id": current_user.id})
     
     return UserResponse(**UserInDB(**user_data).dict())
 
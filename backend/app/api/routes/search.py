@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Query, HTTPException, Depends
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
+from app.core.config import settings
+from app.core.dedup import collapse_clusters
 from app.core.llm_client import llm_client
 from app.db.mongo import mongodb
 from app.db.qdrant import qdrant
@@ -10,34 +12,51 @@ import json
 
 router = APIRouter()
 
+async def _search_documents(q: str, limit: int, collapse_duplicates: bool) -> List[Tuple[Any, dict]]:
+    """
+    Run a vector search and join the hits with their MongoDB documents, best first.
+    With collapse_duplicates, only the best hit of each near-duplicate cluster is kept.
+    """
+    # Generate embedding for the query
+    query_vector = await llm_client.get_query_embedding(q)
+    
+    # Search for similar vectors in Qdrant, over-fetching when clusters get collapsed
+    fetch_limit = limit * settings.DEDUP_COLLAPSE_OVERFETCH if collapse_duplicates else limit
+    search_results = await qdrant.search_vectors(query_vector, limit=fetch_limit)
+    if collapse_duplicates:
+        search_results = collapse_clusters(
+            search_results, key=lambda result: (result.payload or {}).get("cluster_id") or str(result.id), limit=limit
+        )
+    
+    # Retrieve documents from MongoDB, keeping the ranking of the search results
+    doc_ids = [str(result.id) for result in search_results]
+    documents_collection = mongodb.get_collection("documents", read_preference=settings.MONGODB_SEARCH_READ_PREFERENCE)
+    documents = await documents_collection.find(
+        {"id": {"$in": doc_ids}}, max_time_ms=settings.MONGODB_MAX_TIME_MS
+    ).to_list(length=len(doc_ids))
+    documents_by_id = {document["id"]: document for document in documents}
+    
+    return [
+        (result, documents_by_id[str(result.id)])
+        for result in search_results
+        if str(result.id) in documents_by_id
+    ]
+
 @router.get("/search", response_model=DocumentSearchResponse)
 async def search_documents(
     q: str = Query(..., description="Search query"),
     limit: int = Query(10, description="Maximum number of results to return"),
     format: str = Query("json", description="Response format: json, markdown, or jsonld"),
+    collapse_duplicates: bool = Query(False, description="Return only the best match of each near-duplicate cluster"),
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """
     Search for documents using vector similarity.
     Returns documents that are semantically similar to the query.
     """
-    # Generate embedding for the query
-    query_embeddings = await llm_client.get_embeddings([q])
-    query_vector = query_embeddings[0]
-    
-    # Search for similar vectors in Qdrant
-    search_results = await qdrant.search_vectors(query_vector, limit=limit)
-    
-    # Get document IDs from search results
-    doc_ids = [result.id for result in search_results]
-    
-    # Retrieve documents from MongoDB
-    documents_collection = mongodb.get_collection("documents")
-    documents = await documents_collection.find({"id": {"$in": doc_ids}}).to_list(length=limit)
-    
     # Map documents to search results
     results = []
-    for result, document in zip(search_results, documents):
+    for result, document in await _search_documents(q, limit, collapse_duplicates):
         doc_result = DocumentSearchResult(
             id=document["id"],
             title=document["title"],
@@ -69,29 +88,16 @@ async def vector_search(
     q: str = Query(..., description="Search query"),
     format: str = Query("json", description="Response format: json, markdown, or jsonld"),
     limit: int = Query(10, description="Maximum number of results to return"),
+    collapse_duplicates: bool = Query(False, description="Return only the best match of each near-duplicate cluster"),
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """
     LLM-friendly API for vector search.
     Returns documents in the specified format (json, markdown, or jsonld).
     """
-    # Generate embedding for the query
-    query_embeddings = await llm_client.get_embeddings([q])
-    query_vector = query_embeddings[0]
-    
-    # Search for similar vectors in Qdrant
-    search_results = await qdrant.search_vectors(query_vector, limit=limit)
-    
-    # Get document IDs from search results
-    doc_ids = [result.id for result in search_results]
-    
-    # Retrieve documents from MongoDB
-    documents_collection = mongodb.get_collection("documents")
-    documents = await documents_collection.find({"id": {"$in": doc_ids}}).to_list(length=limit)
-    
     # Map documents to search results based on format
     results = []
-    for result, document in zip(search_results, documents):
+    for result, document in await _search_documents(q, limit, collapse_duplicates):
         doc_result = DocumentSearchResult(
             id=document["id"],
             title=document["title"],
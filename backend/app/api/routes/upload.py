@@ -9,6 +9,7 @@ from app.db.mongo import mongodb
 from app.db.qdrant import qdrant
 from app.models.document import DocumentCreate, DocumentInDB, DocumentResponse
 from app.tasks.document_processing import process_document
+from app.core.recommendations import user_centroids
 from app.core.auth import get_current_active_user
 from app.models.user import UserInDB
 
@@ -79,6 +80,7 @@ async def upload_document(
         # Store initial document in MongoDB
         documents_collection = mongodb.get_collection("documents")
         await documents_collection.insert_one(document.dict())
+        user_centroids.invalidate(current_user.id)
         
         # Queue document for async processing
         background_tasks.add_task(
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, Path, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, Path, Query, HTTPException, Depends, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import json
+from app.core.auth import invalidate_user
+from app.core.config import settings
+from app.core.pagination import KEYSET_SORT, encode_cursor, keyset_filter
+from app.core.recommendations import user_centroids
 from app.db.mongo import mongodb
 from app.models.user import UserCreate, UserResponse, UserUpdate, UserRecommendation
+from app.models.document import DocumentInDB
 
 router = APIRouter()
 
@@ -34,7 +42,7 @@ async def get_user(
     Retrieve a user by their ID.
     """
     users_collection = mongodb.get_collection("users")
-    user = await users_collection.find_one({"id": user_id})
+    user = await users_collection.find_one({"id": user_id}, max_time_ms=settings.MONGODB_MAX_TIME_MS)
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -64,35 +72,75 @@ async def update_user(
             {"id": user_id},
             {"$set": update_data}
         )
+        invalidate_user(user_id)
     
     # Get updated user
     updated_user = await users_collection.find_one({"id": user_id})
     return updated_user
 
+# Fields returned by document list views unless others are requested
+LIST_FIELDS = ["id", "title", "summary", "tags", "file_type", "created_at", "processing_status", "ai_citation_count", "trust_score"]
+
 @router.get("/user/{user_id}/documents", response_model=List[dict])
 async def get_user_documents(
-    user_id: str = Path(..., description="User ID")
+    response: Response,
+    user_id: str = Path(..., description="User ID"),
+    limit: int = Query(100, ge=1, le=settings.USER_DOCUMENTS_MAX_PAGE_SIZE, description="Maximum number of documents to return"),
+    cursor: Optional[str] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (default: list view fields)"),
+    status: Optional[str] = Query(None, description="Only return documents with this processing status"),
+    tag: Optional[List[str]] = Query(None, description="Only return documents with all of these tags"),
+    stream: bool = Query(False, description="Stream every remaining document as NDJSON instead of one page")
 ):
     """
-    Retrieve all documents uploaded by a specific user.
+    Retrieve the documents uploaded by a specific user, newest first.
+    Pages are keyset-paginated: the X-Next-Cursor response header holds the cursor of the next page.
     """
+    requested = (field.strip() for field in fields.split(",")) if fields else LIST_FIELDS
+    projection = {field: 1 for field in requested if field}
+    unknown = set(projection) - set(DocumentInDB.__fields__)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # The sort key is always needed to build the next cursor
+    projection.update({"_id": 0, "id": 1, "created_at": 1})
+    
+    query = {"user_id": user_id}
+    if status:
+        query["processing_status"] = status
+    if tag:
+        query["tags"] = {"$all": tag}
+    try:
+        query.update(keyset_filter(cursor))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     documents_collection = mongodb.get_collection("documents")
-    documents = await documents_collection.find({"user_id": user_id}).to_list(length=100)
     
+    if stream:
+        async def generate():
+            documents = documents_collection.find(query, projection).sort(KEYSET_SORT).batch_size(settings.USER_DOCUMENTS_STREAM_BATCH_SIZE)
+            async for document in documents:
+                yield json.dumps(jsonable_encoder(document)) + "\n"
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+    
+    documents = await documents_collection.find(
+        query, projection, max_time_ms=settings.MONGODB_MAX_TIME_MS
+    ).sort(KEYSET_SORT).limit(limit + 1).to_list(length=limit + 1)
+    
+    # The extra document only tells whether there is a next page
+    if len(documents) > limit:
+        documents = documents[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(documents[-1])
     return documents
 
 @router.get("/user/{user_id}/recommendations", response_model=UserRecommendation)
 async def get_user_recommendations(
-    user_id: str = Path(..., description="User ID")
+    user_id: str = Path(..., description="User ID"),
+    limit: int = Query(10, ge=1, le=settings.RECOMMENDATION_MAX_RESULTS, description="Maximum number of users to return")
 ):
     """
     Get recommendations for similar users based on document similarity.
+    Users are compared through the centroids of their document embeddings.
     """
-    # TODO: Implement user similarity calculation
-    # This would involve:
-    # 1. Getting all documents for the user
-    # 2. Calculating average embedding for the user
-    # 3. Finding users with similar embeddings
-    
-    # For now, return a placeholder response
-    return UserRecommendation(similar_users=[])
+    similar_users = await user_centroids.get_recommendations(user_id, limit)
+    return UserRecommendation(similar_users=similar_users)
@@ -11,8 +11,12 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
 
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.passwords import PasswordHasher
+from app.core.refresh_tokens import create_refresh_token_store
 from app.db.mongo import mongodb
-from app.models.user import UserInDB
+from app.models.user import RefreshToken, UserInDB
 
 # Load environment variables
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecretkey")
@@ -20,12 +24,33 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 1  # 1 hour
 REFRESH_TOKEN_EXPIRE_DAYS = 7  # 7 days
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Pinning min and max rounds to BCRYPT_ROUNDS marks hashes of any
+# other cost as needing an update, so changing the cost migrates users as they log in.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
+
+# Refresh tokens, in MongoDB or in Redis backed by MongoDB
+refresh_token_store = create_refresh_token_store(
+    settings.REFRESH_TOKEN_STORE, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/token")
 
+# Authenticated users by user ID, as (token_version, user). Per process, so changes
+# made through another process show up here after at most the TTL.
+user_cache = TTLCache(settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
 class Token(BaseModel):
     access_token: str
     refresh_token: str
@@ -39,23 +64,13 @@ class TokenData(BaseModel):
     user_id: Optional[str] = None
     token_type: Optional[str] = "access"
 
-class RefreshToken(BaseModel):
-    id: str
-    user_id: str
-    token: str
-    expires_at: datetime
-    created_at: datetime = datetime.utcnow()
-    revoked: bool = False
-    user_agent: Optional[str] = None
-    ip_address: Optional[str] = None
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against a hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against a hash, off the event loop."""
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
-    """Hash a password for storing."""
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    """Hash a password for storing, off the event loop."""
+    return await password_hasher.hash(password)
 
 async def get_user(username: str) -> Optional[UserInDB]:
     """Get a user by username from the database."""
@@ -65,17 +80,56 @@ async def get_user(username: str) -> Optional[UserInDB]:
         return UserInDB(**user_dict)
     return None
 
+def invalidate_user(user_id: str):
+    """Drop a user from the principal cache after their record changed."""
+    user_cache.delete(user_id)
+
+async def _load_user(user_id: str) -> Optional[UserInDB]:
+    users_collection = mongodb.get_collection("users")
+    user_dict = await users_collection.find_one({"id": user_id}, max_time_ms=settings.MONGODB_MAX_TIME_MS)
+    if not user_dict:
+        return None
+    user = UserInDB(**user_dict)
+    user_cache.set(user_id, (user.token_version, user))
+    return user
+
+async def get_user_for_token(user_id: str, token_version: int) -> Optional[UserInDB]:
+    """
+    Get the user an access token was issued to, from the principal cache when possible.
+    Returns None if the user doesn't exist or the token predates a token version bump.
+    """
+    cached = user_cache.get(user_id)
+    if cached is not None and cached[0] == token_version:
+        return cached[1]
+    
+    user = await _load_user(user_id)
+    return user if user and user.token_version == token_version else None
+
+async def get_user_by_id(user_id: str) -> Optional[UserInDB]:
+    """Get a user by ID, from the principal cache when possible."""
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached[1]
+    return await _load_user(user_id)
+
 async def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
     """Authenticate a user by username and password."""
     user = await get_user(username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        # The stored hash uses an outdated scheme or cost, upgrade it while we have the password
+        users_collection = mongodb.get_collection("users")
+        await users_collection.update_one({"id": user.id}, {"$set": {"hashed_password": new_hash}})
+        user.hashed_password = new_hash
+        invalidate_user(user.id)
     return user
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
-    """Create a JWT access token."""
+    """Create a JWT access token. `data` should carry the user's token_version as "ver"."""
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -86,58 +140,43 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     return encoded_jwt
 
 async def create_refresh_token(user_id: str, username: str, user_agent: Optional[str] = None, ip_address: Optional[str] = None) -> RefreshToken:
-    """Create a refresh token and store it in the database."""
-    # Generate a secure random token
-    import secrets
-    token_value = secrets.token_urlsafe(64)
-    
-    # Create expiration date
-    expires_at = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    
-    # Create refresh token document
-    refresh_token = RefreshToken(
-        id=str(uuid.uuid4()),
-        user_id=user_id,
-        token=token_value,
-        expires_at=expires_at,
-        user_agent=user_agent,
-        ip_address=ip_address
-    )
-    
-    # Store in database
-    refresh_tokens_collection = mongodb.get_collection("refresh_tokens")
-    await refresh_tokens_collection.insert_one(refresh_token.dict())
-    
+    """Create a refresh token and store it."""
+    refresh_token = refresh_token_store.new_token(user_id, user_agent=user_agent, ip_address=ip_address)
+    await refresh_token_store.issue(refresh_token)
     return refresh_token
 
 async def get_refresh_token(token: str) -> Optional[RefreshToken]:
-    """Get a refresh token from the database."""
-    refresh_tokens_collection = mongodb.get_collection("refresh_tokens")
-    token_dict = await refresh_tokens_collection.find_one({"token": token, "revoked": False})
-    if token_dict:
-        return RefreshToken(**token_dict)
-    return None
+    """Get a valid refresh token by its value."""
+    return await refresh_token_store.get(token)
+
+async def rotate_refresh_token(token: str, user_agent: Optional[str] = None, ip_address: Optional[str] = None) -> Optional[RefreshToken]:
+    """
+    Exchange a valid refresh token for a new one; each refresh token can be used once.
+    Returns the new token, or None if the token was invalid, expired or already used.
+    """
+    rotated = await refresh_token_store.rotate(token, user_agent=user_agent, ip_address=ip_address)
+    return rotated[1] if rotated else None
 
 async def revoke_refresh_token(token: str) -> bool:
     """Revoke a refresh token."""
-    refresh_tokens_collection = mongodb.get_collection("refresh_tokens")
-    result = await refresh_tokens_collection.update_one(
-        {"token": token},
-        {"$set": {"revoked": True}}
-    )
-    return result.modified_count > 0
+    return await refresh_token_store.revoke(token)
 
 async def revoke_all_user_tokens(user_id: str) -> int:
-    """Revoke all refresh tokens for a user."""
-    refresh_tokens_collection = mongodb.get_collection("refresh_tokens")
-    result = await refresh_tokens_collection.update_many(
-        {"user_id": user_id, "revoked": False},
-        {"$set": {"revoked": True}}
-    )
-    return result.modified_count
+    """
+    Revoke all refresh tokens for a user.
+    Also bumps the user's token version, which invalidates their outstanding access tokens.
+    """
+    revoked_count = await refresh_token_store.revoke_all(user_id)
+    users_collection = mongodb.get_collection("users")
+    await users_collection.update_one({"id": user_id}, {"$inc": {"token_version": 1}})
+    invalidate_user(user_id)
+    return revoked_count
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
-    """Get the current user from a JWT token."""
+    """
+    Get the current user from a JWT token.
+    Users are served from the principal cache, so most requests don't touch the database.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -157,9 +196,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
             raise credentials_exception
             
         token_data = TokenData(username=username, user_id=user_id, token_type=token_type)
-    except JWTError:
+        token_version = int(payload.get("ver", 0))
+    except (JWTError, TypeError, ValueError):
         raise credentials_exception
-    user = await get_user(username=token_data.username)
+    user = await get_user_for_token(token_data.user_id, token_version)
     if user is None:
         raise credentials_exception
     return user
@@ -169,3 +209,12 @@ async def get_current_active_user(current_user: UserInDB = Depends(get_current_u
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+async def get_current_admin_user(current_user: UserInDB = Depends(get_current_active_user)) -> UserInDB:
+    """Get the current user, requiring the admin role."""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
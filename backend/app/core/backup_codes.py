@@ -0,0 +1,43 @@
+"""
+MFA backup code digests.
+
+Backup codes are high-entropy random strings, so unlike passwords they don't need
+a slow hash: a keyed HMAC-SHA256 digest is enough to make a leaked users
+collection useless without the server secret. Digests are deterministic, so a
+code is verified and consumed with a single atomic update matching its digest
+instead of a bcrypt verification per stored code.
+
+Codes stored before digests were introduced are bcrypt hashes ("$2b$..."); they
+can't be converted without the plain codes, so they stay verifiable through the
+legacy path until used or regenerated.
+
+The digest key is MFA_BACKUP_CODE_SECRET or, when unset, a key derived from the
+JWT secret with HKDF, so token signing and backup codes never share a key.
+"""
+import hashlib
+import hmac
+from typing import Iterable, List
+
+DIGEST_PREFIX = "hmac-sha256$"
+
+def normalize_backup_code(code: str) -> str:
+    """Normalize a backup code as typed by a user: case, spaces and dashes don't matter."""
+    return "".join(code.split()).replace("-", "").upper()
+
+def derive_key(secret: str, label: str) -> str:
+    """Derive a 256-bit key for one purpose from a shared secret (HKDF-SHA256, RFC 5869, without salt)."""
+    prk = hmac.new(b"\0" * hashlib.sha256().digest_size, secret.encode("utf-8"), hashlib.sha256).digest()
+    return hmac.new(prk, label.encode("utf-8") + b"\x01", hashlib.sha256).hexdigest()
+
+def backup_code_digest(code: str, key: str) -> str:
+    """Get the stored digest of a backup code."""
+    mac = hmac.new(key.encode("utf-8"), normalize_backup_code(code).encode("utf-8"), hashlib.sha256)
+    return f"{DIGEST_PREFIX}{mac.hexdigest()}"
+
+def is_legacy_hash(stored: str) -> bool:
+    """Check whether a stored backup code is a legacy bcrypt hash rather than a digest."""
+    return not stored.startswith(DIGEST_PREFIX)
+
+def legacy_hashes(stored_codes: Iterable[str]) -> List[str]:
+    """Get the legacy bcrypt hashes among a user's stored backup codes."""
+    return [stored for stored in stored_codes if is_legacy_hash(stored)]
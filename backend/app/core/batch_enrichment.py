@@ -0,0 +1,209 @@
+"""
+Offline document enrichment through provider batch APIs.
+
+Instead of one chat completion per document, pending documents are written to a
+JSONL file of requests, submitted as a single batch job and the results are fanned
+back into the document records once the provider completes the job.
+"""
+import json
+import logging
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from app.core.prompts import (
+    build_summary_messages, build_tag_messages, parse_tags, SUMMARY_MAX_TOKENS, TAGS_MAX_TOKENS
+)
+from app.core.summarization import truncate_to_budget
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages that can be run through a batch job
+BATCH_STAGES = ("summary", "tags")
+
+# Batch job states
+BATCH_PENDING = "pending"
+BATCH_COMPLETED = "completed"
+BATCH_FAILED = "failed"
+
+class BatchProvider(ABC):
+    """
+    Interface for provider batch APIs.
+    Implementations submit a JSONL file of chat completion requests, report the job
+    status and return the result lines once the job is done.
+    """
+    name = "base"
+    model = None
+    
+    @abstractmethod
+    async def submit(self, requests_path: str) -> str:
+        """Submit a JSONL file of requests and return the provider's batch id."""
+        pass
+    
+    @abstractmethod
+    async def get_status(self, batch_id: str) -> Dict[str, Any]:
+        """Get the job status, normalized to pending, completed or failed."""
+        pass
+    
+    @abstractmethod
+    async def fetch_results(self, batch_id: str, status: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Fetch the result lines of a finished job."""
+        pass
+
+class OpenAIBatchProvider(BatchProvider):
+    """Batch provider for the OpenAI Batch API (or any server implementing it)."""
+    name = "openai"
+    
+    def __init__(self, api_key: str, base_url: str, model: str = "gpt-3.5-turbo", timeout: float = 60.0):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+    
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+    
+    async def submit(self, requests_path: str) -> str:
+        async with httpx.AsyncClient(base_url=self.base_url, headers=self._headers(), timeout=self.timeout) as client:
+            # Upload the request file
+            with open(requests_path, "rb") as requests_file:
+                response = await client.post(
+                    "/files",
+                    data={"purpose": "batch"},
+                    files={"file": (os.path.basename(requests_path), requests_file, "application/jsonl")}
+                )
+            response.raise_for_status()
+            input_file_id = response.json()["id"]
+            
+            # Create the batch job
+            response = await client.post(
+                "/batches",
+                json={
+                    "input_file_id": input_file_id,
+                    "endpoint": "/v1/chat/completions",
+                    "completion_window": "24h"
+                }
+            )
+            response.raise_for_status()
+            return response.json()["id"]
+    
+    async def get_status(self, batch_id: str) -> Dict[str, Any]:
+        async with httpx.AsyncClient(base_url=self.base_url, headers=self._headers(), timeout=self.timeout) as client:
+            response = await client.get(f"/batches/{batch_id}")
+            response.raise_for_status()
+            batch = response.json()
+        
+        provider_status = batch.get("status")
+        if provider_status == "completed":
+            status = BATCH_COMPLETED
+        elif provider_status in ("expired", "cancelled") and batch.get("output_file_id"):
+            # Partial results are still worth applying
+            status = BATCH_COMPLETED
+        elif provider_status in ("failed", "expired", "cancelled"):
+            status = BATCH_FAILED
+        else:
+            status = BATCH_PENDING
+        
+        return {
+            "status": status,
+            "provider_status": provider_status,
+            "output_file_id": batch.get("output_file_id"),
+            "error_file_id": batch.get("error_file_id"),
+            "request_counts": batch.get("request_counts")
+        }
+    
+    async def fetch_results(self, batch_id: str, status: Dict[str, Any]) -> List[Dict[str, Any]]:
+        lines = []
+        async with httpx.AsyncClient(base_url=self.base_url, headers=self._headers(), timeout=self.timeout) as client:
+            # Successful and failed requests are reported in separate files
+            for file_id in (status.get("output_file_id"), status.get("error_file_id")):
+                if not file_id:
+                    continue
+                response = await client.get(f"/files/{file_id}/content")
+                response.raise_for_status()
+                lines.extend(json.loads(line) for line in response.text.splitlines() if line.strip())
+        return lines
+
+def get_batch_provider(name: str) -> BatchProvider:
+    """Create the batch provider with the given name from settings."""
+    from app.core.config import settings
+    from app.core.llm_client import PROVIDERS
+    
+    if name == "openai":
+        if not settings.OPENAI_API_KEY:
+            raise ValueError("OpenAI API key not set")
+        return OpenAIBatchProvider(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            model=PROVIDERS["openai"]["model"]
+        )
+    raise ValueError(f"Unknown batch provider: {name}")
+
+def build_batch_requests(
+    documents: Iterable[Tuple[str, str, Iterable[str]]],
+    model: str,
+    summary_token_budget: Optional[int] = None,
+    tags_token_budget: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Build chat completion batch requests.
+    `documents` yields (doc_id, content, stages); one request is built per stage.
+    Content is sampled down to the given token budgets, if any.
+    """
+    requests = []
+    for doc_id, content, stages in documents:
+        for stage in stages:
+            if stage == "summary":
+                text = truncate_to_budget(content, summary_token_budget) if summary_token_budget else content
+                messages, max_tokens = build_summary_messages(text), SUMMARY_MAX_TOKENS
+            elif stage == "tags":
+                text = truncate_to_budget(content, tags_token_budget) if tags_token_budget else content
+                messages, max_tokens = build_tag_messages(text), TAGS_MAX_TOKENS
+            else:
+                continue
+            requests.append({
+                "custom_id": f"{doc_id}:{stage}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": model, "messages": messages, "max_tokens": max_tokens}
+            })
+    return requests
+
+def write_batch_requests(requests: List[Dict[str, Any]], directory: str) -> str:
+    """Write batch requests to a JSONL file and return its path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"enrichment-{uuid.uuid4()}.jsonl")
+    with open(path, "w", encoding="utf-8") as requests_file:
+        for request in requests:
+            requests_file.write(json.dumps(request) + "\n")
+    return path
+
+def parse_batch_results(lines: Iterable[Dict[str, Any]]) -> Dict[str, Tuple[Dict[str, Any], Dict[str, str]]]:
+    """
+    Parse batch result lines into per-document (outputs, errors),
+    matching the shape returned by the interactive pipeline.
+    """
+    results: Dict[str, Tuple[Dict[str, Any], Dict[str, str]]] = {}
+    for line in lines:
+        doc_id, _, stage = (line.get("custom_id") or "").rpartition(":")
+        if not doc_id or stage not in BATCH_STAGES:
+            logger.warning(f"Ignoring batch result with unknown custom_id: {line.get('custom_id')}")
+            continue
+        outputs, errors = results.setdefault(doc_id, ({}, {}))
+        
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or response.get("body", {}).get("error") or f"status {response.get('status_code')}"
+            errors[stage] = error.get("message", str(error)) if isinstance(error, dict) else str(error)
+            continue
+        
+        try:
+            content = response["body"]["choices"][0]["message"]["content"].strip()
+        except (KeyError, IndexError, TypeError) as e:
+            errors[stage] = f"Malformed batch response: {e}"
+            continue
+        outputs[stage] = parse_tags(content) if stage == "tags" else content
+    return results
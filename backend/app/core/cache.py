@@ -0,0 +1,77 @@
+"""
+Caching helpers: an in-process TTL cache and HTTP entity tags.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after a fixed time to live.
+    Not shared between processes; pair it with explicit invalidation where staleness matters.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a cached value, or default if it is missing or expired."""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Cache a value, evicting the least recently used entry when full."""
+        self.entries[key] = (self.clock() + (ttl if ttl is not None else self.ttl), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+    
+    def delete(self, key: Hashable):
+        """Drop a cached value, if any."""
+        self.entries.pop(key, None)
+    
+    def clear(self):
+        self.entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def get_metrics(self) -> dict:
+        """Get the cache size and hit counters."""
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+def compute_etag(body: Dict[str, Any], exclude: Iterable[str] = ()) -> str:
+    """
+    Compute a weak entity tag for a JSON-serializable response body.
+    Fields in `exclude` (e.g. counters that change on every read) don't affect the tag.
+    """
+    excluded = set(exclude)
+    content = json.dumps({k: v for k, v in body.items() if k not in excluded}, sort_keys=True, default=str)
+    return f'W/"{hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an entity tag, using weak comparison."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
@@ -2,6 +2,7 @@
 Celery configuration for BlueWhale async task processing.
 """
 from celery import Celery
+from celery.signals import worker_init
 import os
 from dotenv import load_dotenv
 
@@ -18,6 +19,7 @@ celery_app = Celery(
     backend=redis_url,
     include=[
         "app.tasks.document_processing",
+        "app.tasks.batch_enrichment",
     ]
 )
 
@@ -33,3 +35,10 @@ celery_app.conf.update(
     worker_prefetch_multiplier=1,  # One task per worker at a time
     task_acks_late=True,  # Acknowledge tasks after execution
 )
+
+@worker_init.connect
+def preload_models(**kwargs):
+    """Load the embedding model before the prefork pool starts, so pool processes share it."""
+    if os.getenv("EMBEDDING_HOSTING", "process") == "preload":
+        from app.core.llm_client import llm_client
+        llm_client.preload_embedding_model()
@@ -9,15 +9,33 @@ class Settings(BaseSettings):
     # MongoDB settings
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     MONGODB_DB_NAME: str = os.getenv("MONGODB_DB_NAME", "bluewhale")
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))  # Per process
+    MONGODB_MIN_POOL_SIZE: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+    MONGODB_MAX_IDLE_TIME_MS: Optional[int] = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS")) if os.getenv("MONGODB_MAX_IDLE_TIME_MS") else None
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS")) if os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS") else None
+    # Per-collection read preference and read concern, as "collection=value,collection=value"
+    MONGODB_READ_PREFERENCES: str = os.getenv("MONGODB_READ_PREFERENCES", "")
+    MONGODB_READ_CONCERNS: str = os.getenv("MONGODB_READ_CONCERNS", "")
+    # Read preference for hydrating search results, which tolerate slightly stale reads
+    MONGODB_SEARCH_READ_PREFERENCE: str = os.getenv("MONGODB_SEARCH_READ_PREFERENCE", "primary")
+    MONGODB_MAX_TIME_MS: int = int(os.getenv("MONGODB_MAX_TIME_MS", "5000"))  # Server-side limit for hot queries
+    # Drop indexes on registry-managed collections that the index registry doesn't list
+    MONGODB_DROP_UNKNOWN_INDEXES: bool = os.getenv("MONGODB_DROP_UNKNOWN_INDEXES", "false").lower() == "true"
+    
+    # Full text store settings (GridFS bucket holding compressed document text)
+    TEXT_STORE_BUCKET: str = os.getenv("TEXT_STORE_BUCKET", "document_texts")
+    TEXT_STORE_COMPRESSION_LEVEL: int = int(os.getenv("TEXT_STORE_COMPRESSION_LEVEL", "10"))
     
     # Qdrant settings
     QDRANT_URL: str = os.getenv("QDRANT_URL", "http://localhost:6333")
     QDRANT_API_KEY: Optional[str] = os.getenv("QDRANT_API_KEY")
     QDRANT_COLLECTION_NAME: str = os.getenv("QDRANT_COLLECTION_NAME", "documents")
+    QDRANT_USER_CENTROID_COLLECTION_NAME: str = os.getenv("QDRANT_USER_CENTROID_COLLECTION_NAME", "user_centroids")
     VECTOR_SIZE: int = 768  # Default for many embedding models
     
     # Qdrant connection mode (cloud, local, or memory)
     QDRANT_MODE: str = os.getenv("QDRANT_MODE", "memory")  # Options: "cloud", "local", or "memory"
+    QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"  # Binary vectors instead of JSON
     
     # S3 or Cloudinary settings
     S3_BUCKET_NAME: str = os.getenv("S3_BUCKET_NAME", "bluewhale-documents")
@@ -28,12 +46,110 @@ class Settings(BaseSettings):
     # Redis settings for Celery
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     
+    # Document cache settings
+    DOCUMENT_CACHE_BACKEND: str = os.getenv("DOCUMENT_CACHE_BACKEND", "off")  # off, memory (single API process only), or redis
+    DOCUMENT_CACHE_SIZE: int = int(os.getenv("DOCUMENT_CACHE_SIZE", "10000"))
+    DOCUMENT_CACHE_TTL: float = float(os.getenv("DOCUMENT_CACHE_TTL", "300"))  # Seconds
+    DOCUMENT_CACHE_MAX_AGE: int = int(os.getenv("DOCUMENT_CACHE_MAX_AGE", "60"))  # Cache-Control max-age for clients
+    
+    # Authenticated user cache settings
+    AUTH_USER_CACHE_SIZE: int = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+    AUTH_USER_CACHE_TTL: float = float(os.getenv("AUTH_USER_CACHE_TTL", "30"))  # Seconds
+    
+    # Password hashing settings
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Hashes with another cost are rehashed on login
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+    
+    # Refresh token settings
+    REFRESH_TOKEN_STORE: str = os.getenv("REFRESH_TOKEN_STORE", "mongo")  # mongo, or redis (copied to MongoDB in the background)
+    REFRESH_TOKEN_FLUSH_INTERVAL: float = float(os.getenv("REFRESH_TOKEN_FLUSH_INTERVAL", "1"))  # Seconds between writes of Redis rotations to MongoDB
+    
+    # MFA settings
+    MFA_BACKUP_CODE_SECRET: Optional[str] = os.getenv("MFA_BACKUP_CODE_SECRET")  # Keys the backup code digests; derived from JWT_SECRET_KEY if unset
+    
+    # Buffered counter settings
+    COUNTER_BACKEND: str = os.getenv("COUNTER_BACKEND", "memory")  # memory or redis
+    COUNTER_FLUSH_INTERVAL: float = float(os.getenv("COUNTER_FLUSH_INTERVAL", "5"))  # Seconds
+    
     # AI Model settings
     OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
     HUGGINGFACE_API_KEY: Optional[str] = os.getenv("HUGGINGFACE_API_KEY")
     DEEPSEEK_API_KEY: Optional[str] = os.getenv("DEEPSEEK_API_KEY")
     DEFAULT_EMBEDDING_MODEL: str = os.getenv("DEFAULT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
     
+    # Embedding backend settings
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")  # Options: "sentence-transformers" or "onnx"
+    EMBEDDING_QUANTIZE: bool = os.getenv("EMBEDDING_QUANTIZE", "false").lower() == "true"  # int8 weights for the ONNX backend
+    EMBEDDING_CACHE_DIR: str = os.getenv("EMBEDDING_CACHE_DIR", "/tmp/bluewhale-models")  # Exported ONNX models
+    EMBEDDING_MAX_SEQ_LENGTH: int = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "256"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))  # Most texts per batch
+    EMBEDDING_MAX_BATCH_TOKENS: int = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "8192"))  # Most padded tokens per batch
+    EMBEDDING_NUM_THREADS: int = int(os.getenv("EMBEDDING_NUM_THREADS", "0"))  # 0 lets ONNX Runtime decide
+    # Where the model lives: "process" (loaded by each worker), "preload" (loaded before
+    # gunicorn/Celery fork their workers and shared copy-on-write) or "sidecar" (served over a Unix socket)
+    EMBEDDING_HOSTING: str = os.getenv("EMBEDDING_HOSTING", "process")
+    EMBEDDING_SIDECAR_SOCKET: str = os.getenv("EMBEDDING_SIDECAR_SOCKET", "/tmp/bluewhale-embeddings.sock")
+    QUERY_EMBEDDING_CACHE_SIZE: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))  # Search queries kept as float32 vectors
+    
+    # LLM provider scheduling (rate limits, retries and circuit breakers)
+    DEEPSEEK_REQUESTS_PER_MINUTE: float = float(os.getenv("DEEPSEEK_REQUESTS_PER_MINUTE", "60"))
+    OPENAI_REQUESTS_PER_MINUTE: float = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "60"))
+    LLM_REQUEST_TIMEOUT: float = float(os.getenv("LLM_REQUEST_TIMEOUT", "30"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", "20.0"))
+    LLM_MAX_QUEUE_WAIT: float = float(os.getenv("LLM_MAX_QUEUE_WAIT", "10.0"))  # Fail over instead of waiting longer
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    LLM_CIRCUIT_RESET_SECONDS: float = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "60"))
+    
+    # Summarization token budgets
+    SUMMARY_INPUT_TOKEN_BUDGET: int = int(os.getenv("SUMMARY_INPUT_TOKEN_BUDGET", "3000"))  # Prompt size for single-call summaries
+    SUMMARY_MAP_REDUCE_THRESHOLD: int = int(os.getenv("SUMMARY_MAP_REDUCE_THRESHOLD", "12000"))  # Longer documents use map-reduce
+    SUMMARY_CHUNK_TOKENS: int = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+    SUMMARY_MAX_TOKENS_PER_DOCUMENT: int = int(os.getenv("SUMMARY_MAX_TOKENS_PER_DOCUMENT", "40000"))  # Spend cap across all calls
+    SUMMARY_MAP_CONCURRENCY: int = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4"))
+    TAGS_INPUT_TOKEN_BUDGET: int = int(os.getenv("TAGS_INPUT_TOKEN_BUDGET", "2000"))
+    EXTRACTIVE_SUMMARY_MAX_SENTENCES: int = int(os.getenv("EXTRACTIVE_SUMMARY_MAX_SENTENCES", "256"))  # Sentences embedded by the local fallback
+    KEYWORD_STATS_SYNC_INTERVAL: float = float(os.getenv("KEYWORD_STATS_SYNC_INTERVAL", "300"))  # Seconds between syncs of keyword statistics with MongoDB
+    
+    # Pipeline stage versions; bump to force the stage to rerun on reprocess
+    SUMMARIZER_VERSION: str = os.getenv("SUMMARIZER_VERSION", "2")
+    TAGGER_VERSION: str = os.getenv("TAGGER_VERSION", "1")
+    
+    # Batch processing settings
+    BATCH_PROCESSING_CONCURRENCY: int = int(os.getenv("BATCH_PROCESSING_CONCURRENCY", "8"))  # Concurrent LLM enrichments
+    BATCH_PROCESSING_CHUNK_SIZE: int = int(os.getenv("BATCH_PROCESSING_CHUNK_SIZE", "256"))  # Documents per embedding/write round
+    QDRANT_UPSERT_BATCH_SIZE: int = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "128"))
+    
+    # Offline enrichment through provider batch APIs
+    BATCH_ENRICHMENT_PROVIDER: str = os.getenv("BATCH_ENRICHMENT_PROVIDER", "openai")
+    BATCH_ENRICHMENT_DIR: str = os.getenv("BATCH_ENRICHMENT_DIR", "/tmp/bluewhale-batches")
+    BATCH_ENRICHMENT_MAX_DOCUMENTS: int = int(os.getenv("BATCH_ENRICHMENT_MAX_DOCUMENTS", "10000"))
+    BATCH_ENRICHMENT_POLL_INTERVAL: float = float(os.getenv("BATCH_ENRICHMENT_POLL_INTERVAL", "60"))
+    BATCH_ENRICHMENT_TIMEOUT: float = float(os.getenv("BATCH_ENRICHMENT_TIMEOUT", str(26 * 3600)))  # Completion window plus margin
+    
+    # Near-duplicate detection settings
+    DEDUP_MODE: str = os.getenv("DEDUP_MODE", "flag")  # off, flag, or merge
+    DEDUP_NUM_PERM: int = int(os.getenv("DEDUP_NUM_PERM", "128"))
+    DEDUP_LSH_BANDS: int = int(os.getenv("DEDUP_LSH_BANDS", "16"))  # 8 rows per band, ~0.7 Jaccard candidate threshold
+    DEDUP_SHINGLE_SIZE: int = int(os.getenv("DEDUP_SHINGLE_SIZE", "5"))  # Words per shingle
+    DEDUP_JACCARD_THRESHOLD: float = float(os.getenv("DEDUP_JACCARD_THRESHOLD", "0.8"))
+    DEDUP_VECTOR_THRESHOLD: float = float(os.getenv("DEDUP_VECTOR_THRESHOLD", "0.97"))  # Cosine similarity, 0 disables
+    DEDUP_MAX_CANDIDATES: int = int(os.getenv("DEDUP_MAX_CANDIDATES", "20"))
+    DEDUP_COLLAPSE_OVERFETCH: int = int(os.getenv("DEDUP_COLLAPSE_OVERFETCH", "3"))  # Search results fetched per returned result
+    
+    # User document listing settings
+    USER_DOCUMENTS_MAX_PAGE_SIZE: int = int(os.getenv("USER_DOCUMENTS_MAX_PAGE_SIZE", "200"))
+    USER_DOCUMENTS_STREAM_BATCH_SIZE: int = int(os.getenv("USER_DOCUMENTS_STREAM_BATCH_SIZE", "500"))
+    
+    # User recommendation settings
+    RECOMMENDATION_MAX_RESULTS: int = int(os.getenv("RECOMMENDATION_MAX_RESULTS", "50"))
+    RECOMMENDATION_CACHE_SIZE: int = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000"))
+    RECOMMENDATION_CACHE_TTL: float = float(os.getenv("RECOMMENDATION_CACHE_TTL", "300"))  # Seconds
+    CENTROID_LOCK_TIMEOUT: float = float(os.getenv("CENTROID_LOCK_TIMEOUT", "10"))  # Seconds a centroid update may hold or wait for its lock
+    
     # CORS settings
     BACKEND_CORS_ORIGINS: List[str] = ["*"]  # In production, replace with specific origins
     
@@ -0,0 +1,149 @@
+"""
+Buffered, write-coalescing counters.
+
+Increments are counted in memory and never wait on a write. A background task
+periodically flushes the aggregated deltas to MongoDB with a single bulk_write,
+so a document read a thousand times between flushes costs one $inc. With the
+"redis" backend, each process pushes its deltas to a shared Redis hash (HINCRBY)
+and whichever process flushes next drains the hash, coalescing the writes of all
+processes.
+"""
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.db.mongo import mongodb
+from app.db.redis import redis_db
+
+logger = logging.getLogger(__name__)
+
+# Reads and deletes a hash in one step, so each increment is drained by exactly one process
+DRAIN_SCRIPT = """
+local values = redis.call('HGETALL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return values
+"""
+
+class CounterBuffer:
+    """Buffers increments of a numeric field and flushes them to MongoDB."""
+    
+    def __init__(self, collection_name: str, field: str, backend: str = "memory", flush_interval: float = 5.0):
+        self.collection_name = collection_name
+        self.field = field
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.redis_key = f"counters:{collection_name}:{field}"
+        self.deltas: Counter = Counter()
+        self.lock: Optional[asyncio.Lock] = None
+        self.task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flushed_increments = 0
+        self.failures = 0
+    
+    def increment(self, key: str, amount: int = 1):
+        """Count an increment without waiting on any write."""
+        self.deltas[key] += amount
+    
+    async def flush(self) -> int:
+        """Write the buffered deltas to MongoDB. Returns the number of documents updated."""
+        if self.lock is None:
+            # Created on first use so it belongs to the running event loop
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            deltas, self.deltas = self.deltas, Counter()
+            if self.backend == "redis" and redis_db.client:
+                deltas = await self._exchange_with_redis(deltas)
+            operations = [
+                UpdateOne({"id": key}, {"$inc": {self.field: delta}})
+                for key, delta in deltas.items()
+                if delta
+            ]
+            if not operations:
+                # Nothing pending, or every delta netted out to zero
+                return 0
+            
+            try:
+                await mongodb.get_collection(self.collection_name).bulk_write(operations, ordered=False)
+            except Exception as e:
+                # Keep the deltas for the next flush rather than losing them
+                logger.error(f"Failed to flush {self.field} counters: {e}")
+                self.failures += 1
+                self.deltas.update(deltas)
+                return 0
+            
+            self.flushes += 1
+            self.flushed_increments += sum(deltas.values())
+            return len(operations)
+    
+    async def _drain(self, client, key: str) -> Counter:
+        values: List[bytes] = await client.eval(DRAIN_SCRIPT, 1, key)
+        return Counter({values[i].decode(): int(values[i + 1]) for i in range(0, len(values), 2)})
+    
+    async def _exchange_with_redis(self, deltas: Counter) -> Counter:
+        """
+        Push this process's deltas to the shared Redis hash, then take everything
+        pending in it.
+        """
+        client = redis_db.client
+        if deltas:
+            try:
+                pipeline = client.pipeline(transaction=True)
+                for key, delta in deltas.items():
+                    pipeline.hincrby(self.redis_key, key, delta)
+                await pipeline.execute()
+            except Exception as e:
+                # Nothing was pushed, write this process's deltas directly
+                logger.error(f"Failed to push {self.field} counters to Redis: {e}")
+                return deltas
+        
+        try:
+            return await self._drain(client, self.redis_key)
+        except Exception as e:
+            # What wasn't drained stays in Redis for the next flush
+            logger.error(f"Failed to drain {self.field} counters from Redis: {e}")
+            return Counter()
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing {self.field} counters: {e}")
+    
+    def start(self):
+        """Start flushing periodically on the running event loop."""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the periodic flush and write what is still buffered."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+    
+    def get_metrics(self) -> Dict[str, int]:
+        """Get the buffer size and flush counters."""
+        return {
+            "pending_keys": len(self.deltas),
+            "pending_increments": sum(self.deltas.values()),
+            "flushes": self.flushes,
+            "flushed_increments": self.flushed_increments,
+            "failures": self.failures
+        }
+
+citation_counter = CounterBuffer(
+    "documents",
+    "ai_citation_count",
+    backend=settings.COUNTER_BACKEND,
+    flush_interval=settings.COUNTER_FLUSH_INTERVAL
+)
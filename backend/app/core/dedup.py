@@ -0,0 +1,89 @@
+"""
+Near-duplicate detection for ingested documents.
+
+Documents get a MinHash signature over word shingles, and the signature is split
+into LSH bands. Each band hash is stored on the document, so candidate duplicates
+are found with one indexed lookup on shared bands, and the Jaccard similarity of
+the candidates is estimated from their signatures.
+"""
+import hashlib
+import re
+import zlib
+from functools import lru_cache
+from typing import Any, Callable, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+WORD_PATTERN = re.compile(r"\w+")
+
+# Shingle hashes are permuted in blocks to bound memory on very long documents
+HASH_BLOCK_SIZE = 8192
+
+def shingle_hashes(text: str, size: int = 5) -> np.ndarray:
+    """Hash the distinct word shingles of a text to 32-bit values."""
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    shingles = {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+@lru_cache(maxsize=8)
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Draw the coefficients of the universal hash functions (a * x + b) mod p."""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    return a, b
+
+def minhash_signature(text: str, num_perm: int = 128, shingle_size: int = 5, seed: int = 1) -> np.ndarray:
+    """
+    Compute the MinHash signature of a text.
+    The fraction of equal positions in two signatures estimates the Jaccard
+    similarity of their shingle sets.
+    """
+    a, b = _permutations(num_perm, seed)
+    signature = np.full(num_perm, MAX_HASH, dtype=np.uint64)
+    hashes = shingle_hashes(text, shingle_size)
+    with np.errstate(over="ignore"):
+        for start in range(0, len(hashes), HASH_BLOCK_SIZE):
+            block = hashes[start:start + HASH_BLOCK_SIZE, np.newaxis]
+            permuted = ((block * a + b) % MERSENNE_PRIME) & MAX_HASH
+            np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature
+
+def lsh_band_keys(signature: np.ndarray, bands: int = 16) -> List[str]:
+    """
+    Split a signature into bands and hash each band to a bucket key.
+    Two documents sharing any key are candidate duplicates; with r rows per band
+    that happens with probability 1 - (1 - J^r)^bands for Jaccard similarity J.
+    """
+    if len(signature) % bands:
+        raise ValueError(f"Signature length {len(signature)} is not divisible into {bands} bands")
+    return [
+        f"{i}:{hashlib.blake2b(band.tobytes(), digest_size=8).hexdigest()}"
+        for i, band in enumerate(np.split(np.asarray(signature, dtype=np.uint64), bands))
+    ]
+
+def estimate_jaccard(signature_a: Iterable[int], signature_b: Iterable[int]) -> float:
+    """Estimate the Jaccard similarity of two documents from their signatures."""
+    a = np.asarray(signature_a, dtype=np.uint64)
+    b = np.asarray(signature_b, dtype=np.uint64)
+    if a.shape != b.shape or not len(a):
+        return 0.0
+    return float(np.mean(a == b))
+
+def collapse_clusters(results: Iterable[Any], key: Callable[[Any], Hashable], limit: int) -> List[Any]:
+    """Keep the best-ranked result of each duplicate cluster, up to limit results."""
+    seen = set()
+    collapsed = []
+    for result in results:
+        cluster = key(result)
+        if cluster in seen:
+            continue
+        seen.add(cluster)
+        collapsed.append(result)
+        if len(collapsed) == limit:
+            break
+    return collapsed
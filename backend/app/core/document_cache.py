@@ -0,0 +1,208 @@
+"""
+Read-through cache for documents served by GET /document/{doc_id}.
+
+Documents are cached in a per-process LRU and, with the "redis" backend, in a
+shared Redis layer so a document loaded by one API process is served from Redis
+by the others. Writers call invalidate(); with Redis the invalidation is also
+published so every process drops its local copy, including when the write
+happened in a Celery worker. The "memory" backend has no such channel and is
+only safe with a single API process.
+
+Readers take a generation() before loading a document from MongoDB and pass it
+to set(), so a read that raced with an invalidation does not put the old
+document back into the cache.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.cache import TTLCache, compute_etag
+from app.core.config import settings
+from app.db.redis import redis_db
+from app.models.document import DocumentResponse
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "document-cache:invalidate"
+
+# Fields that change without invalidating the cache, left out of the ETag
+VOLATILE_FIELDS = ("ai_citation_count",)
+
+# Caches a document only if it was not invalidated since the read began
+SET_IF_VERSION_SCRIPT = """
+local version = redis.call('GET', KEYS[2]) or '0'
+if version ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+class DocumentCache:
+    """Per-process LRU of rendered documents, optionally backed by Redis."""
+    
+    def __init__(self):
+        self.enabled = settings.DOCUMENT_CACHE_BACKEND != "off"
+        self.redis_configured = settings.DOCUMENT_CACHE_BACKEND == "redis"
+        # Set by start() once Redis is connected and invalidations are received;
+        # until then nothing is cached, as other processes' writes would go unnoticed
+        self.use_redis = False
+        self.ttl = settings.DOCUMENT_CACHE_TTL
+        self.local = TTLCache(settings.DOCUMENT_CACHE_SIZE, self.ttl)
+        # Invalidations seen by this process, and the last one of each document
+        self.invalidations = 0
+        self.invalidated = TTLCache(settings.DOCUMENT_CACHE_SIZE, self.ttl)
+        self.task: Optional[asyncio.Task] = None
+    
+    @property
+    def active(self) -> bool:
+        return self.enabled and (self.use_redis or not self.redis_configured)
+    
+    def _redis_key(self, doc_id: str) -> str:
+        return f"document-cache:{doc_id}"
+    
+    def _version_key(self, doc_id: str) -> str:
+        return f"document-cache:version:{doc_id}"
+    
+    def _forget(self, doc_id: str):
+        self.local.delete(doc_id)
+        self.invalidations += 1
+        self.invalidated.set(doc_id, self.invalidations)
+    
+    async def generation(self, doc_id: str) -> Tuple[int, Optional[str]]:
+        """Get the generation of a document; take it before reading the document to pass to set()."""
+        version = None
+        if self.use_redis:
+            try:
+                stored = await redis_db.get_client().get(self._version_key(doc_id))
+                version = stored.decode() if stored is not None else "0"
+            except Exception as e:
+                logger.error(f"Failed to read the cache version of document {doc_id}: {e}")
+        return self.invalidations, version
+    
+    async def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Get the cached entry ({"document": ..., "etag": ...}) of a document, if any."""
+        if not self.active:
+            return None
+        entry = self.local.get(doc_id)
+        if entry is not None or not self.use_redis:
+            return entry
+        
+        try:
+            cached = await redis_db.get_client().get(self._redis_key(doc_id))
+        except Exception as e:
+            logger.error(f"Failed to read document {doc_id} from the Redis cache: {e}")
+            return None
+        if cached is None:
+            return None
+        entry = json.loads(cached)
+        self.local.set(doc_id, entry)
+        return entry
+    
+    async def set(
+        self, doc_id: str, document: Dict[str, Any], generation: Tuple[int, Optional[str]]
+    ) -> Dict[str, Any]:
+        """
+        Render a document as served by the API, cache it, and return the entry.
+        The entry is not cached if the document was invalidated since `generation` was taken.
+        """
+        body = jsonable_encoder(DocumentResponse(**document))
+        entry = {"document": body, "etag": compute_etag(body, exclude=VOLATILE_FIELDS)}
+        invalidations, version = generation
+        if not self.active or self.invalidated.get(doc_id, 0) > invalidations:
+            return entry
+        
+        if not self.use_redis:
+            self.local.set(doc_id, entry)
+            return entry
+        if version is None:
+            # The version could not be read, so a concurrent invalidation could not be detected
+            return entry
+        try:
+            stored = await redis_db.get_client().eval(
+                SET_IF_VERSION_SCRIPT, 2, self._redis_key(doc_id), self._version_key(doc_id),
+                version, json.dumps(entry), int(self.ttl)
+            )
+        except Exception as e:
+            logger.error(f"Failed to write document {doc_id} to the Redis cache: {e}")
+            return entry
+        # Checked again: an invalidation may have arrived while writing to Redis
+        if stored and self.invalidated.get(doc_id, 0) <= invalidations:
+            self.local.set(doc_id, entry)
+        return entry
+    
+    async def invalidate(self, *doc_ids: str):
+        """Drop documents from the cache of every process."""
+        if not self.enabled or not doc_ids:
+            return
+        for doc_id in doc_ids:
+            self._forget(doc_id)
+        # Also from processes that never connected (Celery workers, or an API process whose
+        # connection failed): the other processes may still be caching in Redis
+        if self.redis_configured:
+            try:
+                client = redis_db.get_client()
+                # Bumping the versions keeps reads that began before now from caching;
+                # they outlive any such read as long as they outlive the cached entries
+                pipeline = client.pipeline(transaction=True)
+                for doc_id in doc_ids:
+                    pipeline.incr(self._version_key(doc_id))
+                    pipeline.expire(self._version_key(doc_id), int(self.ttl))
+                pipeline.delete(*(self._redis_key(doc_id) for doc_id in doc_ids))
+                await pipeline.execute()
+                await client.publish(INVALIDATION_CHANNEL, json.dumps(list(doc_ids)))
+            except Exception as e:
+                logger.error(f"Failed to invalidate cached documents: {e}")
+    
+    async def _listen(self):
+        """Drop local copies of documents invalidated by other processes."""
+        delay = 1
+        disconnected = False
+        while True:
+            try:
+                pubsub = redis_db.get_client().pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                if disconnected:
+                    # Invalidations published while disconnected were missed
+                    logger.info("Document cache invalidation listener reconnected")
+                    self.local.clear()
+                    disconnected, delay = False, 1
+                async for message in pubsub.listen():
+                    for doc_id in json.loads(message["data"]):
+                        self._forget(doc_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not disconnected:
+                    logger.error(f"Document cache invalidation listener disconnected: {e}")
+                    disconnected = True
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+    
+    def start(self):
+        """
+        Start listening for invalidations from other processes.
+        Call after connecting to Redis: if the connection failed, documents are not cached.
+        """
+        if not self.enabled or not self.redis_configured or self.task is not None:
+            return
+        if redis_db.client is None:
+            logger.warning("Redis is not connected, documents will not be cached")
+            return
+        self.use_redis = True
+        self.task = asyncio.create_task(self._listen())
+    
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        self.use_redis = False
+
+document_cache = DocumentCache()
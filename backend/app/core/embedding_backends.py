@@ -0,0 +1,250 @@
+"""
+Embedding backends.
+
+The default backend runs the SentenceTransformer model with PyTorch. The ONNX
+backend exports the same model to ONNX once, optionally quantizes the weights to
+int8, and runs it with ONNX Runtime, which is considerably lighter on CPU-only
+nodes. Heavy dependencies are imported only by the backend that needs them.
+"""
+import fcntl
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def plan_length_batches(lengths: Sequence[int], max_batch_tokens: int, max_batch_size: int) -> List[np.ndarray]:
+    """
+    Group inputs into length-homogeneous batches.
+    Inputs are sorted by token length (longest first) and packed greedily so that
+    each padded batch (size x longest input) stays within max_batch_tokens.
+    Returns the input indices of each batch.
+    """
+    lengths = np.maximum(np.asarray(lengths, dtype=np.int64), 1)
+    order = np.argsort(-lengths, kind="stable")
+    
+    batches = []
+    start = 0
+    while start < len(order):
+        # Sorted longest first, so the first input sets the padded length of the batch
+        size = max(1, min(max_batch_size, max_batch_tokens // int(lengths[order[start]])))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+def padding_efficiency(lengths: Sequence[int], batches: Sequence[Sequence[int]]) -> float:
+    """Share of the padded batch positions holding real tokens."""
+    lengths = np.maximum(np.asarray(lengths, dtype=np.int64), 1)
+    padded = sum(len(batch) * int(lengths[batch].max()) for batch in map(np.asarray, batches) if len(batch))
+    return float(lengths.sum()) / padded if padded else 1.0
+
+class EmbeddingBackend(ABC):
+    """Interface for embedding backends."""
+    name = "base"
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+    
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a (len(texts), dim) float32 array."""
+        pass
+
+class BatchedEmbeddingBackend(EmbeddingBackend):
+    """
+    Base for backends running the model in process.
+    Subclasses embed one padded batch at a time; encode() takes care of splitting
+    the input into length-bucketed batches under a token budget.
+    """
+    
+    def __init__(self, model_name: str, batch_size: int = 128, max_batch_tokens: int = 8192):
+        super().__init__(model_name)
+        self.batch_size = batch_size  # Most inputs per batch
+        self.max_batch_tokens = max_batch_tokens  # Most padded tokens per batch
+    
+    @abstractmethod
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Number of tokens of each text after truncation."""
+        pass
+    
+    @abstractmethod
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed one batch of texts."""
+        pass
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts into a (len(texts), dim) float32 array.
+        Inputs are sorted by token length and embedded in length-homogeneous
+        batches, then the vectors are put back in input order.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if len(texts) == 1:
+            return np.asarray(self._encode_batch(texts), dtype=np.float32)
+        
+        vectors = None
+        for batch in plan_length_batches(self.token_lengths(texts), self.max_batch_tokens, self.batch_size):
+            batch_vectors = self._encode_batch([texts[i] for i in batch])
+            if vectors is None:
+                vectors = np.empty((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[batch] = batch_vectors
+        return vectors
+
+class SentenceTransformerBackend(BatchedEmbeddingBackend):
+    """Runs the model with sentence-transformers on PyTorch."""
+    name = "sentence-transformers"
+    
+    def __init__(self, model_name: str, batch_size: int = 128, max_batch_tokens: int = 8192):
+        super().__init__(model_name, batch_size, max_batch_tokens)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+    
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        encoded = self.model.tokenizer(texts, truncation=True, max_length=self.model.max_seq_length)
+        return np.array([len(ids) for ids in encoded["input_ids"]])
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=len(texts)), dtype=np.float32)
+
+class OnnxBackend(BatchedEmbeddingBackend):
+    """
+    Runs the model exported to ONNX with ONNX Runtime.
+    Mirrors the sentence-transformers pipeline of models like all-MiniLM-L6-v2:
+    mean pooling over the token embeddings followed by L2 normalization.
+    """
+    name = "onnx"
+    
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str,
+        quantize: bool = False,
+        max_seq_length: int = 256,
+        batch_size: int = 128,
+        max_batch_tokens: int = 8192,
+        num_threads: Optional[int] = None
+    ):
+        super().__init__(model_name, batch_size, max_batch_tokens)
+        import onnxruntime
+        from transformers import AutoTokenizer
+        
+        self.quantize = quantize
+        self.max_seq_length = max_seq_length
+        
+        model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+        model_path = self.export(model_name, model_dir, quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        logger.info(f"Loaded ONNX embedding model from {model_path}")
+    
+    @staticmethod
+    def export(model_name: str, model_dir: str, quantize: bool = False) -> str:
+        """Export the model (and its tokenizer) to ONNX unless already cached. Returns the model path."""
+        model_path = os.path.join(model_dir, "model.onnx")
+        quantized_path = os.path.join(model_dir, "model-int8.onnx")
+        target_path = quantized_path if quantize else model_path
+        if os.path.exists(target_path):
+            return target_path
+        
+        # Workers starting together export once; the others wait and reuse the files
+        os.makedirs(model_dir, exist_ok=True)
+        with open(os.path.join(model_dir, ".export.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(model_path):
+                OnnxBackend._export_model(model_name, model_dir, model_path)
+            if quantize and not os.path.exists(quantized_path):
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                
+                logger.info(f"Quantizing {model_path} to int8")
+                tmp_path = f"{quantized_path}.tmp"
+                quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+                os.replace(tmp_path, quantized_path)
+        return target_path
+    
+    @staticmethod
+    def _export_model(model_name: str, model_dir: str, model_path: str):
+        """Export the model to model_path and save its tokenizer next to it."""
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        
+        logger.info(f"Exporting {model_name} to ONNX in {model_dir}")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+        
+        input_names = list(tokenizer.model_input_names)
+        sample = tokenizer(["A sample sentence to trace the model."], return_tensors="pt")
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        
+        # Write to a temporary file first so a failed export is not cached
+        tmp_path = f"{model_path}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                tmp_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        # The tokenizer is saved before the model appears, which marks the export as complete
+        tokenizer.save_pretrained(model_dir)
+        os.replace(tmp_path, model_path)
+    
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_seq_length)
+        return np.array([len(ids) for ids in encoded["input_ids"]])
+    
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        
+        # Mean pooling over the real (non-padding) tokens
+        mask = encoded["attention_mask"].astype(np.float32)[:, :, None]
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+def get_embedding_version(name: str, model_name: str, quantize: bool = False) -> str:
+    """Identify the vectors a backend produces, for the embedding stage fingerprint."""
+    if name == SentenceTransformerBackend.name:
+        # The model name alone, so vectors computed before backends existed stay valid
+        return model_name
+    return f"{model_name}:{name}-int8" if quantize else f"{model_name}:{name}"
+
+def create_embedding_backend(name: str, model_name: Optional[str] = None) -> EmbeddingBackend:
+    """Create the embedding backend with the given name from settings."""
+    from app.core.config import settings
+    
+    model_name = model_name or settings.DEFAULT_EMBEDDING_MODEL
+    if name == SentenceTransformerBackend.name:
+        return SentenceTransformerBackend(
+            model_name,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_batch_tokens=settings.EMBEDDING_MAX_BATCH_TOKENS
+        )
+    if name == OnnxBackend.name:
+        return OnnxBackend(
+            model_name,
+            cache_dir=settings.EMBEDDING_CACHE_DIR,
+            quantize=settings.EMBEDDING_QUANTIZE,
+            max_seq_length=settings.EMBEDDING_MAX_SEQ_LENGTH,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_batch_tokens=settings.EMBEDDING_MAX_BATCH_TOKENS,
+            num_threads=settings.EMBEDDING_NUM_THREADS or None
+        )
+    raise ValueError(f"Unknown embedding backend: {name}")
@@ -0,0 +1,148 @@
+"""
+Local embedding inference sidecar.
+
+One process loads the embedding model and serves it over a Unix socket, so API
+and Celery worker processes do not each hold a copy of the weights. Vectors are
+returned as raw float32 bytes.
+
+Run it from the backend directory with:
+    python -m app.core.embedding_sidecar
+
+Protocol, all integers big-endian:
+    request:  uint32 length, then a JSON list of texts
+    response: uint8 0, uint32 rows, uint32 dim, then rows * dim float32 values
+              uint8 1, uint32 length, then a UTF-8 error message
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.embedding_backends import EmbeddingBackend
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+class EmbeddingSidecarServer:
+    """Serves an embedding backend over a Unix socket."""
+    
+    def __init__(self, backend: EmbeddingBackend, socket_path: str):
+        self.backend = backend
+        self.socket_path = socket_path
+        self.lock = asyncio.Lock()  # One inference at a time, the backend uses all cores already
+    
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer embedding requests on one connection until the client disconnects."""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    (length,) = struct.unpack("!I", await reader.readexactly(4))
+                    texts = json.loads(await reader.readexactly(length))
+                except asyncio.IncompleteReadError:
+                    break
+                
+                try:
+                    async with self.lock:
+                        vectors = await loop.run_in_executor(None, self.backend.encode, texts)
+                    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+                    rows, dim = vectors.shape
+                    writer.write(struct.pack("!BII", STATUS_OK, rows, dim) + vectors.tobytes())
+                except Exception as e:
+                    logger.error(f"Failed to generate embeddings: {e}")
+                    message = str(e).encode("utf-8")
+                    writer.write(struct.pack("!BI", STATUS_ERROR, len(message)) + message)
+                await writer.drain()
+        finally:
+            writer.close()
+    
+    async def start(self) -> asyncio.AbstractServer:
+        """Start listening, replacing a stale socket file left by a previous run."""
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"Embedding sidecar listening on {self.socket_path}")
+        return server
+    
+    async def serve_forever(self):
+        server = await self.start()
+        async with server:
+            await server.serve_forever()
+
+class SidecarBackend(EmbeddingBackend):
+    """Embedding backend that forwards requests to the sidecar process."""
+    name = "sidecar"
+    
+    def __init__(self, model_name: str, socket_path: str, timeout: float = 120.0):
+        super().__init__(model_name)
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.sock: Optional[socket.socket] = None
+        self.lock = threading.Lock()
+    
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+    
+    def _recv_exactly(self, size: int) -> bytearray:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            count = self.sock.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError("Embedding sidecar closed the connection")
+            received += count
+        return buffer
+    
+    def _request(self, payload: bytes) -> np.ndarray:
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(self.socket_path)
+        
+        self.sock.sendall(struct.pack("!I", len(payload)) + payload)
+        status = self._recv_exactly(1)[0]
+        if status != STATUS_OK:
+            (length,) = struct.unpack("!I", self._recv_exactly(4))
+            raise RuntimeError(f"Embedding sidecar error: {self._recv_exactly(length).decode('utf-8')}")
+        
+        rows, dim = struct.unpack("!II", self._recv_exactly(8))
+        return np.frombuffer(self._recv_exactly(rows * dim * 4), dtype=np.float32).reshape(rows, dim)
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        payload = json.dumps(texts).encode("utf-8")
+        with self.lock:
+            try:
+                return self._request(payload)
+            except OSError as e:
+                # The sidecar may have restarted, reconnect once
+                logger.warning(f"Embedding sidecar connection failed ({e}), reconnecting")
+                self.close()
+                return self._request(payload)
+
+def main():
+    from app.core.config import settings
+    from app.core.embedding_backends import create_embedding_backend
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    backend = create_embedding_backend(settings.EMBEDDING_BACKEND)
+    asyncio.run(EmbeddingSidecarServer(backend, settings.EMBEDDING_SIDECAR_SOCKET).serve_forever())
+
+if __name__ == "__main__":
+    main()
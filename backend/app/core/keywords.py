@@ -0,0 +1,136 @@
+"""
+Local keyword extraction with TF-IDF.
+
+Scoring a document is a handful of vectorized operations over its terms and
+their corpus document frequencies. KeywordExtractor keeps those frequencies in
+memory, in an array-backed vocabulary (term -> index into a numpy array), so
+extraction needs no I/O; app/db/keyword_stats.py periodically syncs them with the
+corpus-wide counts in MongoDB.
+"""
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+# Words in any script, starting with a letter, joined across apostrophes and hyphens
+TOKEN_PATTERN = re.compile(r"[^\W\d_]\w*(?:['-]\w+)*")
+MIN_TOKEN_LENGTH = 3
+# Hangul and CJK characters carry a syllable or word each, so two are a meaningful term
+MIN_WIDE_TOKEN_LENGTH = 2
+
+STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before being
+below between both but by can can't cannot could couldn't did didn't do does doesn't doing don't down
+during each either else etc even ever every few for from further get gets got had hadn't has hasn't have
+haven't having he her here hers herself him himself his how however i if in into is isn't it it's its
+itself just least less let's like made make many may me might more most much must my myself need neither
+never no nor not now of off often on once one only or other others our ours ourselves out over own per
+rather same say said says see seen shall she should shouldn't since so some still such than that that's
+the their theirs them themselves then there there's these they they're this those though through thus to
+too under until up upon us use used uses using very via was wasn't way we were weren't what what's when
+where which while who whom whose why will with within without won't would wouldn't yet you your yours
+yourself yourselves
+""".split())
+
+def _min_length(token: str) -> int:
+    wide = unicodedata.east_asian_width(token[0]) in ("W", "F")
+    return MIN_WIDE_TOKEN_LENGTH if wide else MIN_TOKEN_LENGTH
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms, dropping stop words and short tokens."""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) >= _min_length(token) and token not in STOP_WORDS
+    ]
+
+def rank_terms(tokens: List[str], doc_freqs: Sequence[int], num_documents: int, max_tags: int = 5) -> List[str]:
+    """
+    Return the terms of a tokenized document with the highest TF-IDF scores.
+    `doc_freqs` holds the corpus document frequency of each distinct term, in order of first occurrence.
+    """
+    if not tokens:
+        return []
+    term_counts = Counter(tokens)
+    terms = list(term_counts)
+    counts = np.fromiter(term_counts.values(), dtype=np.float64, count=len(terms))
+    doc_freq = np.asarray(doc_freqs, dtype=np.float64)
+    
+    # Smoothed IDF, as in scikit-learn
+    idf = np.log((1 + num_documents) / (1 + doc_freq)) + 1
+    scores = counts / len(tokens) * idf
+    
+    top = min(max_tags, len(terms))
+    best = np.argpartition(-scores, top - 1)[:top].tolist()
+    # Sort by score, breaking ties alphabetically for stable output
+    best.sort(key=lambda i: (-scores[i], terms[i]))
+    return [terms[i] for i in best]
+
+class KeywordExtractor:
+    """TF-IDF keyword extractor with corpus statistics that are updated incrementally."""
+    
+    def __init__(self, initial_capacity: int = 4096):
+        self.vocabulary: Dict[str, int] = {}
+        self.doc_freq = np.zeros(initial_capacity, dtype=np.int32)
+        self.num_documents = 0
+    
+    def _term_ids(self, terms: Iterable[str]) -> np.ndarray:
+        """Look up term indices, adding unseen terms to the vocabulary."""
+        ids = []
+        for term in terms:
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                term_id = self.vocabulary[term] = len(self.vocabulary)
+            ids.append(term_id)
+        
+        # Grow the frequency array geometrically
+        if len(self.vocabulary) > len(self.doc_freq):
+            capacity = max(len(self.vocabulary), 2 * len(self.doc_freq))
+            self.doc_freq = np.concatenate([self.doc_freq, np.zeros(capacity - len(self.doc_freq), dtype=np.int32)])
+        return np.array(ids, dtype=np.int64)
+    
+    def add_document(self, text: str):
+        """Count a document's terms in the corpus statistics."""
+        self.add_counts(dict.fromkeys(set(tokenize(text)), 1), 1)
+    
+    def add_counts(self, doc_freqs: Dict[str, int], num_documents: int):
+        """Add document frequencies counted elsewhere, e.g. loaded from a shared store."""
+        if doc_freqs:
+            ids = self._term_ids(doc_freqs)  # May grow the array, so look up ids first
+            self.doc_freq[ids] += np.fromiter(doc_freqs.values(), dtype=np.int32, count=len(doc_freqs))
+        self.num_documents += num_documents
+    
+    def extract(self, text: str, max_tags: int = 5) -> List[str]:
+        """Return the terms of text with the highest TF-IDF scores."""
+        tokens = tokenize(text)
+        lookup = self.vocabulary.get
+        ids = np.fromiter((lookup(term, -1) for term in dict.fromkeys(tokens)), dtype=np.int64)
+        doc_freq = np.where(ids >= 0, self.doc_freq[np.maximum(ids, 0)], 0)
+        return rank_terms(tokens, doc_freq, self.num_documents, max_tags)
+    
+    def save(self, path: str):
+        """Save the statistics to a compressed .npz file, replacing it atomically."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        terms = np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            terms=terms,
+            doc_freq=self.doc_freq[:len(terms)],
+            num_documents=np.array(self.num_documents)
+        )
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> "KeywordExtractor":
+        """Load statistics saved with save()."""
+        with np.load(path) as data:
+            extractor = cls(initial_capacity=max(len(data["terms"]), 1))
+            extractor.vocabulary = {term: i for i, term in enumerate(data["terms"].tolist())}
+            extractor.doc_freq[:len(data["doc_freq"])] = data["doc_freq"]
+            extractor.num_documents = int(data["num_documents"])
+        return extractor
@@ -1,212 +1,365 @@
 import os
+import gc
+import asyncio
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 import httpx
 import json
-from sentence_transformers import SentenceTransformer
+import numpy as np
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from app.core.config import settings
+from app.core.embedding_backends import EmbeddingBackend, create_embedding_backend, get_embedding_version
+from app.core.embedding_sidecar import SidecarBackend
+from app.core.provider_scheduler import ProviderScheduler, ProviderError, ProviderUnavailable
+from app.core.prompts import (
+    build_summary_messages, build_chunk_summary_messages, build_merge_summary_messages,
+    build_tag_messages, parse_tags, SUMMARY_MAX_TOKENS, TAGS_MAX_TOKENS
+)
+from app.core.summarization import (
+    count_tokens, truncate_to_budget, chunk_text, max_map_reduce_chunks, sample_chunks,
+    split_sentences, rank_sentences_mmr
+)
+from app.db.keyword_stats import keyword_stats
 
 logger = logging.getLogger(__name__)
 
+# Chat completion providers, in the order they are tried
+PROVIDERS = {
+    "deepseek": {
+        "url": "https://api.deepseek.com/v1/chat/completions",
+        "model": "deepseek-chat"
+    },
+    "openai": {
+        "url": f"{settings.OPENAI_BASE_URL}/chat/completions",
+        "model": "gpt-3.5-turbo"
+    }
+}
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
 class LLMClient:
     """Client for interacting with various LLM APIs."""
     
     def __init__(self):
-        self.embedding_model = None
+        self.embedding_model: Optional[EmbeddingBackend] = None
+        self.embedding_executor: Optional[ThreadPoolExecutor] = None
+        self.query_embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.scheduler = ProviderScheduler(
+            max_retries=settings.LLM_MAX_RETRIES,
+            base_delay=settings.LLM_RETRY_BASE_DELAY,
+            max_delay=settings.LLM_RETRY_MAX_DELAY,
+            max_wait=settings.LLM_MAX_QUEUE_WAIT,
+            failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.LLM_CIRCUIT_RESET_SECONDS
+        )
+        self.scheduler.register("deepseek", settings.DEEPSEEK_REQUESTS_PER_MINUTE)
+        self.scheduler.register("openai", settings.OPENAI_REQUESTS_PER_MINUTE)
     
-    async def load_embedding_model(self):
-        """Load the embedding model."""
+    def _get_api_key(self, provider: str) -> Optional[str]:
+        """Get the API key of a provider, if configured."""
+        return {
+            "deepseek": settings.DEEPSEEK_API_KEY,
+            "openai": settings.OPENAI_API_KEY
+        }.get(provider)
+    
+    def has_providers(self) -> bool:
+        """Whether any LLM provider is configured."""
+        return any(self._get_api_key(provider) for provider in PROVIDERS)
+    
+    def _load_embedding_model(self):
+        """Load the embedding model, or connect to the sidecar serving it."""
         try:
-            self.embedding_model = SentenceTransformer(settings.DEFAULT_EMBEDDING_MODEL)
-            logger.info(f"Loaded embedding model: {settings.DEFAULT_EMBEDDING_MODEL}")
+            if settings.EMBEDDING_HOSTING == "sidecar":
+                self.embedding_model = SidecarBackend(settings.DEFAULT_EMBEDDING_MODEL, settings.EMBEDDING_SIDECAR_SOCKET)
+                logger.info(f"Using embedding sidecar at {settings.EMBEDDING_SIDECAR_SOCKET}")
+            else:
+                self.embedding_model = create_embedding_backend(settings.EMBEDDING_BACKEND)
+                logger.info(f"Loaded embedding model: {settings.DEFAULT_EMBEDDING_MODEL} ({settings.EMBEDDING_BACKEND})")
         except Exception as e:
             logger.error(f"Failed to load embedding model: {e}")
             raise
     
-    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Get embeddings for a list of texts."""
+    async def load_embedding_model(self):
+        """Load the embedding model."""
+        self._load_embedding_model()
+    
+    def preload_embedding_model(self):
+        """
+        Load the embedding model in a parent process before it forks its workers.
+        The workers then share the weights copy-on-write. Freezing the GC keeps the
+        collector from writing to (and so copying) the pages of the preloaded objects.
+        """
+        if not self.embedding_model:
+            self._load_embedding_model()
+        gc.collect()
+        gc.freeze()
+        logger.info("Preloaded embedding model for forked workers")
+    
+    async def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Get embeddings for a list of texts, as a (len(texts), dim) float32 array."""
         if not self.embedding_model:
             await self.load_embedding_model()
         
+        if self.embedding_executor is None:
+            # Created on first use, after any preload fork. Encoding blocks (local inference
+            # or a round trip to the sidecar), so it runs off the event loop, one batch at a
+            # time: local models use every core already and the sidecar serves one request
+            # per connection.
+            self.embedding_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        
         try:
-            embeddings = self.embedding_model.encode(texts)
-            return embeddings.tolist()
+            return await asyncio.get_running_loop().run_in_executor(
+                self.embedding_executor, self.embedding_model.encode, texts
+            )
         except Exception as e:
             logger.error(f"Failed to generate embeddings: {e}")
             raise
     
-    async def summarize_text(self, text: str, max_length: int = 200) -> str:
-        """Summarize text using OpenAI API or DeepSeek API."""
-        # Try DeepSeek first if available
-        if settings.DEEPSEEK_API_KEY:
-            try:
-                return await self._summarize_with_deepseek(text, max_length)
-            except Exception as e:
-                logger.error(f"Failed to summarize with DeepSeek: {e}")
-                # Fall through to OpenAI
-        
-        # Try OpenAI if available
-        if settings.OPENAI_API_KEY:
-            try:
-                return await self._summarize_with_openai(text, max_length)
-            except Exception as e:
-                logger.error(f"Failed to summarize with OpenAI: {e}")
-                # Fall through to fallback
+    async def get_query_embedding(self, query: str) -> np.ndarray:
+        """Get the embedding of a search query, keeping recent queries in an LRU cache."""
+        vector = self.query_embedding_cache.get(query)
+        if vector is not None:
+            self.query_embedding_cache.move_to_end(query)
+            return vector
         
-        # Fallback to a simple summarization
-        logger.warning("No API keys available, using fallback summarization")
-        sentences = text.split('. ')
-        summary = '. '.join(sentences[:3]) + '.'
-        return summary[:max_length]
-        
-    async def _summarize_with_deepseek(self, text: str, max_length: int = 200) -> str:
-        """Summarize text using DeepSeek API."""
+        vector = (await self.get_embeddings([query]))[0]
+        vector.setflags(write=False)  # Shared between requests
+        self.query_embedding_cache[query] = vector
+        if len(self.query_embedding_cache) > settings.QUERY_EMBEDDING_CACHE_SIZE:
+            self.query_embedding_cache.popitem(last=False)
+        return vector
+    
+    async def update_keyword_stats(self, text: str):
+        """Count a new document in the corpus keyword statistics."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "deepseek-chat",
-                        "messages": [
-                            {"role": "system", "content": "You are a helpful assistant that summarizes text."},
-                            {"role": "user", "content": f"Summarize the following text in about 100 words:\n\n{text}"}
-                        ],
-                        "max_tokens": 150
-                    },
-                    timeout=30.0
-                )
-                
-                response_data = response.json()
-                summary = response_data["choices"][0]["message"]["content"].strip()
-                return summary
+            await keyword_stats.add_document(text)
         except Exception as e:
-            logger.error(f"Failed to summarize text with DeepSeek: {e}")
-            raise
+            logger.error(f"Failed to update keyword statistics: {e}")
     
-    async def _summarize_with_openai(self, text: str, max_length: int = 200) -> str:
-        """Summarize text using OpenAI API."""
-        if not settings.OPENAI_API_KEY:
-            raise ValueError("OpenAI API key not set")
-            
+    def get_stage_versions(self) -> Dict[str, str]:
+        """Get the versions of the components behind each processing stage."""
+        return {
+            "summary": settings.SUMMARIZER_VERSION,
+            "tags": settings.TAGGER_VERSION,
+            "embedding": get_embedding_version(
+                settings.EMBEDDING_BACKEND, settings.DEFAULT_EMBEDDING_MODEL, settings.EMBEDDING_QUANTIZE
+            )
+        }
+    
+    async def _post_chat_completion(self, provider: str, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        """Send a single chat completion request, translating HTTP errors into ProviderErrors."""
+        config = PROVIDERS[provider]
         try:
             async with httpx.AsyncClient() as client:
                 response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
+                    config["url"],
                     headers={
-                        "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
+                        "Authorization": f"Bearer {self._get_api_key(provider)}",
                         "Content-Type": "application/json"
                     },
                     json={
-                        "model": "gpt-3.5-turbo",
-                        "messages": [
-                            {"role": "system", "content": "You are a helpful assistant that summarizes text."},
-                            {"role": "user", "content": f"Summarize the following text in about 100 words:\n\n{text}"}
-                        ],
-                        "max_tokens": 150
+                        "model": config["model"],
+                        "messages": messages,
+                        "max_tokens": max_tokens
                     },
-                    timeout=30.0
+                    timeout=settings.LLM_REQUEST_TIMEOUT
                 )
-                
-                response_data = response.json()
-                summary = response_data["choices"][0]["message"]["content"].strip()
-                return summary
-        except Exception as e:
-            logger.error(f"Failed to summarize text with OpenAI: {e}")
-            raise
+        except httpx.TimeoutException as e:
+            # Do not retry timeouts, the caller already waited the full timeout
+            raise ProviderError(f"{provider} request timed out", retryable=False) from e
+        except httpx.TransportError as e:
+            raise ProviderError(f"{provider} connection failed: {e}") from e
+        
+        if response.status_code == 429 or response.status_code >= 500:
+            raise ProviderError(
+                f"{provider} returned {response.status_code}",
+                status_code=response.status_code,
+                retry_after=_parse_retry_after(response.headers.get("Retry-After"))
+            )
+        if response.status_code >= 400:
+            raise ProviderError(
+                f"{provider} returned {response.status_code}: {response.text[:200]}",
+                status_code=response.status_code,
+                retryable=False
+            )
+        
+        response_data = response.json()
+        return response_data["choices"][0]["message"]["content"].strip()
     
-    async def extract_tags(self, text: str, max_tags: int = 5) -> List[str]:
-        """Extract tags from text using DeepSeek or OpenAI API."""
-        # Try DeepSeek first if available
-        if settings.DEEPSEEK_API_KEY:
+    async def _chat_completion(self, provider: str, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        """Run a chat completion through the provider scheduler."""
+        if not self._get_api_key(provider):
+            raise ValueError(f"{provider} API key not set")
+        return await self.scheduler.call(
+            provider,
+            lambda: self._post_chat_completion(provider, messages, max_tokens)
+        )
+    
+    async def _try_providers(self, operation: str, call) -> Optional[Any]:
+        """Try each configured provider in order. Returns None if none of them succeeded."""
+        for provider in PROVIDERS:
+            if not self._get_api_key(provider):
+                continue
             try:
-                return await self._extract_tags_with_deepseek(text, max_tags)
+                return await call(provider)
+            except ProviderUnavailable as e:
+                logger.warning(f"Skipping {provider} for {operation}: {e}")
             except Exception as e:
-                logger.error(f"Failed to extract tags with DeepSeek: {e}")
-                # Fall through to OpenAI
+                logger.error(f"Failed to {operation} with {provider}: {e}")
+        return None
+    
+    async def summarize_text(self, text: str, max_length: int = 200, fallback: bool = True) -> str:
+        """
+        Summarize text using DeepSeek API or OpenAI API.
+        Text over the input budget is sampled down to it; documents over the
+        map-reduce threshold are summarized chunk by chunk instead.
+        If no provider succeeds, falls back to an extractive summary, or raises
+        ProviderUnavailable when `fallback` is False.
+        """
+        if count_tokens(text) > settings.SUMMARY_MAP_REDUCE_THRESHOLD:
+            summary = await self._summarize_map_reduce(text)
+        else:
+            prompt_text = truncate_to_budget(text, settings.SUMMARY_INPUT_TOKEN_BUDGET)
+            summary = await self._try_providers(
+                "summarize",
+                lambda provider: self._summarize_with_provider(provider, prompt_text, max_length)
+            )
+        if summary is not None:
+            return summary
+        if not fallback:
+            raise ProviderUnavailable("No LLM provider could summarize the text")
         
-        # Try OpenAI if available
-        if settings.OPENAI_API_KEY:
-            try:
-                return await self._extract_tags_with_openai(text, max_tags)
-            except Exception as e:
-                logger.error(f"Failed to extract tags with OpenAI: {e}")
-                # Fall through to fallback
+        # Fallback to a local extractive summary
+        logger.warning("No LLM provider available, using fallback summarization")
+        return await self.extractive_summary(text, max_length)
+    
+    async def extractive_summary(self, text: str, max_length: int = 200) -> str:
+        """
+        Summarize text without an LLM: embed its sentences in one batch and keep the
+        central, non-redundant ones (in document order) that fit in max_length characters.
+        """
+        sentences = sample_chunks(split_sentences(text), settings.EXTRACTIVE_SUMMARY_MAX_SENTENCES)
+        if not sentences:
+            return text[:max_length]
         
-        # Fallback to simple word frequency
-        logger.warning("No API keys available, using fallback tag extraction")
-        words = text.lower().split()
-        word_freq = {}
-        for word in words:
-            if len(word) > 3:  # Only consider words longer than 3 characters
-                word_freq[word] = word_freq.get(word, 0) + 1
+        try:
+            embeddings = await self.get_embeddings(sentences)
+            ranking = rank_sentences_mmr(embeddings, limit=10)
+        except Exception as e:
+            logger.error(f"Failed to rank sentences, using leading sentences: {e}")
+            ranking = list(range(len(sentences)))
+        
+        selected, length = [], 0
+        for index in ranking:
+            if selected and length + len(sentences[index]) + 1 > max_length:
+                continue
+            selected.append(index)
+            length += len(sentences[index]) + 1
+        
+        summary = " ".join(sentences[index] for index in sorted(selected))
+        return summary[:max_length]
+    
+    async def _summarize_map_reduce(self, text: str) -> Optional[str]:
+        """
+        Summarize a long document by summarizing its chunks concurrently and merging the results.
+        Chunks are sampled evenly when summarizing all of them would exceed the per-document token cap.
+        """
+        chunks = chunk_text(text, settings.SUMMARY_CHUNK_TOKENS)
+        max_chunks = max_map_reduce_chunks(
+            settings.SUMMARY_MAX_TOKENS_PER_DOCUMENT, settings.SUMMARY_CHUNK_TOKENS, SUMMARY_MAX_TOKENS
+        )
+        if len(chunks) > max_chunks:
+            logger.info(f"Sampling {max_chunks} of {len(chunks)} chunks to stay within the token cap")
+            chunks = sample_chunks(chunks, max_chunks)
         
-        # Sort by frequency and return top words
-        sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-        return [word for word, _ in sorted_words[:max_tags]]
+        semaphore = asyncio.Semaphore(settings.SUMMARY_MAP_CONCURRENCY)
+        
+        async def summarize_chunk(index: int, chunk: str) -> Optional[str]:
+            messages = build_chunk_summary_messages(chunk, index, len(chunks))
+            async with semaphore:
+                return await self._try_providers(
+                    "summarize chunk",
+                    lambda provider: self._chat_completion(provider, messages, max_tokens=SUMMARY_MAX_TOKENS)
+                )
+        
+        # Map: summarize the chunks concurrently, skipping chunks that failed
+        results = await asyncio.gather(*(summarize_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+        chunk_summaries = [summary for summary in results if summary]
+        if not chunk_summaries:
+            return None
+        if len(chunk_summaries) == 1:
+            return chunk_summaries[0]
+        
+        # Reduce: merge the chunk summaries into one
+        messages = build_merge_summary_messages(chunk_summaries)
+        summary = await self._try_providers(
+            "merge summaries",
+            lambda provider: self._chat_completion(provider, messages, max_tokens=SUMMARY_MAX_TOKENS)
+        )
+        return summary if summary is not None else " ".join(chunk_summaries)
+    
+    async def _summarize_with_provider(self, provider: str, text: str, max_length: int = 200) -> str:
+        """Summarize text using a chat completion provider."""
+        return await self._chat_completion(provider, build_summary_messages(text), max_tokens=SUMMARY_MAX_TOKENS)
+    
+    async def _summarize_with_deepseek(self, text: str, max_length: int = 200) -> str:
+        """Summarize text using DeepSeek API."""
+        return await self._summarize_with_provider("deepseek", text, max_length)
+    
+    async def _summarize_with_openai(self, text: str, max_length: int = 200) -> str:
+        """Summarize text using OpenAI API."""
+        return await self._summarize_with_provider("openai", text, max_length)
+    
+    async def extract_tags(self, text: str, max_tags: int = 5, fallback: bool = True) -> List[str]:
+        """
+        Extract tags from text using DeepSeek or OpenAI API.
+        If no provider succeeds, falls back to local keyword extraction, or raises
+        ProviderUnavailable when `fallback` is False.
+        """
+        prompt_text = truncate_to_budget(text, settings.TAGS_INPUT_TOKEN_BUDGET)
+        tags = await self._try_providers(
+            "extract tags",
+            lambda provider: self._extract_tags_with_provider(provider, prompt_text, max_tags)
+        )
+        if tags is not None:
+            return tags
+        if not fallback:
+            raise ProviderUnavailable("No LLM provider could extract tags")
         
+        # Fallback to local TF-IDF keyword extraction
+        logger.warning("No LLM provider available, using fallback tag extraction")
+        return await self.keyword_tags(text, max_tags)
+    
+    async def keyword_tags(self, text: str, max_tags: int = 5) -> List[str]:
+        """Extract tags from text locally, by TF-IDF keyword extraction over the corpus statistics."""
+        return await keyword_stats.extract(text, max_tags)
+    
+    async def _extract_tags_with_provider(self, provider: str, text: str, max_tags: int = 5) -> List[str]:
+        """Extract tags from text using a chat completion provider."""
+        tags_text = await self._chat_completion(provider, build_tag_messages(text, max_tags), max_tokens=TAGS_MAX_TOKENS)
+        return parse_tags(tags_text)
+    
     async def _extract_tags_with_deepseek(self, text: str, max_tags: int = 5) -> List[str]:
         """Extract tags from text using DeepSeek API."""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.deepseek.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.DEEPSEEK_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "deepseek-chat",
-                        "messages": [
-                            {"role": "system", "content": "You are a helpful assistant that extracts relevant tags from text."},
-                            {"role": "user", "content": f"Extract {max_tags} relevant tags from this text. Return only the tags as a comma-separated list without explanations:\n\n{text}"}
-                        ],
-                        "max_tokens": 50
-                    },
-                    timeout=30.0
-                )
-                
-                response_data = response.json()
-                tags_text = response_data["choices"][0]["message"]["content"].strip()
-                tags = [tag.strip() for tag in tags_text.split(',')]
-                return tags
-        except Exception as e:
-            logger.error(f"Failed to extract tags with DeepSeek: {e}")
-            raise
+        return await self._extract_tags_with_provider("deepseek", text, max_tags)
     
     async def _extract_tags_with_openai(self, text: str, max_tags: int = 5) -> List[str]:
         """Extract tags from text using OpenAI API."""
-        if not settings.OPENAI_API_KEY:
-            raise ValueError("OpenAI API key not set")
-            
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": "gpt-3.5-turbo",
-                        "messages": [
-                            {"role": "system", "content": "You are a helpful assistant that extracts relevant tags from text."},
-                            {"role": "user", "content": f"Extract {max_tags} relevant tags from this text. Return only the tags as a comma-separated list without explanations:\n\n{text}"}
-                        ],
-                        "max_tokens": 50
-                    },
-                    timeout=30.0
-                )
-                
-                response_data = response.json()
-                tags_text = response_data["choices"][0]["message"]["content"].strip()
-                tags = [tag.strip() for tag in tags_text.split(',')]
-                return tags
-        except Exception as e:
-            logger.error(f"Failed to extract tags with OpenAI: {e}")
-            raise
+        return await self._extract_tags_with_provider("openai", text, max_tags)
 
 llm_client = LLMClient()
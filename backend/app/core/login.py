@@ -0,0 +1,81 @@
+"""
+Login service for BlueWhale.
+
+A login reads the user document once and takes the password hash and MFA state
+from it; verifying a TOTP code needs no database access and a backup code is a
+single atomic update. The writes a successful login makes (last login time, an
+upgraded password hash, the refresh token) are issued concurrently.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, status
+
+from app.core.auth import (
+    ACCESS_TOKEN_EXPIRE_MINUTES, RefreshToken, create_access_token, create_refresh_token,
+    invalidate_user, password_hasher
+)
+from app.core.config import settings
+from app.core.mfa import verify_backup_code, verify_totp
+from app.db.mongo import mongodb
+from app.models.user import UserInDB
+
+class LoginResult(NamedTuple):
+    """Outcome of a login: either MFA is still required, or the issued tokens."""
+    user: UserInDB
+    mfa_required: bool = False
+    access_token: Optional[str] = None
+    refresh_token: Optional[RefreshToken] = None
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+async def login(
+    username: str,
+    password: str,
+    mfa_code: Optional[str] = None,
+    user_agent: Optional[str] = None,
+    ip_address: Optional[str] = None
+) -> LoginResult:
+    """
+    Authenticate a user by password and, if enabled, MFA code, and issue tokens.
+    Raises a 401 HTTPException if the credentials are wrong.
+    """
+    users_collection = mongodb.get_collection("users")
+    user_dict = await users_collection.find_one({"username": username}, max_time_ms=settings.MONGODB_MAX_TIME_MS)
+    if not user_dict:
+        raise _unauthorized("Incorrect username or password")
+    user = UserInDB(**user_dict)
+    
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        raise _unauthorized("Incorrect username or password")
+    
+    if user.mfa_enabled:
+        if not mfa_code:
+            return LoginResult(user=user, mfa_required=True)
+        if not await verify_totp(user.mfa_secret, mfa_code) and not await verify_backup_code(user.id, mfa_code):
+            raise _unauthorized("Invalid MFA code")
+    
+    updates = {"last_login": datetime.utcnow()}
+    if new_hash:
+        # The stored hash uses an outdated scheme or cost, upgrade it while we have the password
+        updates["hashed_password"] = new_hash
+    
+    _, refresh_token = await asyncio.gather(
+        users_collection.update_one({"id": user.id}, {"$set": updates}),
+        create_refresh_token(user_id=user.id, username=user.username, user_agent=user_agent, ip_address=ip_address)
+    )
+    invalidate_user(user.id)
+    user = user.copy(update=updates)
+    
+    access_token = create_access_token(
+        data={"sub": user.username, "user_id": user.id, "ver": user.token_version},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return LoginResult(user=user, access_token=access_token, refresh_token=refresh_token)
@@ -12,7 +12,12 @@ from pydantic import BaseModel
 
 from app.db.mongo import mongodb
 from app.models.user import UserInDB
-from app.core.auth import get_current_user
+from app.core.auth import SECRET_KEY, get_current_user, invalidate_user, verify_password
+from app.core.backup_codes import backup_code_digest, derive_key, legacy_hashes
+from app.core.config import settings
+
+# Never the JWT signing key itself
+BACKUP_CODE_KEY = settings.MFA_BACKUP_CODE_SECRET or derive_key(SECRET_KEY, "backup-codes")
 
 
 class MFASetupResponse(BaseModel):
@@ -83,32 +88,35 @@ async def generate_backup_codes() -> list[str]:
 
 
 async def hash_backup_codes(codes: list[str]) -> list[str]:
-    """Hash backup codes for secure storage"""
-    from app.core.auth import get_password_hash
-    
-    # Hash each code
-    return [get_password_hash(code) for code in codes]
+    """Digest backup codes for secure storage"""
+    return [backup_code_digest(code, BACKUP_CODE_KEY) for code in codes]
 
 
 async def verify_backup_code(user_id: str, code: str) -> bool:
-    """Verify a backup code for a user"""
-    from app.core.auth import verify_password
-    
+    """Verify a backup code for a user and consume it"""
     users_collection = mongodb.get_collection("users")
-    user = await users_collection.find_one({"_id": user_id})
     
-    if not user or not user.get("mfa_backup_codes"):
-        return False
+    # Matching and removing the digest in one update makes each code single-use,
+    # even when the same code is submitted concurrently
+    digest = backup_code_digest(code, BACKUP_CODE_KEY)
+    result = await users_collection.update_one(
+        {"id": user_id, "mfa_backup_codes": digest},
+        {"$pull": {"mfa_backup_codes": digest}}
+    )
+    if result.modified_count:
+        invalidate_user(user_id)
+        return True
     
-    # Check if the code matches any of the hashed backup codes
-    for hashed_code in user["mfa_backup_codes"]:
-        if verify_password(code, hashed_code):
-            # Remove the used backup code
-            await users_collection.update_one(
-                {"_id": user_id},
+    # Codes issued before digests were introduced are bcrypt hashes
+    user = await users_collection.find_one({"id": user_id}, {"mfa_backup_codes": 1})
+    for hashed_code in legacy_hashes((user or {}).get("mfa_backup_codes") or []):
+        if await verify_password(code, hashed_code):
+            result = await users_collection.update_one(
+                {"id": user_id, "mfa_backup_codes": hashed_code},
                 {"$pull": {"mfa_backup_codes": hashed_code}}
             )
-            return True
+            invalidate_user(user_id)
+            return result.modified_count > 0
     
     return False
 
@@ -116,7 +124,7 @@ async def verify_backup_code(user_id: str, code: str) -> bool:
 async def is_mfa_enabled(user_id: str) -> bool:
     """Check if MFA is enabled for a user"""
     users_collection = mongodb.get_collection("users")
-    user = await users_collection.find_one({"_id": user_id})
+    user = await users_collection.find_one({"id": user_id})
     
     return user is not None and user.get("mfa_enabled", False)
 
@@ -124,7 +132,7 @@ async def is_mfa_enabled(user_id: str) -> bool:
 async def get_mfa_secret(user_id: str) -> Optional[str]:
     """Get the MFA secret for a user"""
     users_collection = mongodb.get_collection("users")
-    user = await users_collection.find_one({"_id": user_id})
+    user = await users_collection.find_one({"id": user_id})
     
     return user.get("mfa_secret") if user else None
 
@@ -147,7 +155,7 @@ async def setup_mfa(user: UserInDB) -> MFASetupResponse:
     # Store the secret and backup codes in the database
     users_collection = mongodb.get_collection("users")
     await users_collection.update_one(
-        {"_id": user.id},
+        {"id": user.id},
         {
             "$set": {
                 "mfa_secret": secret,
@@ -158,6 +166,7 @@ async def setup_mfa(user: UserInDB) -> MFASetupResponse:
             }
         }
     )
+    invalidate_user(user.id)
     
     return MFASetupResponse(
         secret=secret,
@@ -169,7 +178,7 @@ async def setup_mfa(user: UserInDB) -> MFASetupResponse:
 async def enable_mfa(user_id: str, code: str) -> bool:
     """Enable MFA for a user after verifying the code"""
     users_collection = mongodb.get_collection("users")
-    user = await users_collection.find_one({"_id": user_id})
+    user = await users_collection.find_one({"id": user_id})
     
     if not user or not user.get("mfa_secret"):
         raise HTTPException(
@@ -183,9 +192,10 @@ async def enable_mfa(user_id: str, code: str) -> bool:
     
     # Enable MFA
     await users_collection.update_one(
-        {"_id": user_id},
+        {"id": user_id},
         {"$set": {"mfa_enabled": True}}
     )
+    invalidate_user(user_id)
     
     return True
 
@@ -196,7 +206,7 @@ async def disable_mfa(user_id: str) -> bool:
     
     # Remove MFA data
     result = await users_collection.update_one(
-        {"_id": user_id},
+        {"id": user_id},
         {
             "$set": {"mfa_enabled": False},
             "$unset": {
@@ -206,6 +216,7 @@ async def disable_mfa(user_id: str) -> bool:
             }
         }
     )
+    invalidate_user(user_id)
     
     return result.modified_count > 0
 
@@ -220,9 +231,10 @@ async def get_backup_codes(user_id: str) -> list[str]:
     
     # Update backup codes in the database
     await users_collection.update_one(
-        {"_id": user_id},
+        {"id": user_id},
         {"$set": {"mfa_backup_codes": hashed_backup_codes}}
     )
+    invalidate_user(user_id)
     
     return backup_codes
 
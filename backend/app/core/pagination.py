@@ -0,0 +1,46 @@
+"""
+Keyset (seek) pagination.
+
+Pages are ordered by (created_at, id), newest first, and a page ends with an
+opaque cursor encoding the last (created_at, id) returned. The next page asks for
+rows strictly after that key, which a compound index serves directly instead of
+skipping over every earlier row. Documents without a created_at sort after all
+dated ones, ordered by id alone.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Sort matching the (..., created_at, id) compound index
+KEYSET_SORT = [("created_at", -1), ("id", -1)]
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """Encode the sort key of the last document of a page as an opaque cursor."""
+    created_at = document.get("created_at")
+    key = {"created_at": created_at.isoformat() if created_at else None, "id": document["id"]}
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decode a cursor into its (created_at, id) key. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created_at = key["created_at"]
+        return {"created_at": datetime.fromisoformat(created_at) if created_at is not None else None, "id": str(key["id"])}
+    except (TypeError, KeyError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_filter(cursor: Optional[str]) -> Dict[str, Any]:
+    """Build the filter selecting rows after a cursor, in KEYSET_SORT order."""
+    if not cursor:
+        return {}
+    key = decode_cursor(cursor)
+    # Null and missing created_at sort lowest, so they come after every dated row
+    if key["created_at"] is None:
+        return {"created_at": None, "id": {"$lt": key["id"]}}
+    return {"$or": [
+        {"created_at": {"$lt": key["created_at"]}},
+        {"created_at": key["created_at"], "id": {"$lt": key["id"]}},
+        {"created_at": None}
+    ]}
@@ -0,0 +1,91 @@
+"""
+Password hashing off the event loop.
+
+bcrypt deliberately burns ~100-300 ms of CPU per hash or verification. Running
+it inline in async handlers stalls every other request on the worker, so the
+hashing service runs it in a small dedicated thread pool (bcrypt releases the
+GIL) behind a concurrency cap, and rejects work once too much is queued.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+class HasherOverloaded(RuntimeError):
+    """Raised when too many password operations are already waiting."""
+
+class PasswordHasher:
+    """
+    Runs the hash operations of a passlib CryptContext in a bounded thread pool.
+    At most max_workers operations run at once; up to max_queue more may wait.
+    """
+    
+    def __init__(self, context: Any, max_workers: int = 2, max_queue: int = 64):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hasher")
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.run_seconds = 0.0
+    
+    async def _run(self, function: Callable, *args) -> Any:
+        if self.semaphore is None:
+            # Created on first use so it belongs to the running event loop
+            self.semaphore = asyncio.Semaphore(self.max_workers)
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HasherOverloaded(f"{self.waiting} password operations already waiting")
+        
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        wait = started_at - queued_at
+        self.wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        
+        self.active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self.run_seconds += time.perf_counter() - started_at
+            self.semaphore.release()
+    
+    async def hash(self, password: str) -> str:
+        """Hash a password with the context's current scheme and cost."""
+        return await self._run(self.context.hash, password)
+    
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verify a password against a hash."""
+        return await self._run(self.context.verify, password, hashed_password)
+    
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and, if its hash uses an outdated scheme or cost, rehash it.
+        Returns whether the password matched and the new hash to store, if any.
+        """
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get queue and throughput counters."""
+        return {
+            "max_workers": self.max_workers,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": 1000 * self.wait_seconds / self.completed if self.completed else 0.0,
+            "max_wait_ms": 1000 * self.max_wait_seconds,
+            "avg_run_ms": 1000 * self.run_seconds / self.completed if self.completed else 0.0
+        }
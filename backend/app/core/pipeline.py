@@ -0,0 +1,43 @@
+"""
+Stage fingerprinting for the document processing pipeline.
+
+Each processing stage (summary, tags, embedding) records a fingerprint of the
+inputs it was computed from: the content hash plus the version of the component
+that produced it. A reprocess only reruns stages whose fingerprint changed.
+"""
+import hashlib
+from typing import Dict, Any, Iterable, Set
+
+# Stages in the order they are run
+PIPELINE_STAGES = ("summary", "tags", "embedding")
+
+def compute_content_hash(content: str) -> str:
+    """Compute a stable hash of document content."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def compute_stage_fingerprints(content_hash: str, stage_versions: Dict[str, str]) -> Dict[str, str]:
+    """Compute the expected fingerprint of every stage for the given content."""
+    fingerprints = {}
+    for stage in PIPELINE_STAGES:
+        version = stage_versions.get(stage, "")
+        fingerprints[stage] = hashlib.sha256(f"{stage}:{version}:{content_hash}".encode("utf-8")).hexdigest()
+    return fingerprints
+
+def get_stale_stages(document: Dict[str, Any], fingerprints: Dict[str, str], force: bool = False) -> Set[str]:
+    """Return the stages whose recorded fingerprint differs from the expected one."""
+    if force:
+        return set(PIPELINE_STAGES)
+    recorded = document.get("stage_fingerprints") or {}
+    return {stage for stage in PIPELINE_STAGES if recorded.get(stage) != fingerprints.get(stage)}
+
+def fingerprint_updates(fingerprints: Dict[str, str], stages: Iterable[str]) -> Dict[str, str]:
+    """Build a MongoDB $set fragment recording the fingerprints of completed stages."""
+    return {f"stage_fingerprints.{stage}": fingerprints[stage] for stage in stages}
+
+def completed_stages(outputs: Dict[str, Any], errors: Dict[str, str], deferred: Iterable[str] = ()) -> Set[str]:
+    """
+    Get the stages whose output may be fingerprinted. A stage with an error, or one
+    deferred because no provider was reachable, is left stale even if it produced a
+    fallback output, so it is retried on the next run.
+    """
+    return set(outputs) - set(errors) - set(deferred)
@@ -0,0 +1,41 @@
+"""
+Prompts for LLM enrichment, shared by interactive calls and batch jobs.
+"""
+from typing import Dict, List
+
+def build_summary_messages(text: str) -> List[Dict[str, str]]:
+    """Build the chat messages for summarizing text."""
+    return [
+        {"role": "system", "content": "You are a helpful assistant that summarizes text."},
+        {"role": "user", "content": f"Summarize the following text in about 100 words:\n\n{text}"}
+    ]
+
+def build_chunk_summary_messages(text: str, index: int, total: int) -> List[Dict[str, str]]:
+    """Build the chat messages for summarizing one chunk of a long document."""
+    return [
+        {"role": "system", "content": "You are a helpful assistant that summarizes text."},
+        {"role": "user", "content": f"This is part {index + 1} of {total} of a longer document. Summarize the key points of this part in about 100 words:\n\n{text}"}
+    ]
+
+def build_merge_summary_messages(summaries: List[str]) -> List[Dict[str, str]]:
+    """Build the chat messages for merging chunk summaries into one summary."""
+    parts = "\n\n".join(f"Part {i + 1}: {summary}" for i, summary in enumerate(summaries))
+    return [
+        {"role": "system", "content": "You are a helpful assistant that summarizes text."},
+        {"role": "user", "content": f"The following are summaries of consecutive parts of one document. Combine them into a single summary of the whole document in about 100 words:\n\n{parts}"}
+    ]
+
+def build_tag_messages(text: str, max_tags: int = 5) -> List[Dict[str, str]]:
+    """Build the chat messages for extracting tags from text."""
+    return [
+        {"role": "system", "content": "You are a helpful assistant that extracts relevant tags from text."},
+        {"role": "user", "content": f"Extract {max_tags} relevant tags from this text. Return only the tags as a comma-separated list without explanations:\n\n{text}"}
+    ]
+
+def parse_tags(tags_text: str) -> List[str]:
+    """Parse a comma-separated tag list returned by the model."""
+    return [tag.strip() for tag in tags_text.split(',') if tag.strip()]
+
+# Completion token limits per stage
+SUMMARY_MAX_TOKENS = 150
+TAGS_MAX_TOKENS = 50
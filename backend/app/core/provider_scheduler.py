@@ -0,0 +1,252 @@
+"""
+Scheduling of outbound LLM provider calls.
+
+Every provider gets a token-bucket rate limit, retries with jittered exponential
+backoff (honouring Retry-After) and a circuit breaker, so a throttled or failing
+provider is skipped immediately instead of making every caller wait it out.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class ProviderError(Exception):
+    """A provider call failed. Rate limits and server errors are retryable."""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None,
+                 retry_after: Optional[float] = None, retryable: bool = True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
+    
+    @property
+    def provider_fault(self) -> bool:
+        """
+        Whether the error counts against the provider's circuit rather than the request:
+        no response, 429, 5xx, or 401/403. A rejected key fails every call until it is
+        replaced, so the circuit opens and skips the provider instead of calling it in vain.
+        """
+        return self.status_code is None or self.status_code in (401, 403, 429) or self.status_code >= 500
+
+class ProviderUnavailable(Exception):
+    """The provider was skipped without calling it (circuit open or rate limited)."""
+
+class TokenBucket:
+    """Token-bucket rate limiter."""
+    
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.blocked_until = 0.0
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available. Returns 0 on success, otherwise the seconds to wait."""
+        now = self.clock()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+    
+    def block(self, seconds: float):
+        """Stop handing out tokens for a while, e.g. after a Retry-After response."""
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+class CircuitBreaker:
+    """Circuit breaker that opens after consecutive failures and probes after a cool-down."""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float,
+                 clock: Callable[[], float] = time.monotonic,
+                 on_transition: Optional[Callable[[str], None]] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.on_transition = on_transition
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._state = self.CLOSED
+    
+    def _transition(self, state: str):
+        if state != self._state:
+            self._state = state
+            if self.on_transition:
+                self.on_transition(state)
+    
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+        return self._state
+    
+    def allow_request(self) -> bool:
+        """Check whether a call may go through. Half-open lets a single probe through."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+    
+    def record_success(self):
+        self.failures = 0
+        self.probe_in_flight = False
+        self._transition(self.CLOSED)
+    
+    def record_neutral(self):
+        """End a call that says nothing about the provider's health; a half-open circuit probes again."""
+        self.probe_in_flight = False
+    
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+            self._transition(self.OPEN)
+
+class ProviderScheduler:
+    """Runs provider calls through per-provider rate limits, retries and circuit breakers."""
+    
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+        max_wait: float = 10.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait  # Longest we wait on one provider before failing over
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.metrics: Dict[str, Dict[str, Any]] = {}
+    
+    def register(self, provider: str, requests_per_minute: float, burst: Optional[float] = None):
+        """Register a provider with its rate limit."""
+        self.buckets[provider] = TokenBucket(
+            rate=requests_per_minute / 60.0,
+            capacity=burst or max(1.0, requests_per_minute / 60.0),
+            clock=self.clock
+        )
+        self.metrics[provider] = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "short_circuited": 0,
+            "transitions": {CircuitBreaker.CLOSED: 0, CircuitBreaker.OPEN: 0, CircuitBreaker.HALF_OPEN: 0}
+        }
+        
+        def on_transition(state: str):
+            self.metrics[provider]["transitions"][state] += 1
+            logger.warning(f"Circuit for provider {provider} is now {state}")
+        
+        self.breakers[provider] = CircuitBreaker(
+            self.failure_threshold, self.reset_timeout, clock=self.clock, on_transition=on_transition
+        )
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+    
+    async def _acquire(self, provider: str):
+        """Wait for a rate-limit token, failing over instead of waiting longer than max_wait."""
+        bucket = self.buckets[provider]
+        waited = 0.0
+        while True:
+            wait = bucket.try_acquire()
+            if wait == 0:
+                return
+            if waited + wait > self.max_wait:
+                self.metrics[provider]["rate_limited"] += 1
+                raise ProviderUnavailable(f"Provider {provider} is rate limited")
+            await self.sleep(wait)
+            waited += wait
+    
+    async def call(self, provider: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Call a provider, retrying retryable errors. Raises ProviderUnavailable if skipped."""
+        breaker = self.breakers[provider]
+        metrics = self.metrics[provider]
+        
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow_request():
+                metrics["short_circuited"] += 1
+                raise ProviderUnavailable(f"Circuit for provider {provider} is {breaker.state}")
+            
+            try:
+                await self._acquire(provider)
+            except ProviderUnavailable:
+                # Give a half-open probe slot back, we never made the call
+                breaker.probe_in_flight = False
+                raise
+            
+            metrics["calls"] += 1
+            try:
+                result = await fn()
+            except ProviderError as e:
+                metrics["failures"] += 1
+                if e.provider_fault:
+                    breaker.record_failure()
+                else:
+                    # The provider answered, a rejected request says nothing about its health
+                    breaker.record_success()
+                if e.retry_after:
+                    self.buckets[provider].block(e.retry_after)
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                
+                delay = e.retry_after if e.retry_after is not None else self.backoff_delay(attempt)
+                if delay > self.max_wait:
+                    raise ProviderUnavailable(f"Provider {provider} asked to retry after {delay:.1f}s") from e
+                metrics["retries"] += 1
+                logger.warning(f"Provider {provider} failed ({e}), retrying in {delay:.2f}s")
+                if e.retry_after is None:
+                    await self.sleep(delay)
+                # Otherwise the blocked token bucket makes the next attempt wait
+            except Exception:
+                # Not a provider error (e.g. a bug handling the response), so not held against the provider
+                metrics["failures"] += 1
+                breaker.record_neutral()
+                raise
+            else:
+                metrics["successes"] += 1
+                breaker.record_success()
+                return result
+    
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-provider call counters and circuit state."""
+        return {
+            provider: {
+                **metrics,
+                "transitions": dict(metrics["transitions"]),
+                "state": self.breakers[provider].state
+            }
+            for provider, metrics in self.metrics.items()
+        }
@@ -0,0 +1,147 @@
+"""
+User similarity recommendations.
+
+Every user has a centroid, the mean of their document vectors, stored in a
+dedicated Qdrant collection. Centroids are updated incrementally as documents are
+embedded or deleted (a running mean, no rescan of the user's documents), so
+finding similar users is a single ANN query over the centroids. Updates to a
+centroid hold a per-user Redis lock, so API and worker processes applying vectors
+for the same user don't overwrite each other's running mean. Without Redis they
+fall back to a per-user lock within the process.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.mongo import mongodb
+from app.db.qdrant import qdrant
+from app.db.redis import redis_db
+
+logger = logging.getLogger(__name__)
+
+def update_running_mean(
+    mean: Optional[np.ndarray],
+    count: int,
+    added: Sequence[np.ndarray] = (),
+    removed: Sequence[np.ndarray] = ()
+) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Update the mean of `count` vectors with vectors added to and removed from the set.
+    Returns the new mean and count; the mean is None once the set is empty.
+    """
+    new_count = count + len(added) - len(removed)
+    if new_count <= 0:
+        return None, 0
+    
+    total = mean.astype(np.float64) * count if mean is not None and count else 0.0
+    if len(added):
+        total = total + np.sum(added, axis=0, dtype=np.float64)
+    if len(removed):
+        total = total - np.sum(removed, axis=0, dtype=np.float64)
+    return (total / new_count).astype(np.float32), new_count
+
+class UserCentroids:
+    """Maintains user centroids and serves cached similar-user recommendations."""
+    
+    def __init__(self):
+        self.cache = TTLCache(settings.RECOMMENDATION_CACHE_SIZE, settings.RECOMMENDATION_CACHE_TTL)
+        # Per-user locks used without Redis, with the number of tasks holding or awaiting each
+        self.local_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+    
+    @asynccontextmanager
+    async def _local_lock(self, user_id: str) -> AsyncIterator[None]:
+        lock, users = self.local_locks.get(user_id, (None, 0))
+        lock = lock or asyncio.Lock()
+        self.local_locks[user_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            # Drop the lock once nobody uses it, so the map only holds users being updated
+            lock, users = self.local_locks[user_id]
+            if users == 1:
+                del self.local_locks[user_id]
+            else:
+                self.local_locks[user_id] = (lock, users - 1)
+    
+    @asynccontextmanager
+    async def _user_lock(self, user_id: str) -> AsyncIterator[None]:
+        """Serialize centroid updates of a user across processes, or within this one without Redis."""
+        try:
+            lock = redis_db.get_client().lock(
+                f"centroid_lock:{user_id}",
+                timeout=settings.CENTROID_LOCK_TIMEOUT,
+                blocking_timeout=settings.CENTROID_LOCK_TIMEOUT
+            )
+            acquired = await lock.acquire()
+        except Exception as e:
+            logger.warning(f"Redis is unavailable for the centroid lock of user {user_id}, locking in process: {e}")
+            async with self._local_lock(user_id):
+                yield
+            return
+        
+        if not acquired:
+            raise TimeoutError(f"Timed out waiting for the centroid lock of user {user_id}")
+        try:
+            yield
+        finally:
+            try:
+                await lock.release()
+            except Exception as e:
+                # The lock expires on its own
+                logger.warning(f"Failed to release the centroid lock of user {user_id}: {e}")
+    
+    async def update(self, user_id: Optional[str], added: Sequence[np.ndarray] = (), removed: Sequence[np.ndarray] = ()):
+        """Apply newly embedded and removed document vectors to a user's centroid."""
+        if not user_id or (not len(added) and not len(removed)):
+            return
+        try:
+            # Serialize read-modify-write cycles for the same user
+            async with self._user_lock(user_id):
+                current = await qdrant.get_user_centroid(user_id)
+                mean, count = current if current else (None, 0)
+                mean, count = update_running_mean(mean, count, added, removed)
+                await qdrant.store_user_centroid(user_id, mean, count)
+        except Exception as e:
+            logger.error(f"Failed to update centroid for user {user_id}: {e}")
+        self.invalidate(user_id)
+    
+    def invalidate(self, user_id: Optional[str]):
+        """Drop the cached recommendations of a user."""
+        if user_id:
+            self.cache.delete(user_id)
+    
+    async def get_recommendations(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the users whose documents are most similar to this user's, best first."""
+        recommendations = self.cache.get(user_id)
+        if recommendations is None:
+            recommendations = await self._find_similar_users(user_id)
+            self.cache.set(user_id, recommendations)
+        return recommendations[:limit]
+    
+    async def _find_similar_users(self, user_id: str) -> List[Dict[str, Any]]:
+        centroid = await qdrant.get_user_centroid(user_id)
+        if not centroid:
+            return []
+        
+        hits = await qdrant.search_user_centroids(
+            centroid[0], limit=settings.RECOMMENDATION_MAX_RESULTS, exclude_user_id=user_id
+        )
+        user_ids = [str(hit.id) for hit in hits]
+        users = await mongodb.get_collection("users", read_preference=settings.MONGODB_SEARCH_READ_PREFERENCE).find(
+            {"id": {"$in": user_ids}}, {"id": 1, "username": 1}, max_time_ms=settings.MONGODB_MAX_TIME_MS
+        ).to_list(length=len(user_ids))
+        usernames = {user["id"]: user["username"] for user in users}
+        
+        return [
+            {"id": str(hit.id), "username": usernames[str(hit.id)], "similarity_score": hit.score}
+            for hit in hits
+            if str(hit.id) in usernames
+        ]
+
+user_centroids = UserCentroids()
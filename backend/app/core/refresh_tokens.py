@@ -0,0 +1,376 @@
+"""
+Refresh token stores.
+
+Every access token expiry sends the client to /auth/refresh, so refresh tokens
+are looked up and rotated far more often than they are issued. The "mongo" store
+keeps them in the refresh_tokens collection. The "redis" store makes Redis the
+authority: lookups, rotation and revocation are served from Redis, each as one
+atomic script, with keys that expire with the token and a session set per user.
+MongoDB is only read for tokens Redis has never seen (issued before the store was
+switched), and rotations reach it in the background, buffered into one bulk_write
+per flush. While Redis is unreachable refreshes fail closed, as MongoDB may be
+behind on rotations; clients sign in again.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.db.mongo import mongodb
+from app.db.redis import redis_db
+from app.models.user import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+# Fields of a refresh token left out of session listings
+SESSION_EXCLUDED_FIELDS = ("token",)
+
+class MongoRefreshTokenStore:
+    """Refresh tokens in the refresh_tokens collection."""
+    
+    def __init__(self, lifetime: timedelta):
+        self.lifetime = lifetime
+    
+    def _collection(self):
+        return mongodb.get_collection("refresh_tokens")
+    
+    def new_token(self, user_id: str, user_agent: Optional[str] = None, ip_address: Optional[str] = None) -> RefreshToken:
+        """Create a refresh token with a secure random value (not stored yet)."""
+        return RefreshToken(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            token=secrets.token_urlsafe(64),
+            expires_at=datetime.utcnow() + self.lifetime,
+            user_agent=user_agent,
+            ip_address=ip_address
+        )
+    
+    async def issue(self, token: RefreshToken):
+        """Store a refresh token."""
+        await self._collection().insert_one(token.dict())
+    
+    async def get(self, value: str) -> Optional[RefreshToken]:
+        """Get a valid (unrevoked, unexpired) refresh token by its value."""
+        token_dict = await self._collection().find_one(
+            {"token": value, "revoked": False, "expires_at": {"$gt": datetime.utcnow()}},
+            max_time_ms=settings.MONGODB_MAX_TIME_MS
+        )
+        return RefreshToken(**token_dict) if token_dict else None
+    
+    async def rotate(
+        self, value: str, user_agent: Optional[str] = None, ip_address: Optional[str] = None
+    ) -> Optional[Tuple[RefreshToken, RefreshToken]]:
+        """
+        Revoke a valid refresh token and issue its replacement.
+        Returns (old token, new token), or None if the token was invalid or already used.
+        """
+        token_dict = await self._collection().find_one_and_update(
+            {"token": value, "revoked": False, "expires_at": {"$gt": datetime.utcnow()}},
+            {"$set": {"revoked": True}}
+        )
+        if not token_dict:
+            return None
+        old_token = RefreshToken(**token_dict)
+        new_token = self.new_token(old_token.user_id, user_agent, ip_address)
+        await self.issue(new_token)
+        return old_token, new_token
+    
+    async def revoke(self, value: str) -> bool:
+        """Revoke a refresh token."""
+        result = await self._collection().update_one({"token": value, "revoked": False}, {"$set": {"revoked": True}})
+        return result.modified_count > 0
+    
+    async def revoke_all(self, user_id: str) -> int:
+        """Revoke all refresh tokens of a user and return how many were revoked."""
+        result = await self._collection().update_many(
+            {"user_id": user_id, "revoked": False},
+            {"$set": {"revoked": True}}
+        )
+        return result.modified_count
+    
+    async def list_sessions(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Get the active sessions (valid refresh tokens, without their values) of a user."""
+        projection = {"_id": 0, **{field: 0 for field in SESSION_EXCLUDED_FIELDS}}
+        cursor = self._collection().find(
+            {"user_id": user_id, "revoked": False, "expires_at": {"$gt": datetime.utcnow()}},
+            projection
+        )
+        return await cursor.to_list(length=limit)
+    
+    def start(self):
+        """Start background work on the running event loop (nothing to do for MongoDB)."""
+    
+    async def stop(self):
+        """Finish background work before shutdown (nothing to do for MongoDB)."""
+
+# Marker left in place of a revoked token until it would have expired, so a used
+# token is rejected instead of being looked up again in MongoDB
+REVOKED = b"revoked"
+
+# KEYS: old token, new token, sessions of the user
+# ARGV: expected old token value, new token value, new token TTL (s), old member, new member
+ROTATE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl > 0 then
+    redis.call('SET', KEYS[1], 'revoked', 'PX', ttl)
+else
+    redis.call('DEL', KEYS[1])
+end
+redis.call('SREM', KEYS[3], ARGV[4])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+redis.call('SADD', KEYS[3], ARGV[5])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return 1
+"""
+
+# KEYS: token; returns the revoked token's value, or nil if it wasn't valid
+REVOKE_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value or value == 'revoked' then
+    return nil
+end
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl > 0 then
+    redis.call('SET', KEYS[1], 'revoked', 'PX', ttl)
+else
+    redis.call('DEL', KEYS[1])
+end
+return value
+"""
+
+# KEYS: sessions of the user; ARGV: token key prefix; returns the number of tokens revoked
+REVOKE_ALL_SCRIPT = """
+local revoked = 0
+for _, member in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    local key = ARGV[1] .. member
+    local ttl = redis.call('PTTL', key)
+    if ttl > 0 and redis.call('GET', key) ~= 'revoked' then
+        redis.call('SET', key, 'revoked', 'PX', ttl)
+        revoked = revoked + 1
+    end
+end
+redis.call('DEL', KEYS[1])
+return revoked
+"""
+
+class RedisRefreshTokenStore(MongoRefreshTokenStore):
+    """
+    Refresh tokens in Redis, with MongoDB as a background copy.
+    Tokens are keyed by a SHA-256 digest of their value and expire with the token.
+    """
+    
+    TOKEN_KEY_PREFIX = "refresh-token:"
+    
+    def __init__(self, lifetime: timedelta, flush_interval: float = 1.0):
+        super().__init__(lifetime)
+        self.flush_interval = flush_interval
+        self.scripts = None
+        self.script_client = None
+        self.pending: List[UpdateOne] = []
+        self.lock: Optional[asyncio.Lock] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    def _member(self, value: str) -> str:
+        return hashlib.sha256(value.encode("utf-8")).hexdigest()
+    
+    def _token_key(self, value: str) -> str:
+        return f"{self.TOKEN_KEY_PREFIX}{self._member(value)}"
+    
+    def _sessions_key(self, user_id: str) -> str:
+        return f"refresh-tokens:user:{user_id}"
+    
+    def _client(self):
+        client = redis_db.get_client()
+        if self.script_client is not client:
+            # Scripts are registered per client, and the client is replaced on reconnect
+            self.scripts = {
+                "rotate": client.register_script(ROTATE_SCRIPT),
+                "revoke": client.register_script(REVOKE_SCRIPT),
+                "revoke_all": client.register_script(REVOKE_ALL_SCRIPT)
+            }
+            self.script_client = client
+        return client
+    
+    async def _run_script(self, name: str, keys: List[str], args: List[Any] = ()) -> Any:
+        self._client()
+        return await self.scripts[name](keys=keys, args=list(args))
+    
+    def _ttl(self, token: RefreshToken) -> int:
+        return max(1, int((token.expires_at - datetime.utcnow()).total_seconds()))
+    
+    def _serialize(self, token: RefreshToken) -> str:
+        return json.dumps(jsonable_encoder(token))
+    
+    async def _cache(self, token: RefreshToken):
+        client = self._client()
+        ttl = self._ttl(token)
+        async with client.pipeline(transaction=True) as pipeline:
+            pipeline.set(self._token_key(token.token), self._serialize(token), ex=ttl)
+            pipeline.sadd(self._sessions_key(token.user_id), self._member(token.token))
+            pipeline.expire(self._sessions_key(token.user_id), ttl)
+            await pipeline.execute()
+    
+    async def _cache_quietly(self, token: RefreshToken):
+        try:
+            await self._cache(token)
+        except Exception as e:
+            logger.error(f"Failed to store refresh token in Redis: {e}")
+    
+    async def issue(self, token: RefreshToken):
+        # Issued at sign-in, rarely enough to write MongoDB first: a token it lacks
+        # would be rejected once Redis evicts or loses it
+        await super().issue(token)
+        await self._cache_quietly(token)
+    
+    async def get(self, value: str) -> Optional[RefreshToken]:
+        try:
+            cached = await self._client().get(self._token_key(value))
+        except Exception as e:
+            logger.error(f"Failed to read refresh token from Redis: {e}")
+            return None
+        if cached == REVOKED:
+            return None
+        if cached is not None:
+            return RefreshToken(**json.loads(cached))
+        
+        # Not in Redis yet, e.g. issued before the store was switched
+        token = await super().get(value)
+        if token:
+            await self._cache_quietly(token)
+        return token
+    
+    async def rotate(
+        self, value: str, user_agent: Optional[str] = None, ip_address: Optional[str] = None
+    ) -> Optional[Tuple[RefreshToken, RefreshToken]]:
+        try:
+            cached = await self._client().get(self._token_key(value))
+        except Exception as e:
+            logger.error(f"Failed to read refresh token from Redis: {e}")
+            return None
+        if cached == REVOKED:
+            return None
+        if cached is None:
+            # Not in Redis yet: rotate it in MongoDB, issue() caches the new token
+            return await super().rotate(value, user_agent, ip_address)
+        
+        old_token = RefreshToken(**json.loads(cached))
+        new_token = self.new_token(old_token.user_id, user_agent, ip_address)
+        try:
+            # Fails if the token was used or revoked since it was read
+            rotated = await self._run_script(
+                "rotate",
+                keys=[self._token_key(value), self._token_key(new_token.token), self._sessions_key(old_token.user_id)],
+                args=[cached, self._serialize(new_token), self._ttl(new_token), self._member(value), self._member(new_token.token)]
+            )
+        except Exception as e:
+            logger.error(f"Failed to rotate refresh token in Redis: {e}")
+            return None
+        if not rotated:
+            return None
+        
+        self.pending.append(UpdateOne({"token": value}, {"$set": {"revoked": True}}))
+        self.pending.append(UpdateOne({"token": new_token.token}, {"$setOnInsert": new_token.dict()}, upsert=True))
+        return old_token, new_token
+    
+    async def flush(self) -> int:
+        """Write buffered rotations to MongoDB. Returns the number of operations written."""
+        if self.lock is None:
+            # Created on first use so it belongs to the running event loop
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            operations, self.pending = self.pending, []
+            if not operations:
+                return 0
+            try:
+                # Each operation is idempotent, so a failed flush can simply be retried
+                await self._collection().bulk_write(operations, ordered=True)
+            except Exception as e:
+                logger.error(f"Failed to write refresh token rotations to MongoDB: {e}")
+                self.pending[:0] = operations
+                return 0
+            return len(operations)
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing refresh token rotations: {e}")
+    
+    def start(self):
+        """Start flushing rotations periodically on the running event loop."""
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the periodic flush and write what is still buffered."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
+    
+    async def revoke(self, value: str) -> bool:
+        # Revoked in both, so the token stays revoked if it has to be looked up in MongoDB;
+        # a Redis failure is raised, as the token would otherwise stay valid there
+        await self.flush()
+        cached = await self._run_script("revoke", keys=[self._token_key(value)])
+        if cached is not None:
+            token = RefreshToken(**json.loads(cached))
+            await self._client().srem(self._sessions_key(token.user_id), self._member(value))
+        return await super().revoke(value) or cached is not None
+    
+    async def revoke_all(self, user_id: str) -> int:
+        await self.flush()
+        revoked = await self._run_script(
+            "revoke_all", keys=[self._sessions_key(user_id)], args=[self.TOKEN_KEY_PREFIX]
+        )
+        return max(revoked, await super().revoke_all(user_id))
+    
+    async def list_sessions(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        try:
+            client = self._client()
+            sessions_key = self._sessions_key(user_id)
+            members = list(await client.smembers(sessions_key))
+            values = await client.mget([self.TOKEN_KEY_PREFIX.encode("utf-8") + member for member in members]) if members else []
+        except Exception as e:
+            logger.error(f"Failed to list sessions of user {user_id} from Redis: {e}")
+            return await super().list_sessions(user_id, limit)
+        
+        sessions = []
+        stale = []
+        for member, value in zip(members, values):
+            if value is None or value == REVOKED:
+                stale.append(member)
+                continue
+            session = json.loads(value)
+            for field in SESSION_EXCLUDED_FIELDS:
+                session.pop(field, None)
+            sessions.append(session)
+        if stale:
+            try:
+                await client.srem(sessions_key, *stale)
+            except Exception as e:
+                logger.error(f"Failed to prune sessions of user {user_id}: {e}")
+        return sessions[:limit]
+
+def create_refresh_token_store(backend: str, lifetime: timedelta) -> MongoRefreshTokenStore:
+    """Create the refresh token store for a backend name ("mongo" or "redis")."""
+    if backend == "redis":
+        return RedisRefreshTokenStore(lifetime, flush_interval=settings.REFRESH_TOKEN_FLUSH_INTERVAL)
+    return MongoRefreshTokenStore(lifetime)
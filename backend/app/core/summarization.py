@@ -0,0 +1,132 @@
+"""
+Token budgeting for LLM summarization, and local extractive summarization.
+
+Token counts are computed locally (with tiktoken if installed, otherwise with a
+characters-per-token estimate) so long documents can be truncated or sampled to
+fit a budget, or split into chunks for map-reduce summarization. Without an LLM,
+summaries are extracted by ranking sentence embeddings with MMR.
+"""
+import math
+import re
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional, fall back to an estimate
+    _encoding = None
+
+# Rough average for English text when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+# Marker placed between sampled excerpts
+EXCERPT_SEPARATOR = "\n\n[...]\n\n"
+
+def count_tokens(text: str) -> int:
+    """Count (or estimate) the number of tokens in text."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _chars_for_tokens(text: str, tokens: int) -> int:
+    """Convert a token budget into a character budget using the text's own density."""
+    total_tokens = count_tokens(text)
+    if total_tokens == 0:
+        return len(text)
+    return int(tokens * len(text) / total_tokens)
+
+def truncate_to_budget(text: str, max_tokens: int, head_fraction: float = 0.5, windows: int = 4) -> str:
+    """
+    Fit text into a token budget.
+    Keeps the beginning of the document (where most of the context usually is) and
+    fills the rest of the budget with evenly spaced excerpts from the remainder.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    
+    budget = _chars_for_tokens(text, max_tokens)
+    head_chars = int(budget * head_fraction)
+    head, rest = text[:head_chars], text[head_chars:]
+    
+    # Sample evenly spaced windows from the rest of the text
+    window_chars = (budget - head_chars - windows * len(EXCERPT_SEPARATOR)) // windows
+    if window_chars <= 0:
+        return text[:budget]
+    stride = len(rest) / windows
+    excerpts = [rest[int(i * stride):int(i * stride) + window_chars] for i in range(windows)]
+    return head + EXCERPT_SEPARATOR + EXCERPT_SEPARATOR.join(excerpts)
+
+def _split_units(text: str, max_chars: int) -> List[str]:
+    """Split text into paragraphs, then sentences, then hard slices no longer than max_chars."""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if len(paragraph) <= max_chars:
+            units.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            units.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+    return [unit for unit in units if unit.strip()]
+
+def chunk_text(text: str, chunk_tokens: int) -> List[str]:
+    """Split text into chunks of at most chunk_tokens, preferring paragraph and sentence boundaries."""
+    max_chars = max(1, _chars_for_tokens(text, chunk_tokens))
+    chunks, current, current_len = [], [], 0
+    for unit in _split_units(text, max_chars):
+        if current and current_len + len(unit) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current, current_len = [], 0
+        current.append(unit)
+        current_len += len(unit) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+def max_map_reduce_chunks(token_cap: int, chunk_tokens: int, summary_tokens: int) -> int:
+    """
+    Number of chunks a map-reduce summary can afford within a per-document token cap.
+    Each chunk costs its input plus its summary; the merge step reads every chunk
+    summary and writes one more.
+    """
+    return max(1, (token_cap - summary_tokens) // (chunk_tokens + 2 * summary_tokens))
+
+def sample_chunks(chunks: List[str], max_chunks: int) -> List[str]:
+    """Pick evenly spaced chunks, always keeping the first one."""
+    if len(chunks) <= max_chunks:
+        return chunks
+    stride = len(chunks) / max_chunks
+    return [chunks[int(i * stride)] for i in range(max_chunks)]
+
+def split_sentences(text: str, min_length: int = 20) -> List[str]:
+    """Split text into sentences, dropping fragments shorter than min_length characters."""
+    sentences = re.split(r"(?<=[.!?])\s+|\n\s*\n", text)
+    return [" ".join(sentence.split()) for sentence in sentences if len(sentence.strip()) >= min_length]
+
+def rank_sentences_mmr(embeddings: np.ndarray, diversity: float = 0.3, limit: Optional[int] = None) -> List[int]:
+    """
+    Rank sentences for an extractive summary with maximal marginal relevance.
+    Relevance is the cosine similarity to the document centroid; each pick is
+    penalized by its similarity to the sentences already picked.
+    Returns up to `limit` sentence indices, best first.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    centroid = vectors.mean(axis=0)
+    centroid /= max(float(np.linalg.norm(centroid)), 1e-12)
+    
+    relevance = vectors @ centroid
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    
+    ranking = []
+    for _ in range(min(limit or len(vectors), len(vectors))):
+        scores = np.where(available, (1 - diversity) * relevance - diversity * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        ranking.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return ranking
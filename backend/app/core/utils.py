@@ -225,6 +225,25 @@ class FileParser:
         else:
             logger.warning(f"Unsupported file type: {content_type}")
             return ""
+    
+    @staticmethod
+    async def parse_bytes(content: bytes, file_type: str) -> str:
+        """Extract text from raw file content, e.g. a file downloaded from S3."""
+        if not content:
+            return ""
+        
+        try:
+            if file_type == "pdf":
+                pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+                return "".join(page.extract_text() + "\n" for page in pdf_reader.pages)
+            elif file_type in ("txt", "md", "csv", "json", "text"):
+                return content.decode("utf-8")
+            else:
+                logger.warning(f"Unsupported file type: {file_type}")
+                return ""
+        except Exception as e:
+            logger.error(f"Failed to parse {file_type} content: {e}")
+            return ""
 
 def generate_share_link(doc_id: str) -> str:
     """Generate a shareable link for a document."""
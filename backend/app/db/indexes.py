@@ -0,0 +1,194 @@
+"""
+Declarative MongoDB index registry.
+
+Every index the application relies on is listed in INDEXES, next to the query
+shapes they serve (QUERY_SHAPES). At startup reconcile_indexes() compares the
+registry with the indexes that exist and creates the missing ones, rebuilding
+any whose options changed. scripts/index_advisor.py explains the query shapes
+against a live database and flags collection scans.
+"""
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+class IndexSpec(NamedTuple):
+    """An index on a collection; keys are (field, direction) pairs, direction being 1, -1 or a type such as "text"."""
+    collection: str
+    keys: Tuple[Tuple[str, Union[int, str]], ...]
+    unique: bool = False
+    sparse: bool = False
+    expire_after_seconds: Optional[int] = None
+    
+    @property
+    def name(self) -> str:
+        """MongoDB's default name for the index."""
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+    
+    def options(self) -> Dict[str, Any]:
+        """Options to pass to create_index."""
+        options = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.sparse:
+            options["sparse"] = True
+        if self.expire_after_seconds is not None:
+            options["expireAfterSeconds"] = self.expire_after_seconds
+        return options
+
+INDEXES: List[IndexSpec] = [
+    # Users are looked up by id, and usernames and emails must be unique
+    IndexSpec("users", (("id", 1),), unique=True),
+    IndexSpec("users", (("email", 1),), unique=True),
+    IndexSpec("users", (("username", 1),), unique=True),
+    
+    # Refresh tokens are looked up by token and removed once expired
+    IndexSpec("refresh_tokens", (("token", 1),), unique=True),
+    IndexSpec("refresh_tokens", (("user_id", 1),)),
+    IndexSpec("refresh_tokens", (("expires_at", 1),), expire_after_seconds=0),
+    
+    # Documents
+    IndexSpec("documents", (("id", 1),), unique=True),
+    # Serves user listings filtered by user_id and keyset-paginated on (created_at, id)
+    IndexSpec("documents", (("user_id", 1), ("created_at", -1), ("id", -1))),
+    IndexSpec("documents", (("processing_status", 1),)),
+    IndexSpec("documents", (("content_hash", 1),)),
+    IndexSpec("documents", (("minhash_bands", 1),)),
+    IndexSpec("documents", (("cluster_id", 1),)),
+    
+    # Batch enrichment jobs are polled by status
+    IndexSpec("enrichment_batches", (("status", 1),)),
+]
+
+# The filters (and sorts) the application runs, with sample values for explain()
+QUERY_SHAPES: List[Dict[str, Any]] = [
+    {"collection": "users", "filter": {"id": "user-id"}},
+    {"collection": "users", "filter": {"username": "username"}},
+    {"collection": "users", "filter": {"email": "user@example.com"}},
+    {"collection": "users", "filter": {"id": {"$in": ["user-id", "other-user-id"]}}},
+    {"collection": "refresh_tokens", "filter": {"token": "token", "revoked": False}},
+    {"collection": "documents", "filter": {"id": "doc-id"}},
+    {"collection": "documents", "filter": {"id": {"$in": ["doc-id", "other-doc-id"]}}},
+    {"collection": "documents", "filter": {"user_id": "user-id"}, "sort": [("created_at", -1), ("id", -1)]},
+    {"collection": "documents", "filter": {"processing_status": {"$in": ["pending", "failed"]}}},
+    {"collection": "documents", "filter": {"content_hash": "content-hash"}},
+    {"collection": "documents", "filter": {"minhash_bands": {"$in": ["0:band", "1:band"]}, "id": {"$ne": "doc-id"}}},
+    {"collection": "enrichment_batches", "filter": {"status": "pending"}},
+]
+
+def _index_options(info: Dict[str, Any]) -> Dict[str, Any]:
+    """The options of an existing index that the registry manages."""
+    return {
+        "unique": bool(info.get("unique", False)),
+        "sparse": bool(info.get("sparse", False)),
+        "expireAfterSeconds": info.get("expireAfterSeconds")
+    }
+
+def _key_pattern(keys: Iterable[Tuple[str, Any]]) -> Tuple[Tuple[str, Union[int, str]], ...]:
+    """Normalize index keys for comparison; text fields are unordered, so they are sorted."""
+    keys = [(field, direction if isinstance(direction, str) else int(direction)) for field, direction in keys]
+    text_fields = sorted(field for field, direction in keys if direction == "text")
+    if not text_fields:
+        return tuple(keys)
+    first = next(i for i, (_, direction) in enumerate(keys) if direction == "text")
+    others = [key for key in keys if key[1] != "text"]
+    return tuple(others[:first] + [(field, "text") for field in text_fields] + others[first:])
+
+def _existing_keys(info: Dict[str, Any]) -> Tuple[Tuple[str, Union[int, str]], ...]:
+    """The keys of an existing index; text indexes list their fields under weights, not key."""
+    keys = []
+    for field, direction in info["key"]:
+        if field == "_fts":
+            keys.extend((text_field, "text") for text_field in info.get("weights", {}))
+        elif field != "_ftsx":
+            keys.append((field, direction))
+    return _key_pattern(keys)
+
+def diff_indexes(specs: Iterable[IndexSpec], index_information: Dict[str, Dict[str, Any]]) -> Dict[str, list]:
+    """
+    Compare the specs of one collection with its index_information().
+    Returns the specs to create, the existing index names to drop first (indexes
+    with the same keys but different options), and indexes not in the registry.
+    """
+    existing = {
+        _existing_keys(info): name
+        for name, info in index_information.items()
+        if name != "_id_"
+    }
+    
+    plan = {"create": [], "drop": [], "unknown": []}
+    wanted = set()
+    for spec in specs:
+        keys = _key_pattern(spec.keys)
+        wanted.add(keys)
+        name = existing.get(keys)
+        if name is None:
+            plan["create"].append(spec)
+            continue
+        expected = {
+            "unique": spec.unique,
+            "sparse": spec.sparse,
+            "expireAfterSeconds": spec.expire_after_seconds
+        }
+        if _index_options(index_information[name]) != expected:
+            plan["drop"].append(name)
+            plan["create"].append(spec)
+    
+    plan["unknown"] = sorted(name for keys, name in existing.items() if keys not in wanted)
+    return plan
+
+async def reconcile_indexes(db, specs: Iterable[IndexSpec] = INDEXES, drop_unknown: bool = False) -> Dict[str, List[str]]:
+    """
+    Bring the indexes of a database in line with the registry.
+    Failures (e.g. a unique index over duplicate data) are logged and reported,
+    not raised, so one bad index doesn't keep the rest from being built.
+    """
+    by_collection = defaultdict(list)
+    for spec in specs:
+        by_collection[spec.collection].append(spec)
+    
+    summary = {"created": [], "dropped": [], "unknown": [], "failed": []}
+    for collection_name, collection_specs in by_collection.items():
+        collection = db[collection_name]
+        plan = diff_indexes(collection_specs, await collection.index_information())
+        
+        drops = plan["drop"] + (plan["unknown"] if drop_unknown else [])
+        for name in drops:
+            try:
+                await collection.drop_index(name)
+                summary["dropped"].append(f"{collection_name}.{name}")
+            except Exception as e:
+                logger.error(f"Failed to drop index {collection_name}.{name}: {e}")
+                summary["failed"].append(f"{collection_name}.{name}")
+        if not drop_unknown:
+            summary["unknown"].extend(f"{collection_name}.{name}" for name in plan["unknown"])
+        
+        for spec in plan["create"]:
+            try:
+                await collection.create_index(list(spec.keys), **spec.options())
+                summary["created"].append(f"{collection_name}.{spec.name}")
+            except Exception as e:
+                logger.error(f"Failed to create index {collection_name}.{spec.name}: {e}")
+                summary["failed"].append(f"{collection_name}.{spec.name}")
+    
+    for name in summary["unknown"]:
+        logger.warning(f"Index {name} is not in the index registry")
+    logger.info(f"Reconciled MongoDB indexes: {len(summary['created'])} created, "
+                f"{len(summary['dropped'])} dropped, {len(summary['failed'])} failed")
+    return summary
+
+def find_plan_stages(plan: Dict[str, Any]) -> List[Tuple[str, Optional[str]]]:
+    """List the (stage, index name) pairs of an explain() plan tree."""
+    stages = []
+    pending = [plan]
+    while pending:
+        node = pending.pop()
+        if "stage" in node:
+            stages.append((node["stage"], node.get("indexName")))
+        # Slot-based plans nest the classic plan under queryPlan
+        for key in ("queryPlan", "inputStage"):
+            if key in node:
+                pending.append(node[key])
+        pending.extend(node.get("inputStages", []))
+    return stages
@@ -0,0 +1,95 @@
+from pymongo import UpdateOne
+from app.core.keywords import KeywordExtractor, tokenize
+from app.db.mongo import mongodb
+from app.core.config import settings
+from collections import Counter
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Holds the number of documents counted; tokens never start with an underscore
+NUM_DOCUMENTS_ID = "__num_documents__"
+
+class KeywordStats:
+    """
+    Corpus-wide document frequencies for TF-IDF keyword extraction.
+    Extraction runs on an in-memory KeywordExtractor. New documents are counted in it
+    right away and buffered; every sync_interval seconds the buffered counts are
+    written to MongoDB ({"_id": term, "df": count}, one $inc per term) and the
+    extractor is reloaded with the totals of every process.
+    """
+    
+    def __init__(self, collection_name: str = "keyword_stats", sync_interval: float = 300.0):
+        self.collection_name = collection_name
+        self.sync_interval = sync_interval
+        self.extractor = KeywordExtractor()
+        self.pending: Counter = Counter()
+        self.pending_documents = 0
+        self.synced_at: Optional[float] = None
+        self.lock: Optional[asyncio.Lock] = None
+    
+    async def add_document(self, text: str):
+        """Count a document's terms in the corpus statistics."""
+        terms = dict.fromkeys(set(tokenize(text)), 1)
+        self.extractor.add_counts(terms, 1)
+        self.pending.update(terms)
+        self.pending_documents += 1
+        await self._maybe_sync()
+    
+    async def extract(self, text: str, max_tags: int = 5) -> List[str]:
+        """Return the terms of text with the highest TF-IDF scores over the corpus."""
+        await self._maybe_sync()
+        return self.extractor.extract(text, max_tags)
+    
+    async def _maybe_sync(self):
+        if self.synced_at is not None and time.monotonic() - self.synced_at < self.sync_interval:
+            return
+        if self.lock is None:
+            # Created on first use so it belongs to the running event loop
+            self.lock = asyncio.Lock()
+        if not self.lock.locked():
+            await self.sync()
+    
+    async def sync(self):
+        """Write the buffered counts to MongoDB and reload the corpus-wide totals."""
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            self.synced_at = time.monotonic()
+            try:
+                collection = mongodb.get_collection(self.collection_name)
+            except Exception as e:
+                logger.error(f"Failed to sync keyword statistics: {e}")
+                return
+            
+            pending, pending_documents = self.pending, self.pending_documents
+            self.pending, self.pending_documents = Counter(), 0
+            if pending_documents:
+                operations = [UpdateOne({"_id": term}, {"$inc": {"df": count}}, upsert=True) for term, count in pending.items()]
+                operations.append(UpdateOne({"_id": NUM_DOCUMENTS_ID}, {"$inc": {"df": pending_documents}}, upsert=True))
+                try:
+                    await collection.bulk_write(operations, ordered=False)
+                except Exception as e:
+                    # Keep the counts for the next sync; the extractor already has them
+                    logger.error(f"Failed to save keyword statistics: {e}")
+                    self.pending.update(pending)
+                    self.pending_documents += pending_documents
+                    return
+            
+            try:
+                counts = {entry["_id"]: entry["df"] async for entry in collection.find({}, {"df": 1})}
+            except Exception as e:
+                logger.error(f"Failed to load keyword statistics: {e}")
+                return
+            
+            extractor = KeywordExtractor(initial_capacity=max(len(counts), 1))
+            num_documents = counts.pop(NUM_DOCUMENTS_ID, 0)
+            extractor.add_counts(counts, num_documents)
+            # Documents counted while loading are not in the totals yet
+            extractor.add_counts(dict(self.pending), self.pending_documents)
+            self.extractor = extractor
+
+keyword_stats = KeywordStats(sync_interval=settings.KEYWORD_STATS_SYNC_INTERVAL)
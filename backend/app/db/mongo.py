@@ -1,19 +1,107 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from pymongo.errors import ConnectionFailure
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
 from app.core.config import settings
+from app.db.indexes import reconcile_indexes
 import logging
 import asyncio
-from typing import Optional
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+def _parse_collection_options(value: str) -> Dict[str, str]:
+    """Parse "collection=option,collection=option" settings into a dict."""
+    options = {}
+    for item in value.split(","):
+        if "=" in item:
+            collection_name, option = item.split("=", 1)
+            options[collection_name.strip()] = option.strip()
+    return options
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Tracks connection pool usage per server from the driver's pool events.
+    Events arrive on driver threads, hence the lock.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pools = defaultdict(lambda: defaultdict(int))
+    
+    def _count(self, event, *fields, amount=1):
+        with self.lock:
+            pool = self.pools[f"{event.address[0]}:{event.address[1]}"]
+            for field in fields:
+                pool[field] += amount
+    
+    def pool_created(self, event):
+        self._count(event, "pools_created")
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        self._count(event, "pool_clears")
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        self._count(event, "open")
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        self._count(event, "open", amount=-1)
+    
+    def connection_check_out_started(self, event):
+        self._count(event, "waiting")
+    
+    def connection_check_out_failed(self, event):
+        self._count(event, "waiting", amount=-1)
+        self._count(event, "checkout_failures")
+    
+    def connection_checked_out(self, event):
+        self._count(event, "waiting", amount=-1)
+        self._count(event, "in_use", "checkouts")
+    
+    def connection_checked_in(self, event):
+        self._count(event, "in_use", amount=-1)
+    
+    def get_metrics(self, max_pool_size: int) -> Dict[str, Dict[str, float]]:
+        """Get the pool counters per server, with utilization as a share of max_pool_size."""
+        with self.lock:
+            metrics = {address: dict(pool) for address, pool in self.pools.items()}
+        for pool in metrics.values():
+            pool["utilization"] = pool.get("in_use", 0) / max_pool_size if max_pool_size else 0.0
+        return metrics
+
 class MongoDB:
     client: AsyncIOMotorClient = None
     
+    def __init__(self):
+        self.pool_listener = PoolMetricsListener()
+        self.read_preferences = _parse_collection_options(settings.MONGODB_READ_PREFERENCES)
+        self.read_concerns = _parse_collection_options(settings.MONGODB_READ_CONCERNS)
+        self.collections = {}
+    
     async def connect_to_mongo(self):
         """Connect to MongoDB."""
         try:
-            self.client = AsyncIOMotorClient(settings.MONGODB_URL)
+            self.client = AsyncIOMotorClient(
+                settings.MONGODB_URL,
+                maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+                minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+                maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+                event_listeners=[self.pool_listener]
+            )
+            self.collections = {}
             # Verify connection is working
             await self.client.admin.command('ping')
             logger.info("Connected to MongoDB")
@@ -31,9 +119,28 @@ class MongoDB:
         """Get database instance."""
         return self.client[settings.MONGODB_DB_NAME]
     
-    def get_collection(self, collection_name: str):
-        """Get collection from database."""
-        return self.get_db()[collection_name]
+    def get_collection(self, collection_name: str, read_preference: Optional[str] = None):
+        """
+        Get collection from database, with its configured read preference and read concern.
+        `read_preference` (a mode name such as "secondaryPreferred") overrides the configured one.
+        """
+        key = (collection_name, read_preference)
+        collection = self.collections.get(key)
+        if collection is None:
+            options = {}
+            mode = read_preference or self.read_preferences.get(collection_name)
+            if mode:
+                options["read_preference"] = make_read_preference(read_pref_mode_from_name(mode), None)
+            level = self.read_concerns.get(collection_name)
+            if level:
+                options["read_concern"] = ReadConcern(level)
+            collection = self.get_db().get_collection(collection_name, **options)
+            self.collections[key] = collection
+        return collection
+    
+    def get_pool_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Get connection pool usage per server."""
+        return self.pool_listener.get_metrics(settings.MONGODB_MAX_POOL_SIZE)
 
 mongodb = MongoDB()
 
@@ -46,26 +153,9 @@ async def close_mongo_connection():
 
 # Create indexes for collections that need them
 async def create_indexes():
-    """Create indexes for MongoDB collections."""
+    """Reconcile the MongoDB indexes with the index registry (app/db/indexes.py)."""
     try:
-        # Create index for users collection (for email and username uniqueness)
-        users_collection = mongodb.get_collection("users")
-        await users_collection.create_index("email", unique=True)
-        await users_collection.create_index("username", unique=True)
-        
-        # Create index for refresh tokens collection
-        refresh_tokens_collection = mongodb.get_collection("refresh_tokens")
-        await refresh_tokens_collection.create_index("token", unique=True)
-        await refresh_tokens_collection.create_index("user_id")
-        await refresh_tokens_collection.create_index("expires_at")
-        
-        # Create TTL index to automatically remove expired tokens
-        await refresh_tokens_collection.create_index(
-            "expires_at", 
-            expireAfterSeconds=0  # Remove documents after they expire
-        )
-        
-        logger.info("MongoDB indexes created successfully")
+        await reconcile_indexes(mongodb.get_db(), drop_unknown=settings.MONGODB_DROP_UNKNOWN_INDEXES)
     except Exception as e:
         logger.error(f"Failed to create MongoDB indexes: {e}")
         raise
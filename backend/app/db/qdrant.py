@@ -1,16 +1,34 @@
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from app.core.config import settings
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _to_list(vector):
+    """Convert a float32 vector to the list the Qdrant client models expect, right at the client boundary."""
+    return vector.tolist() if isinstance(vector, np.ndarray) else vector
+
+def _build_filter(tags=None, user_id=None, exclude_ids=None):
+    """Build a payload filter for document searches, or None when nothing is filtered."""
+    must = []
+    if tags:
+        must.append(models.FieldCondition(key="tags", match=models.MatchAny(any=list(tags))))
+    if user_id:
+        must.append(models.FieldCondition(key="user_id", match=models.MatchValue(value=user_id)))
+    must_not = [models.HasIdCondition(has_id=list(exclude_ids))] if exclude_ids else []
+    if not must and not must_not:
+        return None
+    return models.Filter(must=must or None, must_not=must_not or None)
+
 class QdrantDB:
     client = None
     collection_name = None
     
     def __init__(self):
         self.collection_name = settings.QDRANT_COLLECTION_NAME
+        self.user_centroid_collection_name = settings.QDRANT_USER_CENTROID_COLLECTION_NAME
     
     def connect_to_qdrant(self):
         """Connect to Qdrant vector database."""
@@ -20,13 +38,14 @@ class QdrantDB:
                 logger.info(f"Connecting to Qdrant Cloud at {settings.QDRANT_URL}")
                 self.client = QdrantClient(
                     url=settings.QDRANT_URL,
-                    api_key=settings.QDRANT_API_KEY
+                    api_key=settings.QDRANT_API_KEY,
+                    prefer_grpc=settings.QDRANT_PREFER_GRPC
                 )
                 logger.info(f"Connected to Qdrant Cloud with collection: {self.collection_name}")
             elif settings.QDRANT_MODE.lower() == "local":
                 # Connect to local Qdrant instance
                 logger.info(f"Connecting to local Qdrant at {settings.QDRANT_URL}")
-                self.client = QdrantClient(url=settings.QDRANT_URL)
+                self.client = QdrantClient(url=settings.QDRANT_URL, prefer_grpc=settings.QDRANT_PREFER_GRPC)
                 logger.info(f"Connected to local Qdrant with collection: {self.collection_name}")
             else:  # memory mode
                 # Use in-memory Qdrant instance
@@ -40,54 +59,64 @@ class QdrantDB:
             raise
     
     async def create_collection_if_not_exists(self):
-        """Create collection if it doesn't exist."""
+        """Create the document and user centroid collections if they don't exist."""
         try:
             collections = self.client.get_collections().collections
             collection_names = [collection.name for collection in collections]
             
-            if self.collection_name not in collection_names:
-                self.client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=models.VectorParams(
-                        size=settings.VECTOR_SIZE,
-                        distance=models.Distance.COSINE
+            for collection_name in (self.collection_name, self.user_centroid_collection_name):
+                if collection_name not in collection_names:
+                    self.client.create_collection(
+                        collection_name=collection_name,
+                        vectors_config=models.VectorParams(
+                            size=settings.VECTOR_SIZE,
+                            distance=models.Distance.COSINE
+                        )
                     )
+                    logger.info(f"Created collection: {collection_name}")
+                else:
+                    logger.info(f"Collection {collection_name} already exists")
+            
+            # Index the payload fields used to filter document searches
+            for field_name in ("tags", "user_id", "cluster_id"):
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=models.PayloadSchemaType.KEYWORD
                 )
-                logger.info(f"Created collection: {self.collection_name}")
-            else:
-                logger.info(f"Collection {self.collection_name} already exists")
             return True
         except Exception as e:
             logger.error(f"Failed to create collection: {e}")
             return False
     
     async def store_vectors(self, vectors, metadata, ids=None):
-        """Store vectors in Qdrant."""
+        """Store vectors (a 2-D float32 array or a list of vectors) in Qdrant."""
         try:
-            points = []
-            for i, (vector, payload) in enumerate(zip(vectors, metadata)):
-                point_id = ids[i] if ids else i
-                points.append(models.PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload=payload
-                ))
+            metadata = list(metadata)
+            vectors = np.asarray(vectors, dtype=np.float32)[:len(metadata)]
             
+            # One column-oriented batch instead of a PointStruct per vector
             self.client.upsert(
                 collection_name=self.collection_name,
-                points=points
+                points=models.Batch(
+                    ids=list(ids[:len(metadata)]) if ids else list(range(len(metadata))),
+                    vectors=vectors.tolist(),
+                    payloads=metadata
+                )
             )
             return True
         except Exception as e:
             logger.error(f"Failed to store vectors: {e}")
             return False
     
-    async def search_vectors(self, query_vector, limit=10):
+    async def search_vectors(self, query_vector, limit=10, score_threshold=None, exclude_ids=None):
         """Search for similar vectors in Qdrant."""
         try:
             results = self.client.search(
                 collection_name=self.collection_name,
-                query_vector=query_vector,
+                query_vector=_to_list(query_vector),
+                query_filter=_build_filter(exclude_ids=exclude_ids),
+                score_threshold=score_threshold,
                 limit=limit
             )
             return results
@@ -103,7 +132,7 @@ class QdrantDB:
                 points=[
                     models.PointStruct(
                         id=id,
-                        vector=vector,
+                        vector=_to_list(vector),
                         payload=metadata
                     )
                 ]
@@ -114,6 +143,78 @@ class QdrantDB:
             logger.error(f"Failed to store vector: {e}")
             return False
     
+    async def set_payload(self, id, metadata):
+        """Update the payload of a stored vector without touching the vector itself."""
+        try:
+            self.client.set_payload(
+                collection_name=self.collection_name,
+                payload=metadata,
+                points=[id]
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to set payload: {e}")
+            return False
+    
+    async def get_vectors(self, ids):
+        """Get stored vectors by point ID. Points that don't exist are left out."""
+        if not ids:
+            return {}
+        try:
+            points = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=list(ids),
+                with_payload=False,
+                with_vectors=True
+            )
+            return {str(point.id): np.asarray(point.vector, dtype=np.float32) for point in points}
+        except Exception as e:
+            logger.error(f"Failed to retrieve vectors: {e}")
+            return {}
+    
+    async def get_user_centroid(self, user_id):
+        """Get a user's centroid vector and the number of documents it averages, or None."""
+        points = self.client.retrieve(
+            collection_name=self.user_centroid_collection_name,
+            ids=[user_id],
+            with_payload=True,
+            with_vectors=True
+        )
+        if not points:
+            return None
+        return np.asarray(points[0].vector, dtype=np.float32), points[0].payload.get("document_count", 0)
+    
+    async def store_user_centroid(self, user_id, vector, document_count):
+        """Store a user's centroid vector, or delete it once the user has no documents left."""
+        if document_count <= 0:
+            self.client.delete(
+                collection_name=self.user_centroid_collection_name,
+                points_selector=models.PointIdsList(points=[user_id])
+            )
+            return
+        self.client.upsert(
+            collection_name=self.user_centroid_collection_name,
+            points=[
+                models.PointStruct(
+                    id=user_id,
+                    vector=_to_list(vector),
+                    payload={"user_id": user_id, "document_count": document_count}
+                )
+            ]
+        )
+    
+    async def search_user_centroids(self, query_vector, limit=10, exclude_user_id=None):
+        """Find the users whose centroids are closest to a vector."""
+        query_filter = None
+        if exclude_user_id:
+            query_filter = models.Filter(must_not=[models.HasIdCondition(has_id=[exclude_user_id])])
+        return self.client.search(
+            collection_name=self.user_centroid_collection_name,
+            query_vector=_to_list(query_vector),
+            query_filter=query_filter,
+            limit=limit
+        )
+    
     async def delete_vector(self, id):
         """Delete a vector from Qdrant."""
         try:
@@ -127,12 +228,29 @@ class QdrantDB:
             logger.error(f"Failed to delete vector: {e}")
             return False
     
+    async def recommend_similar(self, id, limit=10, tags=None, user_id=None, score_threshold=None):
+        """
+        Find documents similar to a stored document, searching with its stored vector.
+        The source document is never part of the results. Returns None if it has no vector.
+        """
+        try:
+            return self.client.recommend(
+                collection_name=self.collection_name,
+                positive=[id],
+                query_filter=_build_filter(tags=tags, user_id=user_id),
+                score_threshold=score_threshold,
+                limit=limit
+            )
+        except Exception as e:
+            logger.error(f"Failed to recommend documents similar to {id}: {e}")
+            return None
+    
     async def search_similar(self, query_vector, limit=10):
         """Search for similar vectors and return formatted results."""
         try:
             results = self.client.search(
                 collection_name=self.collection_name,
-                query_vector=query_vector,
+                query_vector=_to_list(query_vector),
                 limit=limit
             )
             
@@ -0,0 +1,34 @@
+import redis.asyncio as redis
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RedisDB:
+    client: redis.Redis = None
+    
+    async def connect_to_redis(self):
+        """Connect to Redis."""
+        try:
+            self.client = redis.from_url(settings.REDIS_URL)
+            await self.client.ping()
+            logger.info("Connected to Redis")
+        except Exception as e:
+            logger.error(f"Failed to connect to Redis: {e}")
+            self.client = None
+            raise
+    
+    def get_client(self) -> redis.Redis:
+        """Get the Redis client, creating it on first use (the connection is opened lazily)."""
+        if self.client is None:
+            self.client = redis.from_url(settings.REDIS_URL)
+        return self.client
+    
+    async def close_redis_connection(self):
+        """Close Redis connection."""
+        if self.client:
+            await self.client.close()
+            self.client = None
+            logger.info("Redis connection closed")
+
+redis_db = RedisDB()
@@ -0,0 +1,150 @@
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.core.pipeline import compute_content_hash
+from app.db.mongo import mongodb
+import logging
+import uuid
+import zlib
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, fall back to zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+class TextStore:
+    """
+    Content-addressed store for the full text of documents.
+    Text is compressed (zstd, or zlib if zstandard is not installed) and kept in
+    GridFS under its content hash, so identical documents share a single blob.
+    
+    Documents referencing a hash are counted in a {bucket}.refs collection
+    ({"_id": hash, "refs": n, "generation": ...}), updated with $inc. The blob is
+    deleted once the count drops to zero, by whoever deletes the counter, and only
+    the blob of that counter's generation: a concurrent put recreates the counter
+    with a new generation and uploads its own blob, so it never points at a deleted one.
+    Blobs stored before the counters existed have no generation; they are deleted
+    only when no document references their hash.
+    """
+    bucket: AsyncIOMotorGridFSBucket = None
+    
+    def __init__(self):
+        self.bucket_name = settings.TEXT_STORE_BUCKET
+    
+    def get_bucket(self) -> AsyncIOMotorGridFSBucket:
+        """Get the GridFS bucket, creating it on first use."""
+        if self.bucket is None:
+            self.bucket = AsyncIOMotorGridFSBucket(mongodb.get_db(), bucket_name=self.bucket_name)
+        return self.bucket
+    
+    def _compress(self, data: bytes):
+        """Compress data with the best available codec."""
+        if zstandard:
+            compressor = zstandard.ZstdCompressor(level=settings.TEXT_STORE_COMPRESSION_LEVEL)
+            return compressor.compress(data), "zstd"
+        return zlib.compress(data, min(settings.TEXT_STORE_COMPRESSION_LEVEL, 9)), "zlib"
+    
+    def _decompress(self, data: bytes, codec: str) -> bytes:
+        """Decompress data stored with the given codec."""
+        if codec == "zstd":
+            if not zstandard:
+                raise RuntimeError("zstandard is required to read zstd-compressed text")
+            return zstandard.ZstdDecompressor().decompress(data)
+        if codec == "zlib":
+            return zlib.decompress(data)
+        return data
+    
+    async def exists(self, content_hash: str) -> bool:
+        """Check whether text with the given hash is stored."""
+        files_collection = mongodb.get_collection(f"{self.bucket_name}.files")
+        return await files_collection.find_one({"filename": content_hash}, {"_id": 1}) is not None
+    
+    def _refs(self):
+        return mongodb.get_collection(f"{self.bucket_name}.refs")
+    
+    async def put(self, content: str, content_hash: Optional[str] = None, previous_hash: Optional[str] = None) -> str:
+        """
+        Store text for a document and return its content hash, taking a reference to it.
+        `previous_hash` is the hash the document references already; storing the same
+        text again doesn't take a second reference. Already-stored text is not uploaded again.
+        """
+        content_hash = content_hash or compute_content_hash(content)
+        if content_hash == previous_hash and await self._refs().find_one({"_id": content_hash}, {"_id": 1}):
+            return content_hash
+        
+        ref = await self._refs().find_one_and_update(
+            {"_id": content_hash},
+            {"$inc": {"refs": 1}, "$setOnInsert": {"generation": uuid.uuid4().hex}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        generation = ref["generation"]
+        files_collection = mongodb.get_collection(f"{self.bucket_name}.files")
+        if await files_collection.find_one({"filename": content_hash, "metadata.generation": generation}, {"_id": 1}):
+            return content_hash
+        
+        raw = content.encode("utf-8")
+        data, codec = self._compress(raw)
+        await self.get_bucket().upload_from_stream(
+            content_hash,
+            data,
+            metadata={"codec": codec, "size": len(raw), "generation": generation}
+        )
+        logger.info(f"Stored text {content_hash} ({len(raw)} bytes, {len(data)} compressed)")
+        return content_hash
+    
+    async def get(self, content_hash: str) -> Optional[str]:
+        """Load text by its content hash. Returns None if it is not stored."""
+        try:
+            stream = await self.get_bucket().open_download_stream_by_name(content_hash)
+        except NoFile:
+            return None
+        
+        data = await stream.read()
+        codec = (stream.metadata or {}).get("codec", "none")
+        return self._decompress(data, codec).decode("utf-8")
+    
+    async def release(self, content_hash: Optional[str]) -> bool:
+        """Drop a document's reference to stored text, deleting the text once nothing references it."""
+        if not content_hash:
+            return False
+        
+        refs = self._refs()
+        ref = await refs.find_one_and_update(
+            {"_id": content_hash},
+            {"$inc": {"refs": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if ref is None:
+            return await self._release_legacy(content_hash)
+        if ref["refs"] > 0:
+            return False
+        
+        # Fails if a put took a new reference since the decrement
+        result = await refs.delete_one({"_id": content_hash, "generation": ref["generation"], "refs": {"$lte": 0}})
+        if not result.deleted_count:
+            return False
+        await self._delete_files({"filename": content_hash, "metadata.generation": ref["generation"]})
+        logger.info(f"Deleted text {content_hash}")
+        return True
+    
+    async def _release_legacy(self, content_hash: str) -> bool:
+        """Delete text stored without a reference count, if no document references it."""
+        documents_collection = mongodb.get_collection("documents")
+        if await documents_collection.count_documents({"content_hash": content_hash}, limit=1):
+            return False
+        await self._delete_files({"filename": content_hash, "metadata.generation": {"$exists": False}})
+        logger.info(f"Deleted legacy text {content_hash}")
+        return True
+    
+    async def _delete_files(self, query):
+        bucket = self.get_bucket()
+        files_collection = mongodb.get_collection(f"{self.bucket_name}.files")
+        async for file in files_collection.find(query, {"_id": 1}):
+            await bucket.delete(file["_id"])
+
+text_store = TextStore()
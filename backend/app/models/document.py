@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from typing import List, Optional, Literal, Dict
 from datetime import datetime
 import uuid
 
@@ -26,6 +26,11 @@ class DocumentInDB(DocumentBase):
     processing_status: Literal["pending", "processing", "completed", "failed"] = "pending"
     processing_error: Optional[str] = None
     last_processed: Optional[datetime] = None
+    content_hash: Optional[str] = None
+    stage_fingerprints: Dict[str, str] = Field(default_factory=dict)
+    cluster_id: Optional[str] = None  # ID of the first document of its near-duplicate cluster
+    duplicate_of: Optional[str] = None
+    duplicate_status: Optional[Literal["flagged", "merged"]] = None
     
 class DocumentResponse(DocumentInDB):
     pass
@@ -19,6 +19,8 @@ class UserInDB(UserBase):
     role: str = "user"  # user, admin
     preferences: Dict[str, Any] = Field(default_factory=dict)
     last_login: Optional[datetime] = None
+    # Bumped to invalidate every access token issued before
+    token_version: int = 0
     # MFA fields
     mfa_enabled: bool = False
     mfa_secret: Optional[str] = None
@@ -67,3 +69,13 @@ class UserSimilarity(BaseModel):
     
 class UserRecommendation(BaseModel):
     similar_users: List[UserSimilarity]
+
+class RefreshToken(BaseModel):
+    id: str
+    user_id: str
+    token: str
+    expires_at: datetime
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    revoked: bool = False
+    user_agent: Optional[str] = None
+    ip_address: Optional[str] = None
@@ -0,0 +1,253 @@
+"""
+Celery tasks for offline document enrichment through provider batch APIs.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from pymongo import UpdateOne
+from app.core.batch_enrichment import (
+    BatchProvider, BATCH_STAGES, BATCH_PENDING, BATCH_COMPLETED, BATCH_FAILED,
+    get_batch_provider, build_batch_requests, write_batch_requests, parse_batch_results
+)
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.document_cache import document_cache
+from app.core.llm_client import llm_client
+from app.core.pipeline import compute_stage_fingerprints, fingerprint_updates
+from app.db.mongo import mongodb
+from app.db.qdrant import qdrant
+from app.db.text_store import text_store
+from app.tasks.document_processing import plan_stages, load_document_content, batch_process_documents
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+async def submit_enrichment_batch(
+    provider: BatchProvider,
+    doc_ids: Optional[List[str]] = None,
+    limit: Optional[int] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Group documents with stale summary or tag stages into one provider batch job.
+    Defaults to pending and failed documents. Returns the stored job record, or
+    None if there was nothing to enrich.
+    """
+    limit = limit or settings.BATCH_ENRICHMENT_MAX_DOCUMENTS
+    documents_collection = mongodb.get_collection("documents")
+    query = {"id": {"$in": doc_ids}} if doc_ids else {"processing_status": {"$in": ["pending", "failed"]}}
+    documents = await documents_collection.find(query).to_list(length=limit)
+    
+    entries, batch_documents = [], []
+    for document in documents:
+        try:
+            content = await load_document_content(document)
+            if not content:
+                logger.warning(f"No content found for document {document['id']}, skipping")
+                continue
+            content_hash = await text_store.put(content, previous_hash=document.get("content_hash"))
+        except Exception as e:
+            logger.error(f"Error loading document {document['id']} for batch enrichment: {e}")
+            continue
+        
+        _, stages = plan_stages(content_hash, document)
+        batch_stages = sorted(stages & set(BATCH_STAGES))
+        if batch_stages:
+            entries.append({"doc_id": document["id"], "content_hash": content_hash, "stages": batch_stages})
+            batch_documents.append((document["id"], content, batch_stages))
+    
+    if not entries:
+        logger.info("No documents need batch enrichment")
+        return None
+    
+    # Write the requests and submit them as a single job
+    requests = build_batch_requests(
+        batch_documents,
+        provider.model,
+        summary_token_budget=settings.SUMMARY_INPUT_TOKEN_BUDGET,
+        tags_token_budget=settings.TAGS_INPUT_TOKEN_BUDGET
+    )
+    requests_path = write_batch_requests(requests, settings.BATCH_ENRICHMENT_DIR)
+    try:
+        batch_id = await provider.submit(requests_path)
+    finally:
+        os.remove(requests_path)
+    
+    job = {
+        "id": batch_id,
+        "provider": provider.name,
+        "status": BATCH_PENDING,
+        "documents": entries,
+        "request_count": len(requests),
+        "created_at": datetime.utcnow(),
+        "completed_at": None
+    }
+    await mongodb.get_collection("enrichment_batches").insert_one(job)
+    
+    # Mark the documents as being processed
+    await documents_collection.update_many(
+        {"id": {"$in": [entry["doc_id"] for entry in entries]}},
+        {"$set": {"processing_status": "processing"}}
+    )
+    await document_cache.invalidate(*(entry["doc_id"] for entry in entries))
+    
+    logger.info(f"Submitted enrichment batch {batch_id} with {len(requests)} requests for {len(entries)} documents")
+    return job
+
+async def apply_enrichment_results(job: Dict[str, Any], lines: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fan batch results back into the document records.
+    Results for documents whose content changed since submission are discarded.
+    """
+    parsed = parse_batch_results(lines)
+    stage_versions = llm_client.get_stage_versions()
+    operations, outcomes = [], {}
+    now = datetime.utcnow()
+    
+    for entry in job["documents"]:
+        doc_id = entry["doc_id"]
+        outputs, errors = parsed.get(doc_id, ({}, {}))
+        for stage in entry["stages"]:
+            if stage not in outputs and stage not in errors:
+                errors[stage] = "No result in batch output"
+        
+        fingerprints = compute_stage_fingerprints(entry["content_hash"], stage_versions)
+        error = "; ".join(f"{stage}: {message}" for stage, message in errors.items()) or None
+        operations.append(UpdateOne(
+            # Documents processed before the text store existed have no content hash yet
+            {"id": doc_id, "content_hash": {"$in": [entry["content_hash"], None]}},
+            {"$set": {
+                **outputs,
+                "content_hash": entry["content_hash"],
+                "processing_status": "failed" if error else "completed",
+                "processing_error": error,
+                "last_processed": now,
+                **fingerprint_updates(fingerprints, outputs)
+            }}
+        ))
+        outcomes[doc_id] = "failed" if error else "succeeded"
+    
+    documents_collection = mongodb.get_collection("documents")
+    if operations:
+        await documents_collection.bulk_write(operations, ordered=False)
+        await document_cache.invalidate(*outcomes)
+    
+    # A document whose hash differs from the submitted one changed meanwhile and kept its record
+    doc_ids = list(outcomes)
+    documents = await documents_collection.find({"id": {"$in": doc_ids}}).to_list(length=len(doc_ids))
+    applied = {document["id"]: document for document in documents}
+    for entry in job["documents"]:
+        document = applied.get(entry["doc_id"])
+        if document is None or document.get("content_hash") != entry["content_hash"]:
+            outcomes[entry["doc_id"]] = "stale"
+            applied.pop(entry["doc_id"], None)
+    
+    # Refresh the Qdrant payload, or compute the embedding where that stage is stale too
+    embedding_ids = []
+    for doc_id, document in applied.items():
+        if not parsed.get(doc_id, ({}, {}))[0]:
+            continue
+        _, stages = plan_stages(document["content_hash"], document)
+        if "embedding" in stages:
+            embedding_ids.append(doc_id)
+        elif document.get("duplicate_status") != "merged":
+            # Merged duplicates have no point of their own in Qdrant
+            await qdrant.set_payload(doc_id, {
+                "doc_id": doc_id,
+                "user_id": document.get("user_id"),
+                "title": document.get("title"),
+                "summary": document.get("summary"),
+                "tags": document.get("tags", [])
+            })
+    if embedding_ids:
+        await batch_process_documents(embedding_ids)
+    
+    succeeded, failed, stale = ([doc_id for doc_id, outcome in outcomes.items() if outcome == kind] for kind in ("succeeded", "failed", "stale"))
+    await mongodb.get_collection("enrichment_batches").update_one(
+        {"id": job["id"]},
+        {"$set": {
+            "status": BATCH_COMPLETED, "completed_at": now,
+            "succeeded": len(succeeded), "failed": len(failed), "stale": len(stale)
+        }}
+    )
+    
+    logger.info(f"Applied enrichment batch {job['id']}: {len(succeeded)} succeeded, {len(failed)} failed, {len(stale)} stale")
+    return {"status": BATCH_COMPLETED, "batch_id": job["id"], "succeeded": succeeded, "failed": failed, "stale": stale}
+
+async def check_enrichment_batch(provider: BatchProvider, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Check a submitted job once and apply its results if it has finished."""
+    status = await provider.get_status(job["id"])
+    
+    if status["status"] == BATCH_COMPLETED:
+        lines = await provider.fetch_results(job["id"], status)
+        return await apply_enrichment_results(job, lines)
+    
+    if status["status"] == BATCH_FAILED:
+        doc_ids = [entry["doc_id"] for entry in job["documents"]]
+        error = f"Batch {job['id']} {status.get('provider_status', 'failed')}"
+        await mongodb.get_collection("documents").update_many(
+            {"id": {"$in": doc_ids}},
+            {"$set": {"processing_status": "failed", "processing_error": error}}
+        )
+        await document_cache.invalidate(*doc_ids)
+        await mongodb.get_collection("enrichment_batches").update_one(
+            {"id": job["id"]},
+            {"$set": {"status": BATCH_FAILED, "completed_at": datetime.utcnow(), "error": error}}
+        )
+        logger.error(error)
+        return {"status": BATCH_FAILED, "batch_id": job["id"], "error": error}
+    
+    return {"status": BATCH_PENDING, "batch_id": job["id"], "provider_status": status.get("provider_status")}
+
+async def wait_for_enrichment_batch(
+    provider: BatchProvider,
+    job: Dict[str, Any],
+    poll_interval: Optional[float] = None,
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """Poll a submitted job until it finishes or the timeout expires."""
+    poll_interval = poll_interval if poll_interval is not None else settings.BATCH_ENRICHMENT_POLL_INTERVAL
+    deadline = time.monotonic() + (timeout if timeout is not None else settings.BATCH_ENRICHMENT_TIMEOUT)
+    
+    while True:
+        result = await check_enrichment_batch(provider, job)
+        if result["status"] != BATCH_PENDING or time.monotonic() >= deadline:
+            return result
+        await asyncio.sleep(poll_interval)
+
+@celery_app.task(name="batch_enrich_documents")
+async def batch_enrich_documents(
+    doc_ids: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    provider_name: Optional[str] = None,
+    wait: bool = True
+) -> Dict[str, Any]:
+    """
+    Enrich documents offline through a provider batch job:
+    1. Write the summary and tag requests of stale documents to a JSONL file
+    2. Submit it to the provider's batch API
+    3. Poll for completion (unless `wait` is False; see poll_enrichment_batches)
+    4. Write the results back to MongoDB and Qdrant
+    """
+    provider = get_batch_provider(provider_name or settings.BATCH_ENRICHMENT_PROVIDER)
+    job = await submit_enrichment_batch(provider, doc_ids, limit)
+    if not job:
+        return {"status": "skipped", "reason": "No documents need enrichment"}
+    if not wait:
+        return {"status": BATCH_PENDING, "batch_id": job["id"]}
+    return await wait_for_enrichment_batch(provider, job)
+
+@celery_app.task(name="poll_enrichment_batches")
+async def poll_enrichment_batches() -> Dict[str, Any]:
+    """Check every pending batch job once, applying the results of finished jobs."""
+    results = []
+    batches_collection = mongodb.get_collection("enrichment_batches")
+    async for job in batches_collection.find({"status": BATCH_PENDING}):
+        try:
+            provider = get_batch_provider(job["provider"])
+            results.append(await check_enrichment_batch(provider, job))
+        except Exception as e:
+            logger.error(f"Error checking enrichment batch {job['id']}: {e}")
+            results.append({"status": "error", "batch_id": job["id"], "error": str(e)})
+    return {"status": "completed", "results": results}
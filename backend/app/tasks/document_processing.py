@@ -1,18 +1,149 @@
 """
 Celery tasks for document processing.
 """
+import asyncio
 import logging
+from collections import defaultdict
+from datetime import datetime
+from pymongo import UpdateOne
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.core.utils import file_parser, s3_storage
 from app.core.llm_client import llm_client
+from app.core.provider_scheduler import ProviderUnavailable
+from app.core.recommendations import user_centroids
+from app.core.document_cache import document_cache
+from app.core.dedup import minhash_signature, lsh_band_keys, estimate_jaccard
+from app.core.pipeline import (
+    compute_content_hash, compute_stage_fingerprints, get_stale_stages, fingerprint_updates, completed_stages
+)
 from app.db.mongo import mongodb
 from app.db.qdrant import qdrant
+from app.db.text_store import text_store
 from app.models.document import DocumentInDB
 import uuid
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Tuple, Set
 
 logger = logging.getLogger(__name__)
 
+def plan_stages(content_hash: str, document: Dict[str, Any], force: bool = False) -> Tuple[Dict[str, str], Set[str]]:
+    """Compute the expected stage fingerprints and the stages that need to run."""
+    fingerprints = compute_stage_fingerprints(content_hash, llm_client.get_stage_versions())
+    stages = get_stale_stages(document, fingerprints, force)
+    if document.get("duplicate_status") == "merged":
+        # Merged duplicates are represented in search by their original
+        stages.discard("embedding")
+    return fingerprints, stages
+
+async def load_document_content(document: Dict[str, Any]) -> str:
+    """
+    Load the full text of a stored document.
+    Prefers the text store, then re-parses the original file from S3, and finally
+    falls back to the stored excerpt for documents processed before the text store existed.
+    """
+    content_hash = document.get("content_hash")
+    if content_hash:
+        content = await text_store.get(content_hash)
+        if content:
+            return content
+    
+    if document.get("s3_url"):
+        file_content = await s3_storage.download_file(document["s3_url"])
+        content = await file_parser.parse_bytes(file_content, document.get("file_type", ""))
+        if content:
+            return content
+    
+    content = document.get("original_text", "")
+    if content:
+        logger.warning(f"Full text for document {document.get('id')} not found, using stored excerpt")
+    return content
+
+async def find_duplicate(
+    doc_id: str,
+    content: str,
+    embedding: Optional[Any] = None
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Look for an already ingested near-duplicate of a document:
+    first among documents sharing an LSH bucket, by estimated Jaccard similarity,
+    then by the similarity of the nearest stored vector (if `embedding` is given).
+    Returns the MinHash fields to store on the document and the duplicate, if any.
+    """
+    signature = minhash_signature(content, settings.DEDUP_NUM_PERM, settings.DEDUP_SHINGLE_SIZE)
+    fields = {"minhash": signature.tolist(), "minhash_bands": lsh_band_keys(signature, settings.DEDUP_LSH_BANDS)}
+    
+    documents_collection = mongodb.get_collection("documents")
+    projection = {"id": 1, "minhash": 1, "cluster_id": 1, "summary": 1, "tags": 1}
+    not_merged = {"id": {"$ne": doc_id}, "duplicate_status": {"$ne": "merged"}}
+    candidates = await documents_collection.find(
+        {"minhash_bands": {"$in": fields["minhash_bands"]}, **not_merged}, projection
+    ).limit(settings.DEDUP_MAX_CANDIDATES).to_list(length=settings.DEDUP_MAX_CANDIDATES)
+    
+    best, best_similarity = None, settings.DEDUP_JACCARD_THRESHOLD
+    for candidate in candidates:
+        similarity = estimate_jaccard(signature, candidate.get("minhash") or [])
+        if similarity >= best_similarity:
+            best, best_similarity = candidate, similarity
+    if best:
+        return fields, {**best, "similarity": best_similarity, "method": "minhash"}
+    
+    if embedding is not None and settings.DEDUP_VECTOR_THRESHOLD > 0:
+        hits = await qdrant.search_vectors(
+            embedding, limit=1, score_threshold=settings.DEDUP_VECTOR_THRESHOLD, exclude_ids=[doc_id]
+        )
+        if hits:
+            candidate = await documents_collection.find_one({"id": str(hits[0].id), **not_merged}, projection)
+            if candidate:
+                return fields, {**candidate, "similarity": hits[0].score, "method": "vector"}
+    
+    return fields, None
+
+async def _run_llm_stages(content: str, stages: Set[str]) -> Tuple[Dict[str, Any], Dict[str, str], Set[str]]:
+    """
+    Run the stale LLM stages (summary and tags) concurrently.
+    Returns the stage outputs, the errors of the stages that failed and the stages
+    deferred because no provider was reachable. Failed and deferred stages still get
+    a local fallback output (extractive summary, keyword tags) but are not recorded
+    as completed, so they are retried on the next run; only errors fail the document.
+    Without any provider configured the local output is final.
+    """
+    local = not llm_client.has_providers()
+    coroutines = {}
+    if "summary" in stages:
+        coroutines["summary"] = llm_client.extractive_summary(content) if local else llm_client.summarize_text(content, fallback=False)
+    if "tags" in stages:
+        coroutines["tags"] = llm_client.keyword_tags(content) if local else llm_client.extract_tags(content, fallback=False)
+    
+    values = await asyncio.gather(*coroutines.values(), return_exceptions=True)
+    
+    outputs, errors, deferred = {}, {}, set()
+    for stage, value in zip(coroutines, values):
+        if isinstance(value, ProviderUnavailable):
+            logger.warning(f"Stage {stage} deferred, using local fallback: {value}")
+            deferred.add(stage)
+        elif isinstance(value, Exception):
+            logger.error(f"Stage {stage} failed, using local fallback: {value}")
+            errors[stage] = str(value)
+        else:
+            outputs[stage] = value
+    
+    if local:
+        return outputs, errors, deferred
+    try:
+        if "summary" in errors or "summary" in deferred:
+            outputs["summary"] = await llm_client.extractive_summary(content)
+        if "tags" in errors or "tags" in deferred:
+            outputs["tags"] = await llm_client.keyword_tags(content)
+    except Exception as e:
+        logger.error(f"Local fallback failed: {e}")
+    return outputs, errors, deferred
+
+def _format_stage_errors(errors: Dict[str, str]) -> Optional[str]:
+    """Format per-stage errors for the processing_error field."""
+    if not errors:
+        return None
+    return "; ".join(f"{stage}: {error}" for stage, error in errors.items())
+
 @celery_app.task(name="process_document")
 async def process_document(
     doc_id: str,
@@ -20,67 +151,140 @@ async def process_document(
     title: Optional[str] = None,
     user_id: Optional[str] = None,
     s3_url: Optional[str] = None,
-    file_type: Optional[str] = None
+    file_type: Optional[str] = None,
+    document: Optional[Dict[str, Any]] = None,
+    force: bool = False
 ) -> Dict[str, Any]:
     """
     Process a document asynchronously:
-    1. Generate summary and tags using LLM
-    2. Generate embeddings
-    3. Store document in MongoDB
-    4. Store vector in Qdrant
+    1. Store the full text in the text store
+    2. Work out which stages are stale from the stored stage fingerprints
+    3. Check new documents for near-duplicates, reusing the enrichment of the
+       original (and skipping the vector when merging) instead of calling the LLM
+    4. Generate summary and tags using LLM (stale stages only)
+    5. Generate embeddings and store the vector in Qdrant (if stale)
+    6. Store document in MongoDB along with the new fingerprints
+    
+    `document` is the currently stored record, if any. Without it every stage runs.
     """
     try:
         logger.info(f"Processing document {doc_id}")
+        existing = document or {}
         
-        # Process content with LLM
-        summary_task = llm_client.summarize_text(content)
-        tags_task = llm_client.extract_tags(content)
+        # Store the full text so reprocessing never depends on the excerpt
+        content_hash = await text_store.put(content, previous_hash=existing.get("content_hash"))
+        if content_hash != existing.get("content_hash"):
+            await llm_client.update_keyword_stats(content)
+        
+        fingerprints, stages = plan_stages(content_hash, existing, force)
         
-        # Wait for LLM tasks to complete
-        summary = await summary_task
-        tags = await tags_task
+        # Check new documents for near-duplicates before spending on LLM calls
+        embedding, dedup_fields, reused = None, {}, {}
+        cluster_fields = {"cluster_id": existing.get("cluster_id") or doc_id}
+        if settings.DEDUP_MODE != "off" and not existing.get("content_hash") and content.strip():
+            if "embedding" in stages and settings.DEDUP_VECTOR_THRESHOLD > 0:
+                try:
+                    embedding = (await llm_client.get_embeddings([content]))[0]
+                except Exception as e:
+                    logger.error(f"Embedding for duplicate check failed for document {doc_id}: {e}")
+            dedup_fields, duplicate = await find_duplicate(doc_id, content, embedding)
+            if duplicate:
+                status = "merged" if settings.DEDUP_MODE == "merge" else "flagged"
+                logger.info(f"Document {doc_id} {status} as near-duplicate of {duplicate['id']} "
+                            f"({duplicate['method']} similarity {duplicate['similarity']:.2f})")
+                cluster_fields = {
+                    "cluster_id": duplicate.get("cluster_id") or duplicate["id"],
+                    "duplicate_of": duplicate["id"],
+                    "duplicate_status": status
+                }
+                # Reuse the enrichment of the original instead of calling the LLM again
+                reused = {stage: duplicate[stage] for stage in ("summary", "tags") if stage in stages and duplicate.get(stage)}
+                stages -= set(reused)
+                if status == "merged":
+                    stages.discard("embedding")
+        logger.info(f"Document {doc_id} stages to run: {sorted(stages) or 'none'}")
         
-        # Generate embeddings
-        embeddings = await llm_client.get_embeddings([content])
+        # Process content with LLM
+        outputs, errors, deferred = await _run_llm_stages(content, stages)
+        outputs = {**reused, **outputs}
+        summary = outputs.get("summary", existing.get("summary"))
+        tags = outputs.get("tags", existing.get("tags") or [])
+        completed = completed_stages(outputs, errors, deferred)
         
         # Generate title if not provided
         if not title:
             title = " ".join(content.split()[:5]) + "..."
         
-        # Create document object
-        document = DocumentInDB(
-            id=doc_id,
-            title=title,
-            summary=summary,
-            tags=tags,
-            original_text=content[:1000],  # Store first 1000 chars only
-            user_id=user_id,
-            s3_url=s3_url,
-            file_type=file_type,
-            qdrant_id=doc_id,
-            processing_status="completed"
-        )
+        metadata = {
+            "doc_id": doc_id,
+            "user_id": user_id,
+            "title": title,
+            "summary": summary,
+            "tags": tags,
+            "cluster_id": cluster_fields["cluster_id"]
+        }
+        
+        if "embedding" in stages:
+            # Generate embeddings (unless the duplicate check already did) and store vector in Qdrant
+            try:
+                if embedding is None:
+                    embedding = (await llm_client.get_embeddings([content]))[0]
+                previous = (await qdrant.get_vectors([doc_id])).get(doc_id)
+                if await qdrant.store_vector(doc_id, embedding, metadata):
+                    completed.add("embedding")
+                    # Swap the old vector for the new one in the user's centroid
+                    await user_centroids.update(
+                        user_id, added=[embedding], removed=[previous] if previous is not None else []
+                    )
+                else:
+                    errors["embedding"] = "Failed to store vector"
+            except Exception as e:
+                logger.error(f"Stage embedding failed for document {doc_id}: {e}")
+                errors["embedding"] = str(e)
+        elif "merged" not in (cluster_fields.get("duplicate_status"), existing.get("duplicate_status")) and (
+            outputs or title != existing.get("title")
+        ):
+            # Only the payload changed, keep the stored vector (merged duplicates have none)
+            await qdrant.set_payload(doc_id, metadata)
         
         # Store document in MongoDB
+        update = {
+            "title": title,
+            "summary": summary,
+            "tags": tags,
+            "original_text": content[:1000],  # Excerpt only, full text lives in the text store
+            "user_id": user_id,
+            "s3_url": s3_url,
+            "file_type": file_type,
+            "qdrant_id": doc_id,
+            "content_hash": content_hash,
+            "processing_status": "failed" if errors else "completed",
+            "processing_error": _format_stage_errors(errors),
+            "last_processed": datetime.utcnow(),
+            **dedup_fields,
+            **cluster_fields,
+            **fingerprint_updates(fingerprints, completed)
+        }
+        defaults = DocumentInDB(id=doc_id, title=title).dict(exclude=set(update) | {"stage_fingerprints"})
+        
         documents_collection = mongodb.get_collection("documents")
         await documents_collection.update_one(
             {"id": doc_id},
-            {"$set": document.dict()},
+            {"$set": update, "$setOnInsert": defaults},
             upsert=True
         )
+        await document_cache.invalidate(doc_id)
         
-        # Store vector in Qdrant
-        metadata = {
-            "doc_id": doc_id,
-            "user_id": user_id,
-            "title": title,
-            "summary": summary,
-            "tags": tags
-        }
-        await qdrant.store_vector(doc_id, embeddings[0], metadata)
+        # Drop the previous text if nothing else references it
+        if existing.get("content_hash") and existing["content_hash"] != content_hash:
+            await text_store.release(existing["content_hash"])
+        
+        if errors:
+            logger.error(f"Document {doc_id} processed with errors: {update['processing_error']}")
+            return {"status": "error", "document_id": doc_id, "stages": sorted(completed), "error": update["processing_error"]}
         
         logger.info(f"Document {doc_id} processed successfully")
-        return {"status": "success", "document_id": doc_id}
+        return {"status": "success", "document_id": doc_id, "stages": sorted(completed)}
     
     except Exception as e:
         logger.error(f"Error processing document {doc_id}: {e}")
@@ -92,17 +296,20 @@ async def process_document(
                 {"id": doc_id},
                 {"$set": {"processing_status": "failed", "processing_error": str(e)}}
             )
+            await document_cache.invalidate(doc_id)
         except Exception as update_error:
             logger.error(f"Error updating document status: {update_error}")
         
         return {"status": "error", "document_id": doc_id, "error": str(e)}
 
 @celery_app.task(name="reprocess_document")
-async def reprocess_document(doc_id: str) -> Dict[str, Any]:
+async def reprocess_document(doc_id: str, force: bool = False) -> Dict[str, Any]:
     """
     Reprocess an existing document:
     1. Fetch document from MongoDB
-    2. Process content again
+    2. Skip it if every stage is up to date
+    3. Load the full text from the text store
+    4. Rerun the stages whose inputs or versions changed (all stages if `force`)
     """
     try:
         logger.info(f"Reprocessing document {doc_id}")
@@ -114,12 +321,18 @@ async def reprocess_document(doc_id: str) -> Dict[str, Any]:
         if not document:
             raise ValueError(f"Document {doc_id} not found")
         
-        # If document has S3 URL, download content
-        content = document.get("original_text", "")
-        if document.get("s3_url") and not content:
-            file_content = await s3_storage.download_file(document["s3_url"])
-            content = await file_parser.parse_content(file_content, document.get("file_type", ""))
+        # Check the stage fingerprints before loading any text
+        if document.get("content_hash"):
+            _, stages = plan_stages(document["content_hash"], document, force)
+            if not stages:
+                await documents_collection.update_one(
+                    {"id": doc_id},
+                    {"$set": {"processing_status": "completed", "processing_error": None}}
+                )
+                logger.info(f"Document {doc_id} is up to date")
+                return {"status": "success", "document_id": doc_id, "stages": []}
         
+        content = await load_document_content(document)
         if not content:
             raise ValueError(f"No content found for document {doc_id}")
         
@@ -130,25 +343,234 @@ async def reprocess_document(doc_id: str) -> Dict[str, Any]:
             title=document.get("title"),
             user_id=document.get("user_id"),
             s3_url=document.get("s3_url"),
-            file_type=document.get("file_type")
+            file_type=document.get("file_type"),
+            document=document,
+            force=force
         )
     
     except Exception as e:
         logger.error(f"Error reprocessing document {doc_id}: {e}")
         return {"status": "error", "document_id": doc_id, "error": str(e)}
 
+async def _process_document_chunk(
+    doc_ids: List[str],
+    semaphore: asyncio.Semaphore,
+    force: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Reprocess a chunk of documents:
+    1. Fetch all documents with a single MongoDB query
+    2. Load the text of documents with stale stages and run the stale summary
+       and tag stages concurrently, bounded by the semaphore
+    3. Generate embeddings for every document with a stale embedding in one call
+    4. Upsert vectors to Qdrant in batches (payload-only updates for the rest)
+    5. Write all document updates to MongoDB with one bulk_write
+    6. Release stored text that a document no longer references
+    
+    Unlike process_document there is no near-duplicate check: the chunk only holds
+    stored documents, which were checked (and merged or flagged) when first processed.
+    """
+    documents_collection = mongodb.get_collection("documents")
+    documents = await documents_collection.find({"id": {"$in": doc_ids}}).to_list(length=len(doc_ids))
+    documents_by_id = {document["id"]: document for document in documents}
+    
+    results: Dict[str, Dict[str, Any]] = {}
+    for doc_id in doc_ids:
+        if doc_id not in documents_by_id:
+            results[doc_id] = {"status": "error", "document_id": doc_id, "error": f"Document {doc_id} not found"}
+    
+    contents: Dict[str, str] = {}
+    plans: Dict[str, Tuple[str, Dict[str, str], Set[str]]] = {}
+    
+    async def enrich(doc_id: str) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        document = documents_by_id[doc_id]
+        async with semaphore:
+            content_hash = document.get("content_hash")
+            if content_hash:
+                fingerprints, stages = plan_stages(content_hash, document, force)
+                if not stages:
+                    plans[doc_id] = (content_hash, fingerprints, stages)
+                    return {}, {}, set()
+            
+            # Some stage is stale, so the full text is needed
+            content = await load_document_content(document)
+            if not content:
+                raise ValueError(f"No content found for document {doc_id}")
+            content_hash = await text_store.put(content, previous_hash=document.get("content_hash"))
+            if content_hash != document.get("content_hash"):
+                await llm_client.update_keyword_stats(content)
+            fingerprints, stages = plan_stages(content_hash, document, force)
+            contents[doc_id] = content
+            plans[doc_id] = (content_hash, fingerprints, stages)
+            return await _run_llm_stages(content, stages)
+    
+    # Run LLM enrichment concurrently, capturing errors per document and stage
+    candidate_ids = [doc_id for doc_id in doc_ids if doc_id in documents_by_id]
+    enrichments = await asyncio.gather(*(enrich(doc_id) for doc_id in candidate_ids), return_exceptions=True)
+    
+    pending_ids, unprepared_ids = [], []
+    outputs: Dict[str, Dict[str, Any]] = {}
+    errors: Dict[str, Dict[str, str]] = {}
+    deferred: Dict[str, Set[str]] = {}
+    for doc_id, enrichment in zip(candidate_ids, enrichments):
+        if doc_id not in plans:
+            # Failed before any stage could run
+            logger.error(f"Error preparing document {doc_id} in batch: {enrichment}")
+            results[doc_id] = {"status": "error", "document_id": doc_id, "error": str(enrichment)}
+            unprepared_ids.append(doc_id)
+            continue
+        pending_ids.append(doc_id)
+        if isinstance(enrichment, Exception):
+            outputs[doc_id], errors[doc_id], deferred[doc_id] = {}, {"enrichment": str(enrichment)}, set()
+        else:
+            outputs[doc_id], errors[doc_id], deferred[doc_id] = enrichment
+    
+    def build_metadata(doc_id: str) -> Dict[str, Any]:
+        document = documents_by_id[doc_id]
+        return {
+            "doc_id": doc_id,
+            "user_id": document.get("user_id"),
+            "title": document.get("title"),
+            "summary": outputs[doc_id].get("summary", document.get("summary")),
+            "tags": outputs[doc_id].get("tags", document.get("tags") or []),
+            "cluster_id": document.get("cluster_id") or doc_id
+        }
+    
+    # Generate embeddings for every document with a stale embedding stage in one call
+    embedding_ids = [doc_id for doc_id in pending_ids if "embedding" in plans[doc_id][2]]
+    embeddings = []
+    if embedding_ids:
+        try:
+            embeddings = await llm_client.get_embeddings([contents[doc_id] for doc_id in embedding_ids])
+        except Exception as e:
+            logger.error(f"Error generating embeddings for batch: {e}")
+            for doc_id in embedding_ids:
+                errors[doc_id]["embedding"] = str(e)
+            embedding_ids = []
+    
+    # Store vectors in Qdrant in batches
+    previous_vectors = await qdrant.get_vectors(embedding_ids)
+    embedded_ids = set()
+    batch_size = settings.QDRANT_UPSERT_BATCH_SIZE
+    for start in range(0, len(embedding_ids), batch_size):
+        batch_ids = embedding_ids[start:start + batch_size]
+        metadata = [build_metadata(doc_id) for doc_id in batch_ids]
+        if await qdrant.store_vectors(embeddings[start:start + batch_size], metadata, ids=batch_ids):
+            embedded_ids.update(batch_ids)
+        else:
+            for doc_id in batch_ids:
+                errors[doc_id]["embedding"] = "Failed to store vector"
+    
+    # Apply the new vectors to the user centroids, one update per user
+    added, removed = defaultdict(list), defaultdict(list)
+    for i, doc_id in enumerate(embedding_ids):
+        if doc_id in embedded_ids:
+            user_id = documents_by_id[doc_id].get("user_id")
+            added[user_id].append(embeddings[i])
+            if doc_id in previous_vectors:
+                removed[user_id].append(previous_vectors[doc_id])
+    for user_id in added:
+        await user_centroids.update(user_id, added=added[user_id], removed=removed[user_id])
+    
+    # Documents whose vector is current only need their payload refreshed
+    for doc_id in pending_ids:
+        merged = documents_by_id[doc_id].get("duplicate_status") == "merged"
+        if "embedding" not in plans[doc_id][2] and outputs[doc_id] and not merged:
+            await qdrant.set_payload(doc_id, build_metadata(doc_id))
+    
+    # Write successes and failures to MongoDB in a single round trip
+    now = datetime.utcnow()
+    operations = []
+    for doc_id in pending_ids:
+        content_hash, fingerprints, _ = plans[doc_id]
+        completed = completed_stages(outputs[doc_id], errors[doc_id], deferred[doc_id])
+        if doc_id in embedded_ids:
+            completed.add("embedding")
+        error = _format_stage_errors(errors[doc_id])
+        operations.append(UpdateOne(
+            {"id": doc_id},
+            {"$set": {
+                **outputs[doc_id],
+                "content_hash": content_hash,
+                "processing_status": "failed" if error else "completed",
+                "processing_error": error,
+                "last_processed": now,
+                **fingerprint_updates(fingerprints, completed)
+            }}
+        ))
+        if error:
+            results[doc_id] = {"status": "error", "document_id": doc_id, "stages": sorted(completed), "error": error}
+        else:
+            results[doc_id] = {"status": "success", "document_id": doc_id, "stages": sorted(completed)}
+    for doc_id in unprepared_ids:
+        operations.append(UpdateOne(
+            {"id": doc_id},
+            {"$set": {"processing_status": "failed", "processing_error": results[doc_id]["error"]}}
+        ))
+    
+    if operations:
+        try:
+            await documents_collection.bulk_write(operations, ordered=False)
+            await document_cache.invalidate(*pending_ids, *unprepared_ids)
+        except Exception as e:
+            logger.error(f"Error writing batch results to MongoDB: {e}")
+            for doc_id in pending_ids:
+                results[doc_id] = {"status": "error", "document_id": doc_id, "error": str(e)}
+            return [results[doc_id] for doc_id in doc_ids]
+    
+    # Drop the previous text of documents whose content changed, if nothing else references it
+    for doc_id in pending_ids:
+        previous_hash = documents_by_id[doc_id].get("content_hash")
+        if previous_hash and previous_hash != plans[doc_id][0]:
+            try:
+                await text_store.release(previous_hash)
+            except Exception as e:
+                logger.error(f"Error releasing previous text of document {doc_id}: {e}")
+    
+    return [results[doc_id] for doc_id in doc_ids]
+
 @celery_app.task(name="batch_process_documents")
-async def batch_process_documents(doc_ids: List[str]) -> Dict[str, Any]:
+async def batch_process_documents(
+    doc_ids: List[str],
+    concurrency: Optional[int] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    force: bool = False
+) -> Dict[str, Any]:
     """
-    Process multiple documents in batch
+    Process multiple documents in batch.
+    LLM enrichment runs concurrently (bounded by `concurrency`), while embeddings
+    and database writes are batched per chunk of BATCH_PROCESSING_CHUNK_SIZE documents.
+    Only stale stages are recomputed unless `force` is set.
     """
+    semaphore = asyncio.Semaphore(concurrency or settings.BATCH_PROCESSING_CONCURRENCY)
+    chunk_size = settings.BATCH_PROCESSING_CHUNK_SIZE
+    total = len(doc_ids)
     results = []
-    for doc_id in doc_ids:
+    
+    for start in range(0, total, chunk_size):
+        chunk_ids = doc_ids[start:start + chunk_size]
         try:
-            result = await reprocess_document(doc_id)
-            results.append(result)
+            results.extend(await _process_document_chunk(chunk_ids, semaphore, force))
         except Exception as e:
-            logger.error(f"Error processing document {doc_id} in batch: {e}")
-            results.append({"status": "error", "document_id": doc_id, "error": str(e)})
+            logger.error(f"Error processing batch chunk starting at {start}: {e}")
+            results.extend(
+                {"status": "error", "document_id": doc_id, "error": str(e)} for doc_id in chunk_ids
+            )
+        
+        # Report progress after each chunk
+        processed = len(results)
+        logger.info(f"Batch progress: {processed}/{total} documents processed")
+        if progress_callback:
+            try:
+                progress_callback(processed, total)
+            except Exception as e:
+                logger.error(f"Batch progress callback failed: {e}")
     
-    return {"status": "completed", "results": results}
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    return {
+        "status": "completed",
+        "total": total,
+        "succeeded": succeeded,
+        "failed": total - succeeded,
+        "results": results
+    }
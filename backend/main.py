@@ -2,6 +2,8 @@ from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi_csrf_protect import CsrfProtect
+from pymongo.errors import ExecutionTimeout
+from app.core.passwords import HasherOverloaded
 import logging
 import time
 import os
@@ -20,6 +22,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization", "X-CSRF-Token"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Configure logging
@@ -58,11 +61,37 @@ async def log_requests(request: Request, call_next):
             content={"detail": "Internal server error"}
         )
 
+# Queries bounded by MONGODB_MAX_TIME_MS fail fast instead of piling up
+@app.exception_handler(ExecutionTimeout)
+async def query_timeout_handler(request: Request, exc: ExecutionTimeout):
+    logger.error(f"Database query timed out: {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database query timed out"}
+    )
+
+# Logins and registrations shed load once the password hashing queue is full
+@app.exception_handler(HasherOverloaded)
+async def password_hasher_overloaded_handler(request: Request, exc: HasherOverloaded):
+    logger.warning(f"Password hashing queue full: {request.method} {request.url.path}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, please retry"},
+        headers={"Retry-After": "1"}
+    )
+
 # Import and include routers
-from app.api.routes import upload, search, document, user, auth, mfa
+from app.api.routes import upload, search, document, user, auth, mfa, metrics
 from app.core.limiter import setup_limiter
 from app.db.mongo import connect_to_mongo, close_mongo_connection, create_indexes
+from app.db.qdrant import qdrant
+from app.db.redis import redis_db
+from app.core.counters import citation_counter
+from app.core.document_cache import document_cache
+from app.core.auth import refresh_token_store
 from app.core.csrf import get_csrf_config  # Import CSRF config
+from app.core.config import settings
+from app.core.llm_client import llm_client
 
 app.include_router(auth.router, prefix="/api/v1", tags=["auth"])
 app.include_router(mfa.router, prefix="/api/v1", tags=["mfa"])
@@ -70,6 +99,11 @@ app.include_router(upload.router, prefix="/api/v1", tags=["upload"])
 app.include_router(search.router, prefix="/api/v1", tags=["search"])
 app.include_router(document.router, prefix="/api/v1", tags=["document"])
 app.include_router(user.router, prefix="/api/v1", tags=["user"])
+app.include_router(metrics.router, prefix="/api/v1", tags=["metrics"])
+
+# Load the embedding model once in the master process (run gunicorn with --preload)
+if settings.EMBEDDING_HOSTING == "preload":
+    llm_client.preload_embedding_model()
 
 # Startup and shutdown events
 @app.on_event("startup")
@@ -80,6 +114,14 @@ async def startup_event():
     await connect_to_mongo()
     logger.info("Connected to MongoDB")
     
+    # Connect to Qdrant and create the collections
+    try:
+        qdrant.connect_to_qdrant()
+        await qdrant.create_collection_if_not_exists()
+        logger.info("Connected to Qdrant")
+    except Exception as e:
+        logger.error(f"Failed to connect to Qdrant: {e}")
+    
     # Create indexes
     try:
         await create_indexes()
@@ -87,6 +129,20 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to create MongoDB indexes: {e}")
     
+    # Connect to Redis for shared counters, the shared document cache and refresh tokens
+    if "redis" in (settings.COUNTER_BACKEND, settings.DOCUMENT_CACHE_BACKEND, settings.REFRESH_TOKEN_STORE):
+        try:
+            await redis_db.connect_to_redis()
+        except Exception:
+            logger.warning("Redis is unavailable, counters are kept per process.")
+            if settings.DOCUMENT_CACHE_BACKEND == "redis":
+                logger.warning("Documents will not be cached.")
+            if settings.REFRESH_TOKEN_STORE == "redis":
+                logger.warning("Token refreshes will fail until Redis is back.")
+    citation_counter.start()
+    document_cache.start()
+    refresh_token_store.start()
+    
     # Initialize rate limiter
     limiter_initialized = await setup_limiter()
     if limiter_initialized:
@@ -106,6 +162,12 @@ async def startup_event():
 async def shutdown_event():
     logger.info("Shutting down BlueWhale API...")
     
+    # Flush buffered counters before the connections close
+    await citation_counter.stop()
+    await document_cache.stop()
+    await refresh_token_store.stop()
+    await redis_db.close_redis_connection()
+    
     # Close MongoDB connection
     await close_mongo_connection()
     logger.info("MongoDB connection closed")
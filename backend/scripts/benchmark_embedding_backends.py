@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark embedding backends against the sentence-transformers baseline.
+
+Reports throughput and peak memory for each backend, and accuracy as the
+cosine similarity to the baseline vectors and the overlap of nearest neighbours.
+
+Usage:
+    python scripts/benchmark_embedding_backends.py [--texts FILE] [--count N]
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+import random
+import resource
+
+import numpy as np
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.embedding_backends import SentenceTransformerBackend, OnnxBackend
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "whale ocean document search vector embedding model summary tag user knowledge system "
+    "database query index cluster memory network storage latency throughput quantization "
+    "research paper report meeting notes project budget design review release customer"
+).split()
+
+def load_texts(path, count):
+    """Load one text per line from a file, or generate texts of mixed lengths."""
+    if path:
+        with open(path, encoding="utf-8") as texts_file:
+            texts = [line.strip() for line in texts_file if line.strip()]
+        return texts[:count]
+    
+    rng = random.Random(42)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(5, 200))) for _ in range(count)]
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_backend(name, backend, texts):
+    """Embed texts with a backend and report its throughput."""
+    backend.encode(texts[:8])  # Warm up
+    start = time.perf_counter()
+    vectors = backend.encode(texts)
+    elapsed = time.perf_counter() - start
+    logger.info(f"{name}: {len(texts) / elapsed:.1f} texts/s ({elapsed:.2f}s), peak RSS {peak_rss_mb():.0f} MB")
+    return vectors, elapsed
+
+def normalize(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def neighbour_overlap(reference, candidate, k=10):
+    """Mean overlap of the top-k neighbours of every vector."""
+    k = min(k, len(reference) - 1)
+    ref_neighbours = np.argsort(-(reference @ reference.T), axis=1)[:, 1:k + 1]
+    cand_neighbours = np.argsort(-(candidate @ candidate.T), axis=1)[:, 1:k + 1]
+    overlaps = [len(set(a) & set(b)) / k for a, b in zip(ref_neighbours, cand_neighbours)]
+    return float(np.mean(overlaps))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", help="File with one text per line (default: generated texts)")
+    parser.add_argument("--count", type=int, default=1000, help="Number of texts to embed")
+    parser.add_argument("--model", default=settings.DEFAULT_EMBEDDING_MODEL)
+    args = parser.parse_args()
+    
+    texts = load_texts(args.texts, args.count)
+    logger.info(f"Embedding {len(texts)} texts with {args.model}")
+    
+    # Each backend is measured in turn, so peak RSS is cumulative
+    baseline = SentenceTransformerBackend(
+        args.model,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        max_batch_tokens=settings.EMBEDDING_MAX_BATCH_TOKENS
+    )
+    reference, baseline_time = run_backend("sentence-transformers", baseline, texts)
+    reference = normalize(reference)
+    del baseline
+    
+    results = []
+    for quantize in (False, True):
+        name = "onnx-int8" if quantize else "onnx"
+        backend = OnnxBackend(
+            args.model,
+            cache_dir=settings.EMBEDDING_CACHE_DIR,
+            quantize=quantize,
+            max_seq_length=settings.EMBEDDING_MAX_SEQ_LENGTH,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_batch_tokens=settings.EMBEDDING_MAX_BATCH_TOKENS
+        )
+        vectors, elapsed = run_backend(name, backend, texts)
+        vectors = normalize(vectors)
+        cosine = np.sum(reference * vectors, axis=1)
+        results.append((name, baseline_time / elapsed, float(cosine.mean()), float(cosine.min()),
+                        neighbour_overlap(reference, vectors)))
+        del backend
+    
+    print()
+    print(f"{'backend':<12} {'speedup':>8} {'mean cos':>9} {'min cos':>8} {'top-10 overlap':>15}")
+    print(f"{'baseline':<12} {1.0:>8.2f} {1.0:>9.4f} {1.0:>8.4f} {1.0:>15.3f}")
+    for name, speedup, mean_cos, min_cos, overlap in results:
+        print(f"{name:<12} {speedup:>8.2f} {mean_cos:>9.4f} {min_cos:>8.4f} {overlap:>15.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark length-bucketed embedding batches against fixed-size batches.
+
+Reports the padding efficiency (share of padded positions holding real tokens)
+and the throughput of the configured embedding backend for:
+  - fixed-size batches in input order (the previous behaviour)
+  - length-bucketed batches under EMBEDDING_MAX_BATCH_TOKENS
+
+Usage:
+    python scripts/benchmark_length_bucketing.py [--texts FILE] [--count N] [--batch-size N]
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+import random
+
+import numpy as np
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.embedding_backends import create_embedding_backend, plan_length_batches, padding_efficiency
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+WORDS = (
+    "whale ocean document search vector embedding model summary tag user knowledge system "
+    "database query index cluster memory network storage latency throughput quantization"
+).split()
+
+def load_texts(path, count):
+    """Load one text per line from a file, or generate a mix of short and very long texts."""
+    if path:
+        with open(path, encoding="utf-8") as texts_file:
+            texts = [line.strip() for line in texts_file if line.strip()]
+        return texts[:count]
+    
+    rng = random.Random(42)
+    # Mostly short texts (titles, queries) with a tail of long documents
+    return [
+        " ".join(rng.choices(WORDS, k=rng.randint(3, 20) if rng.random() < 0.8 else rng.randint(150, 400)))
+        for _ in range(count)
+    ]
+
+def time_batches(backend, texts, batches):
+    """Embed texts batch by batch and return the elapsed time."""
+    start = time.perf_counter()
+    for batch in batches:
+        backend._encode_batch([texts[i] for i in batch])
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", help="File with one text per line (default: generated texts)")
+    parser.add_argument("--count", type=int, default=2000, help="Number of texts to embed")
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch size of the fixed-size baseline")
+    args = parser.parse_args()
+    
+    texts = load_texts(args.texts, args.count)
+    backend = create_embedding_backend(settings.EMBEDDING_BACKEND)
+    lengths = backend.token_lengths(texts)
+    logger.info(f"Embedding {len(texts)} texts with {backend.model_name} ({backend.name}), "
+                f"mean length {lengths.mean():.0f} tokens, max {lengths.max()}")
+    
+    indices = np.arange(len(texts))
+    fixed = [indices[start:start + args.batch_size] for start in range(0, len(texts), args.batch_size)]
+    bucketed = plan_length_batches(lengths, backend.max_batch_tokens, backend.batch_size)
+    
+    backend._encode_batch(texts[:8])  # Warm up
+    results = []
+    for name, batches in (("fixed", fixed), ("bucketed", bucketed)):
+        elapsed = time_batches(backend, texts, batches)
+        results.append((name, len(batches), padding_efficiency(lengths, batches), len(texts) / elapsed))
+    
+    print()
+    print(f"{'batching':<10} {'batches':>8} {'padding eff.':>13} {'texts/s':>9}")
+    for name, count, efficiency, throughput in results:
+        print(f"{name:<10} {count:>8} {efficiency:>13.1%} {throughput:>9.1f}")
+    print(f"\nSpeedup: {results[1][3] / results[0][3]:.2f}x")
+
+if __name__ == "__main__":
+    main()
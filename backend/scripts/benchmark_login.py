@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark the login service against the configured MongoDB.
+
+Creates a throwaway user, runs logins with the given concurrency through
+app.core.login and reports throughput, latency percentiles and the number of
+MongoDB commands (round trips) per login. Password verification dominates the
+latency; lower BCRYPT_ROUNDS to measure the database path on its own.
+
+Usage:
+    python scripts/benchmark_login.py [--count N] [--concurrency N]
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import logging
+import threading
+from collections import Counter
+
+import numpy as np
+from pymongo import monitoring
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.auth import get_password_hash, password_hasher
+from app.core.login import login
+from app.db.mongo import mongodb
+from app.models.user import UserInDB
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the MongoDB commands sent, by command name."""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands = Counter()
+    
+    def started(self, event):
+        with self.lock:
+            self.commands[event.command_name] += 1
+    
+    def succeeded(self, event):
+        pass
+    
+    def failed(self, event):
+        pass
+
+async def benchmark(count, concurrency):
+    counter = CommandCounter()
+    monitoring.register(counter)
+    await mongodb.connect_to_mongo()
+    users_collection = mongodb.get_collection("users")
+    
+    password = uuid.uuid4().hex
+    user = UserInDB(username=f"benchmark-login-{uuid.uuid4().hex[:8]}", hashed_password=await get_password_hash(password))
+    await users_collection.insert_one(user.dict())
+    
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def timed_login():
+        async with semaphore:
+            start = time.perf_counter()
+            await login(user.username, password, user_agent="benchmark_login", ip_address="127.0.0.1")
+            latencies.append(time.perf_counter() - start)
+    
+    try:
+        counter.commands.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(timed_login() for _ in range(count)))
+        elapsed = time.perf_counter() - start
+        commands = dict(counter.commands)
+    finally:
+        await mongodb.get_collection("refresh_tokens").delete_many({"user_id": user.id})
+        await users_collection.delete_one({"id": user.id})
+        await mongodb.close_mongo_connection()
+    
+    latencies_ms = np.array(latencies) * 1000
+    logger.info(f"{count} logins with concurrency {concurrency} in {elapsed:.2f}s: {count / elapsed:.1f} logins/s")
+    logger.info(
+        f"Latency p50 {np.percentile(latencies_ms, 50):.1f} ms, p95 {np.percentile(latencies_ms, 95):.1f} ms, "
+        f"max {latencies_ms.max():.1f} ms"
+    )
+    logger.info(f"MongoDB commands per login: {sum(commands.values()) / count:.2f} {commands}")
+    logger.info(f"Password hashing: {password_hasher.get_metrics()}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="Number of logins")
+    parser.add_argument("--concurrency", type=int, default=20, help="Logins in flight at once")
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.count, args.concurrency))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Explain the application's MongoDB query shapes and flag collection scans.
+
+Runs explain() for every query shape in app/db/indexes.py against the configured
+database and reports the winning plan of each: the indexes it uses, collection
+scans (COLLSCAN) and in-memory sorts (SORT). Exits with status 1 if any query
+shape scans a collection, so it can gate deployments.
+
+Usage:
+    python scripts/index_advisor.py [--reconcile]
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+import logging
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.mongo import mongodb
+from app.db.indexes import QUERY_SHAPES, find_plan_stages, reconcile_indexes
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def explain(db, shape):
+    """Explain a query shape and return the stages of its winning plan."""
+    command = {"find": shape["collection"], "filter": shape["filter"]}
+    if shape.get("sort"):
+        command["sort"] = dict(shape["sort"])
+    result = await db.command({"explain": command, "verbosity": "queryPlanner"})
+    return find_plan_stages(result["queryPlanner"]["winningPlan"])
+
+async def advise(reconcile):
+    await mongodb.connect_to_mongo()
+    db = mongodb.get_db()
+    if reconcile:
+        await reconcile_indexes(db)
+    
+    scans = 0
+    for shape in QUERY_SHAPES:
+        stages = await explain(db, shape)
+        indexes = sorted({index for _, index in stages if index})
+        names = {stage for stage, _ in stages}
+        
+        if "COLLSCAN" in names:
+            verdict = "COLLSCAN"
+            scans += 1
+        elif "SORT" in names:
+            verdict = "in-memory sort"
+        else:
+            verdict = "ok"
+        sort = f" sort {json.dumps(dict(shape['sort']))}" if shape.get("sort") else ""
+        print(f"{verdict:<15} {shape['collection']}.find({json.dumps(shape['filter'])}){sort}"
+              f" -> {', '.join(indexes) or 'no index'}")
+    
+    await mongodb.close_mongo_connection()
+    print(f"\n{scans} of {len(QUERY_SHAPES)} query shapes scan a collection")
+    return scans
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reconcile", action="store_true", help="Reconcile the indexes with the registry first")
+    args = parser.parse_args()
+    scans = asyncio.run(advise(args.reconcile))
+    sys.exit(1 if scans else 0)
+
+if __name__ == "__main__":
+    main()
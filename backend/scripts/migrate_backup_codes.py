@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Report or retire MFA backup codes stored as legacy bcrypt hashes.
+
+New backup codes are stored as HMAC-SHA256 digests (app/core/backup_codes.py).
+Older codes are bcrypt hashes, which can't be converted without the plain codes;
+they keep working through a slower legacy path until used or regenerated. This
+script lists the users still holding legacy codes, and with --drop-legacy
+removes those codes so the user has to regenerate them (which requires a TOTP
+code) the next time they need one.
+
+Usage:
+    python scripts/migrate_backup_codes.py [--drop-legacy]
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import logging
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.mongo import mongodb
+from app.core.backup_codes import DIGEST_PREFIX, legacy_hashes
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def migrate(drop_legacy):
+    await mongodb.connect_to_mongo()
+    users_collection = mongodb.get_collection("users")
+    
+    # Users with at least one stored code that isn't a digest
+    query = {"mfa_backup_codes": {"$elemMatch": {"$not": {"$regex": f"^{DIGEST_PREFIX.replace('$', '[$]')}"}}}}
+    users = 0
+    codes = 0
+    async for user in users_collection.find(query, {"id": 1, "username": 1, "mfa_backup_codes": 1}):
+        legacy = legacy_hashes(user["mfa_backup_codes"])
+        users += 1
+        codes += len(legacy)
+        logger.info(f"{user.get('username')} ({user['id']}): {len(legacy)} legacy backup codes")
+        if drop_legacy:
+            await users_collection.update_one({"id": user["id"]}, {"$pull": {"mfa_backup_codes": {"$in": legacy}}})
+    
+    action = "Removed" if drop_legacy else "Found"
+    logger.info(f"{action} {codes} legacy backup codes of {users} users")
+    await mongodb.close_mongo_connection()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drop-legacy", action="store_true", help="Remove legacy bcrypt-hashed backup codes")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.drop_legacy))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Rebuild the user centroid collection from the stored document vectors.
+
+Centroids are maintained incrementally as documents are embedded and deleted;
+run this once to backfill users whose documents predate the centroid collection,
+or to correct drift after partial failures.
+
+Usage:
+    python scripts/rebuild_user_centroids.py [--page-size N]
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import logging
+from collections import defaultdict
+
+import numpy as np
+
+# Add the parent directory to the path so we can import from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.qdrant import qdrant
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def rebuild(page_size):
+    qdrant.connect_to_qdrant()
+    await qdrant.create_collection_if_not_exists()
+    
+    # Sum vectors per user in float64 while scrolling through the documents
+    totals = {}
+    counts = defaultdict(int)
+    offset = None
+    while True:
+        points, offset = qdrant.client.scroll(
+            collection_name=qdrant.collection_name,
+            limit=page_size,
+            offset=offset,
+            with_payload=["user_id"],
+            with_vectors=True
+        )
+        for point in points:
+            user_id = (point.payload or {}).get("user_id")
+            if not user_id:
+                continue
+            vector = np.asarray(point.vector, dtype=np.float64)
+            totals[user_id] = totals[user_id] + vector if user_id in totals else vector
+            counts[user_id] += 1
+        if offset is None:
+            break
+    
+    for user_id, total in totals.items():
+        await qdrant.store_user_centroid(user_id, (total / counts[user_id]).astype(np.float32), counts[user_id])
+    logger.info(f"Rebuilt centroids for {len(totals)} users from {sum(counts.values())} documents")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=256, help="Points fetched per scroll request")
+    args = parser.parse_args()
+    asyncio.run(rebuild(args.page_size))
+
+if __name__ == "__main__":
+    main()
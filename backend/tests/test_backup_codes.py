@@ -0,0 +1,30 @@
+from app.core.backup_codes import (
+    DIGEST_PREFIX, backup_code_digest, derive_key, is_legacy_hash, legacy_hashes, normalize_backup_code
+)
+
+def test_digest_ignores_formatting():
+    """Test that case, spaces and dashes don't change a code's digest"""
+    assert normalize_backup_code(" ab12-cd34 ") == "AB12CD34"
+    assert backup_code_digest("AB12-CD34", "key") == backup_code_digest("ab12 cd34", "key")
+    assert backup_code_digest("AB12-CD34", "key").startswith(DIGEST_PREFIX)
+
+def test_digest_depends_on_code_and_key():
+    """Test that the digest is keyed and distinguishes codes"""
+    digest = backup_code_digest("AB12-CD34", "key")
+    assert digest != backup_code_digest("AB12-CD35", "key")
+    assert digest != backup_code_digest("AB12-CD34", "other-key")
+
+def test_legacy_hashes_are_detected():
+    """Test that bcrypt hashes are told apart from digests"""
+    bcrypt_hash = "$2b$12$" + "a" * 53
+    digest = backup_code_digest("AB12-CD34", "key")
+    assert is_legacy_hash(bcrypt_hash)
+    assert not is_legacy_hash(digest)
+    assert legacy_hashes([digest, bcrypt_hash]) == [bcrypt_hash]
+
+def test_derived_key_is_hkdf():
+    """Test that keys are derived with HKDF-SHA256 and differ per label and from the secret"""
+    # RFC 5869 test case 3 (no salt, no info), first 32 bytes
+    assert derive_key("\x0b" * 22, "") == "8da4e775a563c18f715f802a063c5a31b8a11f5c5ee1879ec3454e5f3c738d2d"
+    key = derive_key("jwt-secret", "backup-codes")
+    assert key != derive_key("jwt-secret", "other") and key != "jwt-secret"
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from app.core.batch_enrichment import (
+    OpenAIBatchProvider, BATCH_COMPLETED, build_batch_requests, write_batch_requests, parse_batch_results
+)
+
+class StubBatchHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for the OpenAI Files and Batches API"""
+    files = {}
+    batches = {}
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        if self.path == "/files":
+            lines = [line for line in body.splitlines() if line.startswith('{"custom_id"')]
+            file_id = f"file-{len(self.files)}"
+            self.files[file_id] = lines
+            self._send_json({"id": file_id})
+        elif self.path == "/batches":
+            request = json.loads(body)
+            batch_id = f"batch-{len(self.batches)}"
+            self.batches[batch_id] = request["input_file_id"]
+            self._send_json({"id": batch_id, "status": "validating"})
+    
+    def do_GET(self):
+        if self.path.startswith("/batches/"):
+            batch_id = self.path.split("/")[-1]
+            self._send_json({"id": batch_id, "status": "completed", "output_file_id": f"out-{batch_id}"})
+        elif self.path.startswith("/files/out-"):
+            batch_id = self.path.split("/")[2][len("out-"):]
+            output = []
+            for line in self.files[self.batches[batch_id]]:
+                request = json.loads(line)
+                content = "alpha, beta" if request["custom_id"].endswith(":tags") else "A short summary."
+                output.append(json.dumps({
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}},
+                    "error": None
+                }))
+            body = "\n".join(output).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+@pytest.fixture
+def stub_server():
+    server = HTTPServer(("127.0.0.1", 0), StubBatchHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+def test_build_batch_requests():
+    """Test that one request is built per document stage"""
+    requests = build_batch_requests([("doc-1", "Some text", ["summary", "tags"]), ("doc-2", "Other", ["tags"])], "test-model")
+    assert [request["custom_id"] for request in requests] == ["doc-1:summary", "doc-1:tags", "doc-2:tags"]
+    assert all(request["body"]["model"] == "test-model" for request in requests)
+
+def test_parse_batch_results_captures_errors():
+    """Test that failed lines become per-stage errors"""
+    results = parse_batch_results([
+        {"custom_id": "doc-1:summary", "response": {"status_code": 200, "body": {"choices": [{"message": {"content": " Summary "}}]}}},
+        {"custom_id": "doc-1:tags", "response": {"status_code": 429, "body": {"error": {"message": "Rate limited"}}}},
+        {"custom_id": "garbage"}
+    ])
+    outputs, errors = results["doc-1"]
+    assert outputs == {"summary": "Summary"}
+    assert errors == {"tags": "Rate limited"}
+
+def test_openai_batch_provider_round_trip(stub_server, tmp_path):
+    """Test submitting, polling and fetching a batch against a local stub server"""
+    provider = OpenAIBatchProvider(api_key="test", base_url=stub_server, model="test-model")
+    requests = build_batch_requests([("doc-1", "Some text", ["summary", "tags"])], provider.model)
+    path = write_batch_requests(requests, str(tmp_path))
+    
+    async def run():
+        batch_id = await provider.submit(path)
+        status = await provider.get_status(batch_id)
+        assert status["status"] == BATCH_COMPLETED
+        return await provider.fetch_results(batch_id, status)
+    
+    outputs, errors = parse_batch_results(asyncio.run(run()))["doc-1"]
+    assert outputs == {"summary": "A short summary.", "tags": ["alpha", "beta"]}
+    assert errors == {}
@@ -0,0 +1,150 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("qdrant_client")
+pytest.importorskip("celery")
+
+from app.tasks import document_processing
+from app.tasks.document_processing import batch_process_documents
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+    
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = {document["id"]: document for document in documents}
+        self.finds = []
+        self.batches = []
+    
+    def find(self, query, *args, **kwargs):
+        ids = query["id"]["$in"]
+        self.finds.append(ids)
+        return FakeCursor([self.documents[doc_id] for doc_id in ids if doc_id in self.documents])
+    
+    async def bulk_write(self, operations, ordered=True):
+        self.batches.append(operations)
+
+class FakeMongo:
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def get_collection(self, name, **kwargs):
+        return self.collection
+
+class FakeQdrant:
+    def __init__(self):
+        self.stored = []
+    
+    async def get_vectors(self, ids):
+        return {}
+    
+    async def store_vectors(self, vectors, metadata, ids=None):
+        self.stored.extend(ids)
+        return True
+    
+    async def set_payload(self, id, metadata):
+        return True
+
+class FakeTextStore:
+    def __init__(self):
+        self.released = []
+    
+    async def put(self, content, previous_hash=None):
+        return f"hash-{content}"
+    
+    async def release(self, content_hash):
+        self.released.append(content_hash)
+        return True
+
+class FakeCentroids:
+    async def update(self, user_id, added=(), removed=()):
+        pass
+
+class FakeDocumentCache:
+    async def invalidate(self, *doc_ids):
+        pass
+
+@pytest.fixture
+def batch_env(monkeypatch):
+    """Run the batch pipeline against in-memory stand-ins for MongoDB, Qdrant and the LLM."""
+    documents = [
+        {"id": "a", "user_id": "u1", "text": "alpha"},
+        {"id": "b", "user_id": "u1", "text": "beta", "content_hash": "hash-old"},
+        {"id": "c", "user_id": "u2", "text": ""},
+        {"id": "d", "user_id": "u2", "text": "llm-fail"},
+        {"id": "e", "user_id": "u2", "text": "epsilon"},
+    ]
+    collection = FakeCollection(documents)
+    text_store = FakeTextStore()
+    qdrant = FakeQdrant()
+    
+    async def load_document_content(document):
+        return document["text"]
+    
+    async def run_llm_stages(content, stages):
+        if content == "llm-fail":
+            raise RuntimeError("provider exploded")
+        return {"summary": f"summary of {content}", "tags": ["tag"]}, {}, set()
+    
+    async def get_embeddings(texts):
+        return [np.full(4, len(text), dtype=np.float32) for text in texts]
+    
+    async def update_keyword_stats(text):
+        pass
+    
+    monkeypatch.setattr(document_processing, "mongodb", FakeMongo(collection))
+    monkeypatch.setattr(document_processing, "qdrant", qdrant)
+    monkeypatch.setattr(document_processing, "text_store", text_store)
+    monkeypatch.setattr(document_processing, "user_centroids", FakeCentroids())
+    monkeypatch.setattr(document_processing, "document_cache", FakeDocumentCache())
+    monkeypatch.setattr(document_processing, "load_document_content", load_document_content)
+    monkeypatch.setattr(document_processing, "_run_llm_stages", run_llm_stages)
+    monkeypatch.setattr(document_processing.llm_client, "get_embeddings", get_embeddings)
+    monkeypatch.setattr(document_processing.llm_client, "update_keyword_stats", update_keyword_stats)
+    monkeypatch.setattr(document_processing.settings, "BATCH_PROCESSING_CHUNK_SIZE", 2)
+    return collection, text_store, qdrant
+
+def test_documents_are_processed_in_chunks_with_one_write_each(batch_env):
+    """Test that each chunk is fetched with one query and written with one bulk_write"""
+    collection, _, qdrant = batch_env
+    progress = []
+    
+    result = asyncio.run(batch_process_documents(
+        ["a", "b", "c", "d", "e"], progress_callback=lambda done, total: progress.append((done, total))
+    ))
+    
+    assert collection.finds == [["a", "b"], ["c", "d"], ["e"]]
+    assert [len(operations) for operations in collection.batches] == [2, 2, 1]
+    assert progress == [(2, 5), (4, 5), (5, 5)]
+    assert sorted(qdrant.stored) == ["a", "b", "d", "e"]
+    assert result["total"] == 5 and result["succeeded"] == 3
+
+def test_errors_are_captured_per_document(batch_env):
+    """Test that a failing document is reported without failing the rest of its chunk"""
+    collection, _, _ = batch_env
+    
+    result = asyncio.run(batch_process_documents(["c", "d", "missing", "e"]))
+    
+    by_id = {entry["document_id"]: entry for entry in result["results"]}
+    assert [entry["document_id"] for entry in result["results"]] == ["c", "d", "missing", "e"]
+    assert "No content found" in by_id["c"]["error"]
+    assert "provider exploded" in by_id["d"]["error"]
+    assert by_id["d"]["stages"] == ["embedding"]
+    assert "not found" in by_id["missing"]["error"]
+    assert by_id["e"]["status"] == "success"
+    assert {op._filter["id"]: op._doc["$set"]["processing_status"] for op in collection.batches[0]} == {
+        "c": "failed", "d": "failed"
+    }
+
+def test_replaced_text_is_released(batch_env):
+    """Test that the previous text of a document whose content hash changed is released"""
+    _, text_store, _ = batch_env
+    asyncio.run(batch_process_documents(["a", "b"]))
+    assert text_store.released == ["hash-old"]
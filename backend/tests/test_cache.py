@@ -0,0 +1,61 @@
+from app.core.cache import TTLCache, compute_etag, etag_matches
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def test_entries_expire_after_ttl():
+    """Test that cached values expire once their time to live has passed"""
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=300)
+    
+    clock.now = 59
+    assert cache.get("a") == 1
+    clock.now = 60
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.get_metrics() == {"size": 1, "hits": 2, "misses": 1}
+
+def test_least_recently_used_entry_is_evicted():
+    """Test that a full cache evicts the least recently used entry"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_delete_invalidates_entry():
+    """Test that deleting a key drops its cached value"""
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.delete("a")
+    cache.delete("missing")
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_etag_ignores_excluded_fields():
+    """Test that excluded fields don't change the entity tag but other fields do"""
+    body = {"id": "doc", "title": "Whales", "ai_citation_count": 1}
+    etag = compute_etag(body, exclude=["ai_citation_count"])
+    assert etag.startswith('W/"')
+    assert compute_etag({**body, "ai_citation_count": 99}, exclude=["ai_citation_count"]) == etag
+    assert compute_etag({**body, "title": "Dolphins"}, exclude=["ai_citation_count"]) != etag
+
+def test_etag_matches_if_none_match_header():
+    """Test weak comparison against single, listed and wildcard If-None-Match values"""
+    etag = 'W/"abc"'
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('"other", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("redis")
+
+from app.core import counters
+from app.core.counters import CounterBuffer
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+    
+    async def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.batches.append(operations)
+
+def test_increments_are_coalesced_into_one_bulk_write(monkeypatch):
+    """Test that repeated increments of a key become a single $inc per flush"""
+    collection = FakeCollection()
+    monkeypatch.setattr(counters.mongodb, "get_collection", lambda name: collection)
+    buffer = CounterBuffer("documents", "ai_citation_count")
+    for _ in range(1000):
+        buffer.increment("a")
+    buffer.increment("b", 2)
+    
+    assert asyncio.run(buffer.flush()) == 2
+    assert len(collection.batches) == 1
+    assert sorted(op._doc["$inc"]["ai_citation_count"] for op in collection.batches[0]) == [2, 1000]
+    assert asyncio.run(buffer.flush()) == 0
+
+def test_failed_flush_keeps_deltas(monkeypatch):
+    """Test that deltas survive a failed write and are flushed next time"""
+    collection = FakeCollection(fail=True)
+    monkeypatch.setattr(counters.mongodb, "get_collection", lambda name: collection)
+    buffer = CounterBuffer("documents", "ai_citation_count")
+    buffer.increment("a")
+    
+    assert asyncio.run(buffer.flush()) == 0
+    buffer.increment("a")
+    collection.fail = False
+    asyncio.run(buffer.flush())
+    assert collection.batches[0][0]._doc == {"$inc": {"ai_citation_count": 2}}
+    assert buffer.get_metrics()["failures"] == 1
+
+def test_deltas_netting_to_zero_skip_the_write(monkeypatch):
+    """Test that a flush with only zero deltas doesn't send an empty bulk_write"""
+    collection = FakeCollection()
+    monkeypatch.setattr(counters.mongodb, "get_collection", lambda name: collection)
+    buffer = CounterBuffer("documents", "ai_citation_count")
+    buffer.increment("a")
+    buffer.increment("a", -1)
+    
+    assert asyncio.run(buffer.flush()) == 0
+    assert collection.batches == []
@@ -0,0 +1,41 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.core.dedup import minhash_signature, lsh_band_keys, estimate_jaccard, collapse_clusters
+
+def _random_text(seed, words=800):
+    rng = random.Random(seed)
+    return " ".join(f"word{rng.randrange(5000)}" for _ in range(words))
+
+def test_near_duplicates_share_lsh_buckets():
+    """Test that a lightly edited copy is estimated as similar and shares LSH buckets"""
+    original = _random_text(0)
+    edited = original.replace(original.split()[100], "changed", 1) + " with a short appendix"
+    unrelated = _random_text(1)
+    
+    signature = minhash_signature(original)
+    assert estimate_jaccard(signature, minhash_signature(edited)) > 0.9
+    assert estimate_jaccard(signature, minhash_signature(unrelated)) < 0.1
+    assert set(lsh_band_keys(signature)) & set(lsh_band_keys(minhash_signature(edited)))
+    assert not set(lsh_band_keys(signature)) & set(lsh_band_keys(minhash_signature(unrelated)))
+
+def test_signature_is_deterministic_and_case_insensitive():
+    """Test that signatures are stable across calls and ignore case and punctuation"""
+    text = _random_text(2)
+    signature = minhash_signature(text)
+    assert signature.dtype == np.uint64
+    assert np.array_equal(signature, minhash_signature(text.upper().replace(" ", ", ")))
+    assert estimate_jaccard(signature, signature.tolist()) == 1.0
+
+def test_band_count_must_divide_signature():
+    """Test that a band count not dividing the signature length is rejected"""
+    with pytest.raises(ValueError):
+        lsh_band_keys(minhash_signature("some text", num_perm=128), bands=12)
+
+def test_collapse_keeps_best_result_per_cluster():
+    """Test that collapsing keeps ranking order and the first result of each cluster"""
+    results = [("a", "c1"), ("b", "c1"), ("c", "c2"), ("d", "c3"), ("e", "c2")]
+    collapsed = collapse_clusters(results, key=lambda result: result[1], limit=2)
+    assert collapsed == [("a", "c1"), ("c", "c2")]
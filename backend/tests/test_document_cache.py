@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("redis")
+pytest.importorskip("fastapi")
+
+from app.core import document_cache as document_cache_module
+from app.core.document_cache import DocumentCache
+
+class FakeRedis:
+    """Just enough of a Redis client for the document cache, with the set-if-version script inlined."""
+    
+    def __init__(self):
+        self.values = {}
+        self.published = []
+    
+    async def get(self, key):
+        value = self.values.get(key)
+        return value.encode() if value is not None else None
+    
+    async def eval(self, script, numkeys, key, version_key, version, value, ttl):
+        if self.values.get(version_key, "0") != version:
+            return 0
+        self.values[key] = value
+        return 1
+    
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+    
+    async def publish(self, channel, message):
+        self.published.append(message)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.operations = []
+    
+    def incr(self, key):
+        self.operations.append(lambda: self.redis.values.__setitem__(key, str(int(self.redis.values.get(key, "0")) + 1)))
+    
+    def expire(self, key, ttl):
+        pass
+    
+    def delete(self, *keys):
+        self.operations.append(lambda: [self.redis.values.pop(key, None) for key in keys])
+    
+    async def execute(self):
+        for operation in self.operations:
+            operation()
+
+class FakeRedisDB:
+    def __init__(self):
+        self.client = FakeRedis()
+    
+    def get_client(self):
+        return self.client
+
+def make_cache(monkeypatch, backend):
+    monkeypatch.setattr(document_cache_module.settings, "DOCUMENT_CACHE_BACKEND", backend)
+    redis_db = FakeRedisDB()
+    monkeypatch.setattr(document_cache_module, "redis_db", redis_db)
+    return DocumentCache(), redis_db.client
+
+DOCUMENT = {"id": "a", "title": "Alpha"}
+
+def test_read_racing_an_invalidation_is_not_cached(monkeypatch):
+    """Test that a document read before an invalidation is not put back into the cache"""
+    cache, _ = make_cache(monkeypatch, "memory")
+    
+    async def scenario():
+        generation = await cache.generation("a")
+        await cache.invalidate("a")
+        entry = await cache.set("a", DOCUMENT, generation)
+        assert entry["document"]["title"] == "Alpha"
+        assert await cache.get("a") is None
+        
+        await cache.set("a", DOCUMENT, await cache.generation("a"))
+        assert await cache.get("a") is not None
+    
+    asyncio.run(scenario())
+
+def test_redis_backend_caches_only_while_connected(monkeypatch):
+    """Test that the redis backend keeps nothing per process until invalidations are received"""
+    cache, _ = make_cache(monkeypatch, "redis")
+    
+    async def scenario():
+        await cache.set("a", DOCUMENT, await cache.generation("a"))
+        assert await cache.get("a") is None
+        
+        cache.use_redis = True
+        await cache.set("a", DOCUMENT, await cache.generation("a"))
+        assert await cache.get("a") is not None
+    
+    asyncio.run(scenario())
+
+def test_redis_write_is_skipped_after_an_invalidation_elsewhere(monkeypatch):
+    """Test that a read racing an invalidation by another process does not cache in Redis"""
+    cache, redis = make_cache(monkeypatch, "redis")
+    cache.use_redis = True
+    
+    async def scenario():
+        generation = await cache.generation("a")
+        # Another process bumps the version; its message has not arrived yet
+        redis.values["document-cache:version:a"] = "1"
+        await cache.set("a", DOCUMENT, generation)
+        assert "document-cache:a" not in redis.values
+        assert await cache.get("a") is None
+    
+    asyncio.run(scenario())
@@ -0,0 +1,55 @@
+import numpy as np
+
+from app.core.embedding_backends import BatchedEmbeddingBackend, plan_length_batches, padding_efficiency
+
+class WordCountBackend(BatchedEmbeddingBackend):
+    """Backend embedding a text as (word count, padded batch length) for inspecting batches."""
+    name = "word-count"
+    
+    def __init__(self, **kwargs):
+        super().__init__("test-model", **kwargs)
+        self.batches = []
+    
+    def token_lengths(self, texts):
+        return np.array([len(text.split()) for text in texts])
+    
+    def _encode_batch(self, texts):
+        self.batches.append(texts)
+        padded = max(len(text.split()) for text in texts)
+        return np.array([[len(text.split()), padded] for text in texts], dtype=np.float32)
+
+def test_batches_respect_token_budget_and_cover_every_input():
+    """Test that every input lands in exactly one batch within the padded token budget"""
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(1, 300, size=500)
+    batches = plan_length_batches(lengths, max_batch_tokens=2048, max_batch_size=64)
+    
+    assert sorted(np.concatenate(batches).tolist()) == list(range(500))
+    for batch in batches:
+        assert len(batch) <= 64
+        assert len(batch) * lengths[batch].max() <= 2048
+
+def test_bucketing_improves_padding_efficiency():
+    """Test that sorted batches waste less padding than fixed batches in input order"""
+    lengths = np.array([5, 400, 8, 350, 3, 300, 6, 10] * 20)
+    fixed = [np.arange(start, start + 8) for start in range(0, len(lengths), 8)]
+    bucketed = plan_length_batches(lengths, max_batch_tokens=4096, max_batch_size=128)
+    assert padding_efficiency(lengths, bucketed) > 0.85
+    assert padding_efficiency(lengths, fixed) < 0.5
+
+def test_oversized_input_gets_its_own_batch():
+    """Test that an input longer than the budget is still embedded"""
+    batches = plan_length_batches([5000, 10, 10], max_batch_tokens=1000, max_batch_size=32)
+    assert [batch.tolist() for batch in batches] == [[0], [1, 2]]
+
+def test_encode_restores_input_order():
+    """Test that vectors come back in input order after length-bucketed batching"""
+    backend = WordCountBackend(batch_size=2, max_batch_tokens=100)
+    texts = ["a b c", "a", "a b c d e", "a b", "a b c d"]
+    vectors = backend.encode(texts)
+    
+    assert vectors.dtype == np.float32
+    assert vectors[:, 0].tolist() == [3, 1, 5, 2, 4]
+    # Each batch pads only to the longest of similar-length inputs
+    assert [len(batch) for batch in backend.batches] == [2, 2, 1]
+    assert vectors[:, 1].tolist() == [3, 1, 5, 3, 5]
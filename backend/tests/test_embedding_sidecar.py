@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from app.core.embedding_backends import EmbeddingBackend
+from app.core.embedding_sidecar import EmbeddingSidecarServer, SidecarBackend
+
+class LengthBackend(EmbeddingBackend):
+    """Deterministic backend embedding a text as (length, word count)."""
+    name = "length"
+    
+    def encode(self, texts):
+        if "fail" in texts:
+            raise ValueError("cannot embed")
+        return np.array([[len(text), len(text.split())] for text in texts], dtype=np.float32)
+
+def _start_server(socket_path):
+    """Run a sidecar server on a background thread."""
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    
+    async def run():
+        server = await EmbeddingSidecarServer(LengthBackend("test-model"), socket_path).start()
+        started.set()
+        async with server:
+            await server.serve_forever()
+    
+    threading.Thread(target=loop.run_until_complete, args=(run(),), daemon=True).start()
+    started.wait(5)
+
+def test_sidecar_round_trip(tmp_path):
+    """Test that vectors come back from the sidecar as float32 arrays, over one connection"""
+    socket_path = str(tmp_path / "embeddings.sock")
+    _start_server(socket_path)
+    
+    client = SidecarBackend("test-model", socket_path)
+    vectors = client.encode(["one two", "three"])
+    assert vectors.dtype == np.float32
+    assert vectors.tolist() == [[7.0, 2.0], [5.0, 1.0]]
+    assert client.encode(["four five six"]).tolist() == [[13.0, 3.0]]
+    assert client.encode([]).shape == (0, 0)
+    client.close()
+
+def test_sidecar_reports_backend_errors(tmp_path):
+    """Test that backend errors are raised in the client and the connection stays usable"""
+    socket_path = str(tmp_path / "embeddings.sock")
+    _start_server(socket_path)
+    
+    client = SidecarBackend("test-model", socket_path)
+    with pytest.raises(RuntimeError, match="cannot embed"):
+        client.encode(["fail"])
+    assert client.encode(["ok"]).tolist() == [[2.0, 1.0]]
+    client.close()
@@ -0,0 +1,48 @@
+from app.db.indexes import IndexSpec, INDEXES, QUERY_SHAPES, diff_indexes, find_plan_stages
+
+def test_missing_indexes_are_created():
+    """Test that registry indexes absent from the collection are planned for creation"""
+    specs = [IndexSpec("documents", (("id", 1),), unique=True), IndexSpec("documents", (("user_id", 1), ("created_at", -1)))]
+    info = {"_id_": {"key": [("_id", 1)]}, "id_1": {"key": [("id", 1)], "unique": True}}
+    plan = diff_indexes(specs, info)
+    assert [spec.name for spec in plan["create"]] == ["user_id_1_created_at_-1"]
+    assert plan["drop"] == [] and plan["unknown"] == []
+
+def test_index_with_changed_options_is_rebuilt():
+    """Test that a plain index is replaced when the registry wants a TTL index on the same keys"""
+    specs = [IndexSpec("refresh_tokens", (("expires_at", 1),), expire_after_seconds=0)]
+    info = {"expires_at_1": {"key": [("expires_at", 1.0)]}, "legacy_1": {"key": [("legacy", 1)]}}
+    plan = diff_indexes(specs, info)
+    assert plan["drop"] == ["expires_at_1"]
+    assert plan["create"][0].options() == {"name": "expires_at_1", "expireAfterSeconds": 0}
+    assert plan["unknown"] == ["legacy_1"]
+
+def test_text_and_geo_indexes_are_matched():
+    """Test that special index types compare by type, with text fields taken from the weights"""
+    specs = [
+        IndexSpec("documents", (("title", "text"), ("summary", "text"))),
+        IndexSpec("documents", (("location", "2dsphere"),))
+    ]
+    info = {
+        "title_text_summary_text": {"key": [("_fts", "text"), ("_ftsx", 1)], "weights": {"summary": 1, "title": 1}},
+        "location_2dsphere": {"key": [("location", "2dsphere")]}
+    }
+    plan = diff_indexes(specs, info)
+    assert plan == {"create": [], "drop": [], "unknown": []}
+
+def test_registry_has_one_index_per_key_pattern():
+    """Test that no two registry entries define the same index"""
+    keys = [(spec.collection, spec.keys) for spec in INDEXES]
+    assert len(keys) == len(set(keys))
+
+def test_every_query_shape_leads_with_an_indexed_field():
+    """Test that each query shape filters on the first field of some registry index"""
+    leading = {(spec.collection, spec.keys[0][0]) for spec in INDEXES}
+    for shape in QUERY_SHAPES:
+        assert any((shape["collection"], field) in leading for field in shape["filter"]), shape
+
+def test_find_plan_stages_walks_nested_plans():
+    """Test that stages are collected from classic and slot-based explain output"""
+    plan = {"queryPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "id_1"}}}
+    assert sorted(find_plan_stages(plan), key=str) == [("FETCH", None), ("IXSCAN", "id_1")]
+    assert find_plan_stages({"stage": "OR", "inputStages": [{"stage": "COLLSCAN"}]})[-1] == ("COLLSCAN", None)
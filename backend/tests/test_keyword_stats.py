@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("motor")
+
+from app.db import keyword_stats as keyword_stats_module
+from app.db.keyword_stats import KeywordStats, NUM_DOCUMENTS_ID
+
+class FakeStatsCollection:
+    """A keyword_stats collection applying $inc upserts."""
+    
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+        self.writes = 0
+        self.reads = 0
+    
+    async def bulk_write(self, operations, ordered=True):
+        self.writes += 1
+        for operation in operations:
+            key = operation._filter["_id"]
+            self.counts[key] = self.counts.get(key, 0) + operation._doc["$inc"]["df"]
+    
+    def find(self, query, projection=None):
+        self.reads += 1
+        async def entries():
+            for key, count in self.counts.items():
+                yield {"_id": key, "df": count}
+        return entries()
+
+def test_extraction_uses_memory_between_syncs(monkeypatch):
+    """Test that documents and extractions within the sync interval don't touch MongoDB"""
+    collection = FakeStatsCollection({"report": 50, NUM_DOCUMENTS_ID: 50})
+    monkeypatch.setattr(keyword_stats_module.mongodb, "get_collection", lambda name: collection)
+    stats = KeywordStats(sync_interval=3600)
+    
+    async def run():
+        tags = await stats.extract("report about whales and whale migration report", max_tags=2)
+        for _ in range(100):
+            await stats.add_document("whale migration")
+        return tags
+    
+    tags = asyncio.run(run())
+    assert "report" not in tags
+    assert collection.reads == 1 and collection.writes == 0
+    assert stats.pending_documents == 100
+
+def test_sync_saves_buffered_counts_and_loads_totals(monkeypatch):
+    """Test that a sync writes one bulk_write and picks up counts from other processes"""
+    collection = FakeStatsCollection()
+    monkeypatch.setattr(keyword_stats_module.mongodb, "get_collection", lambda name: collection)
+    stats = KeywordStats(sync_interval=3600)
+    
+    async def run():
+        await stats.sync()
+        await stats.add_document("alpha beta")
+        await stats.add_document("alpha gamma")
+        collection.counts["delta"] = 7  # Counted by another process
+        await stats.sync()
+    
+    asyncio.run(run())
+    assert collection.writes == 1
+    assert collection.counts == {"alpha": 2, "beta": 1, "gamma": 1, NUM_DOCUMENTS_ID: 2, "delta": 7}
+    extractor = stats.extractor
+    assert extractor.num_documents == 2
+    assert extractor.doc_freq[extractor.vocabulary["delta"]] == 7
+    assert stats.pending_documents == 0
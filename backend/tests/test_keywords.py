@@ -0,0 +1,41 @@
+from app.core.keywords import KeywordExtractor, tokenize
+
+def test_tokenize_drops_stop_words_and_short_tokens():
+    """Test that tokenization lowercases and removes stop words"""
+    assert tokenize("The Whale and the Sea, by an old sailor.") == ["whale", "sea", "old", "sailor"]
+
+def test_tokenize_keeps_non_latin_scripts():
+    """Test that accented, Cyrillic and Hangul words are kept"""
+    assert tokenize("Café crème über Москва") == ["café", "crème", "über", "москва"]
+    assert tokenize("한국 경제 성장률 3") == ["한국", "경제", "성장률"]
+
+def test_common_corpus_terms_rank_below_distinctive_terms():
+    """Test that IDF pushes terms found in every document down"""
+    extractor = KeywordExtractor(initial_capacity=2)
+    for i in range(50):
+        extractor.add_document(f"report number {i} about quarterly report results")
+    extractor.add_document("report about whales and whale migration")
+    
+    tags = extractor.extract("report about whales and whale migration report", max_tags=2)
+    assert "report" not in tags
+    assert set(tags) <= {"whales", "whale", "migration"}
+    assert len(extractor.vocabulary) <= len(extractor.doc_freq)
+
+def test_extract_without_corpus_uses_term_frequency():
+    """Test that an empty corpus still ranks by frequency"""
+    assert KeywordExtractor().extract("ocean ocean ocean river river lake", max_tags=2) == ["ocean", "river"]
+    assert KeywordExtractor().extract("the and of") == []
+
+def test_save_and_load_round_trip(tmp_path):
+    """Test that corpus statistics survive a save and load"""
+    extractor = KeywordExtractor()
+    extractor.add_document("alpha beta gamma")
+    extractor.add_document("alpha delta")
+    path = str(tmp_path / "stats.npz")
+    extractor.save(path)
+    
+    loaded = KeywordExtractor.load(path)
+    assert loaded.num_documents == 2
+    assert loaded.vocabulary == extractor.vocabulary
+    assert loaded.doc_freq[loaded.vocabulary["alpha"]] == 2
+    assert loaded.extract("alpha delta delta") == extractor.extract("alpha delta delta")
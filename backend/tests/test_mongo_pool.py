@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("motor")
+
+from app.db.mongo import PoolMetricsListener, _parse_collection_options
+
+def test_parse_collection_options():
+    """Test that per-collection settings are parsed, ignoring blanks and malformed items"""
+    assert _parse_collection_options("documents=secondaryPreferred, users = primary,,bad") == {
+        "documents": "secondaryPreferred",
+        "users": "primary"
+    }
+    assert _parse_collection_options("") == {}
+
+def test_pool_listener_tracks_usage():
+    """Test that checkouts, checkins and failures update the per-server pool counters"""
+    listener = PoolMetricsListener()
+    event = SimpleNamespace(address=("mongo", 27017))
+    listener.connection_created(event)
+    listener.connection_created(event)
+    for _ in range(2):
+        listener.connection_check_out_started(event)
+        listener.connection_checked_out(event)
+    listener.connection_checked_in(event)
+    listener.connection_check_out_started(event)
+    listener.connection_check_out_failed(event)
+    
+    pool = listener.get_metrics(max_pool_size=4)["mongo:27017"]
+    assert pool["open"] == 2
+    assert pool["in_use"] == 1
+    assert pool["waiting"] == 0
+    assert pool["checkouts"] == 2
+    assert pool["checkout_failures"] == 1
+    assert pool["utilization"] == 0.25
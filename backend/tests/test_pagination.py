@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.pagination import encode_cursor, decode_cursor, keyset_filter
+
+def test_cursor_round_trip():
+    """Test that a cursor decodes to the sort key of the document it was built from"""
+    document = {"id": "doc-42", "created_at": datetime(2024, 5, 1, 12, 30, 15, 123000), "title": "ignored"}
+    cursor = encode_cursor(document)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == {"created_at": document["created_at"], "id": "doc-42"}
+
+def test_keyset_filter_breaks_ties_on_id():
+    """Test that the next page starts after the cursor, using id among equal timestamps"""
+    created_at = datetime(2024, 5, 1)
+    query = keyset_filter(encode_cursor({"id": "b", "created_at": created_at}))
+    assert query == {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": "b"}},
+        {"created_at": None}
+    ]}
+    assert keyset_filter(None) == {}
+
+def test_cursor_for_document_without_created_at():
+    """Test that undated documents, which sort last, paginate by id"""
+    cursor = encode_cursor({"id": "c"})
+    assert decode_cursor(cursor) == {"created_at": None, "id": "c"}
+    assert keyset_filter(cursor) == {"created_at": None, "id": {"$lt": "c"}}
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", "eyJpZCI6ICJ4In0"])
+def test_malformed_cursor_is_rejected(cursor):
+    """Test that garbage, empty and incomplete cursors raise ValueError"""
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
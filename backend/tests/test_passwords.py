@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from app.core.passwords import PasswordHasher, HasherOverloaded
+
+class SlowContext:
+    """Stand-in for a CryptContext that records how many calls overlap."""
+    
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.threads = set()
+    
+    def _work(self):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+    
+    def hash(self, password):
+        self._work()
+        return f"hashed:{password}"
+    
+    def verify(self, password, hashed):
+        self._work()
+        return hashed == f"hashed:{password}"
+
+def test_hashing_runs_in_pool_within_concurrency_cap():
+    """Test that operations run on the hasher's threads, at most max_workers at once"""
+    context = SlowContext()
+    hasher = PasswordHasher(context, max_workers=2, max_queue=10)
+    
+    async def run():
+        return await asyncio.gather(*(hasher.hash(f"pw{i}") for i in range(6)))
+    
+    hashes = asyncio.run(run())
+    assert hashes == [f"hashed:pw{i}" for i in range(6)]
+    assert context.max_running == 2
+    assert all(name.startswith("password-hasher") for name in context.threads)
+    
+    metrics = hasher.get_metrics()
+    assert metrics["completed"] == 6
+    assert metrics["active"] == 0 and metrics["waiting"] == 0
+    assert metrics["max_wait_ms"] > 0
+
+def test_event_loop_stays_responsive():
+    """Test that the loop keeps running other tasks while hashes are computed"""
+    hasher = PasswordHasher(SlowContext(delay=0.1), max_workers=1)
+    
+    async def run():
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        task = asyncio.create_task(ticker())
+        assert await hasher.verify("pw", "hashed:pw")
+        task.cancel()
+        return ticks
+    
+    assert asyncio.run(run()) >= 5
+
+def test_full_queue_rejects_work():
+    """Test that operations beyond the queue limit fail fast"""
+    hasher = PasswordHasher(SlowContext(), max_workers=1, max_queue=2)
+    
+    async def run():
+        return await asyncio.gather(*(hasher.hash("pw") for _ in range(5)), return_exceptions=True)
+    
+    results = asyncio.run(run())
+    rejected = [result for result in results if isinstance(result, HasherOverloaded)]
+    # One running, two waiting, the rest rejected
+    assert len(rejected) == 2
+    assert hasher.get_metrics()["rejected"] == 2
+
+def test_rehash_on_cost_change():
+    """Test that verify_and_update upgrades hashes made with another bcrypt cost"""
+    pytest.importorskip("passlib")
+    from passlib.context import CryptContext
+    
+    old = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4)
+    new = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=5, bcrypt__min_rounds=5, bcrypt__max_rounds=5)
+    hasher = PasswordHasher(new, max_workers=1)
+    old_hash = old.hash("secret")
+    
+    valid, new_hash = asyncio.run(hasher.verify_and_update("secret", old_hash))
+    assert valid and new_hash and new.verify("secret", new_hash)
+    assert asyncio.run(hasher.verify_and_update("secret", new_hash)) == (True, None)
+    assert asyncio.run(hasher.verify_and_update("wrong", old_hash)) == (False, None)
@@ -0,0 +1,56 @@
+from app.core.pipeline import (
+    PIPELINE_STAGES, compute_content_hash, compute_stage_fingerprints,
+    get_stale_stages, fingerprint_updates, completed_stages
+)
+
+VERSIONS = {"summary": "1", "tags": "1", "embedding": "sentence-transformers/all-MiniLM-L6-v2"}
+
+def test_new_document_runs_all_stages():
+    """Test that a document without fingerprints runs every stage"""
+    fingerprints = compute_stage_fingerprints(compute_content_hash("hello world"), VERSIONS)
+    assert get_stale_stages({}, fingerprints) == set(PIPELINE_STAGES)
+
+def test_unchanged_document_runs_no_stages():
+    """Test that a document with current fingerprints is skipped"""
+    fingerprints = compute_stage_fingerprints(compute_content_hash("hello world"), VERSIONS)
+    document = {"stage_fingerprints": dict(fingerprints)}
+    assert get_stale_stages(document, fingerprints) == set()
+    assert get_stale_stages(document, fingerprints, force=True) == set(PIPELINE_STAGES)
+
+def test_embedding_model_change_only_reruns_embedding():
+    """Test that changing the embedding model only invalidates the embedding stage"""
+    content_hash = compute_content_hash("hello world")
+    document = {"stage_fingerprints": compute_stage_fingerprints(content_hash, VERSIONS)}
+    fingerprints = compute_stage_fingerprints(content_hash, {**VERSIONS, "embedding": "other-model"})
+    assert get_stale_stages(document, fingerprints) == {"embedding"}
+
+def test_content_change_reruns_all_stages():
+    """Test that changing the content invalidates every stage"""
+    document = {"stage_fingerprints": compute_stage_fingerprints(compute_content_hash("hello"), VERSIONS)}
+    fingerprints = compute_stage_fingerprints(compute_content_hash("hello world"), VERSIONS)
+    assert get_stale_stages(document, fingerprints) == set(PIPELINE_STAGES)
+
+def test_failed_stage_is_retried():
+    """Test that a stage without a recorded fingerprint is rerun"""
+    fingerprints = compute_stage_fingerprints(compute_content_hash("hello world"), VERSIONS)
+    updates = fingerprint_updates(fingerprints, {"tags", "embedding"})
+    assert updates == {
+        "stage_fingerprints.tags": fingerprints["tags"],
+        "stage_fingerprints.embedding": fingerprints["embedding"]
+    }
+    document = {"stage_fingerprints": {key.split(".")[1]: value for key, value in updates.items()}}
+    assert get_stale_stages(document, fingerprints) == {"summary"}
+
+def test_fallback_output_leaves_stage_stale():
+    """Test that a stage answered by the local fallback is not fingerprinted"""
+    fingerprints = compute_stage_fingerprints(compute_content_hash("hello world"), VERSIONS)
+    outputs = {"summary": "extractive summary", "tags": ["hello"]}
+    completed = completed_stages(outputs, {"summary": "No LLM provider could summarize the text"})
+    assert completed == {"tags"}
+    document = {"stage_fingerprints": {stage: fingerprints[stage] for stage in completed | {"embedding"}}}
+    assert get_stale_stages(document, fingerprints) == {"summary"}
+
+def test_deferred_stage_is_not_fingerprinted():
+    """Test that a stage deferred for lack of a provider stays stale without being an error"""
+    outputs = {"summary": "extractive summary", "tags": ["hello"]}
+    assert completed_stages(outputs, {}, deferred={"tags"}) == {"summary"}
@@ -0,0 +1,168 @@
+import asyncio
+import pytest
+
+from app.core.provider_scheduler import (
+    TokenBucket, CircuitBreaker, ProviderScheduler, ProviderError, ProviderUnavailable
+)
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+    
+    async def sleep(self, seconds):
+        self.now += seconds
+
+def make_scheduler(clock, **kwargs):
+    options = {"max_retries": 2, "base_delay": 1.0, "max_delay": 4.0, "max_wait": 10.0,
+               "failure_threshold": 3, "reset_timeout": 30.0}
+    options.update(kwargs)
+    scheduler = ProviderScheduler(clock=clock, sleep=clock.sleep, **options)
+    scheduler.register("deepseek", requests_per_minute=60)
+    return scheduler
+
+def test_token_bucket_limits_rate():
+    """Test that the token bucket hands out tokens at the configured rate"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=2.0, clock=clock)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.try_acquire() == 0
+
+def test_token_bucket_block():
+    """Test that a blocked bucket waits out the Retry-After period"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10.0, capacity=10.0, clock=clock)
+    bucket.block(5)
+    assert bucket.try_acquire() == pytest.approx(5)
+    clock.now += 5
+    assert bucket.try_acquire() == 0
+
+def test_circuit_breaker_opens_and_probes():
+    """Test the closed -> open -> half-open -> closed cycle"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_scheduler_retries_with_retry_after():
+    """Test that a 429 is retried after the Retry-After delay"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    attempts = []
+    
+    async def flaky():
+        attempts.append(clock.now)
+        if len(attempts) == 1:
+            raise ProviderError("rate limited", status_code=429, retry_after=3)
+        return "ok"
+    
+    assert asyncio.run(scheduler.call("deepseek", flaky)) == "ok"
+    assert attempts[1] - attempts[0] >= 3
+    metrics = scheduler.get_metrics()["deepseek"]
+    assert metrics["retries"] == 1
+    assert metrics["successes"] == 1
+
+def test_scheduler_fails_over_on_long_retry_after():
+    """Test that a Retry-After longer than max_wait skips the provider"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    
+    async def throttled():
+        raise ProviderError("rate limited", status_code=429, retry_after=120)
+    
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(scheduler.call("deepseek", throttled))
+    assert clock.now == 0
+
+def test_scheduler_short_circuits_open_provider():
+    """Test that a tripped circuit skips the provider without calling it"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock, max_retries=0, failure_threshold=2)
+    calls = []
+    
+    async def failing():
+        calls.append(1)
+        raise ProviderError("server error", status_code=500)
+    
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            asyncio.run(scheduler.call("deepseek", failing))
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(scheduler.call("deepseek", failing))
+    
+    assert len(calls) == 2
+    metrics = scheduler.get_metrics()["deepseek"]
+    assert metrics["state"] == CircuitBreaker.OPEN
+    assert metrics["short_circuited"] == 1
+    assert metrics["transitions"][CircuitBreaker.OPEN] == 1
+
+def test_scheduler_does_not_retry_client_errors():
+    """Test that non-retryable errors are raised immediately"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    calls = []
+    
+    async def bad_request():
+        calls.append(1)
+        raise ProviderError("bad request", status_code=400, retryable=False)
+    
+    with pytest.raises(ProviderError):
+        asyncio.run(scheduler.call("deepseek", bad_request))
+    assert len(calls) == 1
+
+def test_client_errors_do_not_open_the_circuit():
+    """Test that non-retryable 4xx responses are not counted against the provider"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    
+    async def bad_request():
+        raise ProviderError("bad request", status_code=400, retryable=False)
+    
+    for _ in range(5):
+        with pytest.raises(ProviderError):
+            asyncio.run(scheduler.call("deepseek", bad_request))
+    metrics = scheduler.get_metrics()["deepseek"]
+    assert metrics["state"] == CircuitBreaker.CLOSED
+    assert metrics["failures"] == 5 and metrics["retries"] == 0
+
+def test_rejected_key_opens_the_circuit():
+    """Test that 401 responses count against the provider, unlike other client errors"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    
+    async def unauthorized():
+        raise ProviderError("invalid key", status_code=401, retryable=False)
+    
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            asyncio.run(scheduler.call("deepseek", unauthorized))
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(scheduler.call("deepseek", unauthorized))
+
+def test_unexpected_exceptions_do_not_open_the_circuit():
+    """Test that errors raised outside the provider protocol leave the circuit closed"""
+    clock = FakeClock()
+    scheduler = make_scheduler(clock)
+    
+    async def broken():
+        raise KeyError("choices")
+    
+    for _ in range(5):
+        with pytest.raises(KeyError):
+            asyncio.run(scheduler.call("deepseek", broken))
+    assert scheduler.get_metrics()["deepseek"]["state"] == CircuitBreaker.CLOSED
@@ -0,0 +1,60 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("qdrant_client")
+
+from app.core import recommendations
+from app.core.recommendations import UserCentroids, update_running_mean
+
+def test_running_mean_matches_full_recomputation():
+    """Test that incremental adds and removes give the same centroid as averaging from scratch"""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(6, 4)).astype(np.float32)
+    
+    mean, count = update_running_mean(None, 0, added=list(vectors[:4]))
+    mean, count = update_running_mean(mean, count, added=list(vectors[4:]), removed=[vectors[1]])
+    
+    assert count == 5
+    assert mean.dtype == np.float32
+    np.testing.assert_allclose(mean, np.delete(vectors, 1, axis=0).mean(axis=0), rtol=1e-5)
+
+def test_running_mean_empties_when_last_vector_removed():
+    """Test that removing every vector drops the centroid"""
+    vector = np.ones(4, dtype=np.float32)
+    assert update_running_mean(vector, 1, removed=[vector]) == (None, 0)
+
+class SlowCentroidStore:
+    """Qdrant stand-in that yields between reading and writing a centroid."""
+    
+    def __init__(self):
+        self.centroids = {}
+    
+    async def get_user_centroid(self, user_id):
+        await asyncio.sleep(0)
+        return self.centroids.get(user_id)
+    
+    async def store_user_centroid(self, user_id, mean, count):
+        await asyncio.sleep(0)
+        self.centroids[user_id] = (mean, count)
+
+def test_updates_lock_in_process_without_redis(monkeypatch):
+    """Test that concurrent updates without Redis are serialized instead of dropped"""
+    store = SlowCentroidStore()
+    monkeypatch.setattr(recommendations, "qdrant", store)
+    
+    def unavailable():
+        raise ConnectionError("Redis is down")
+    
+    monkeypatch.setattr(recommendations.redis_db, "get_client", unavailable)
+    centroids = UserCentroids()
+    vector = np.ones(4, dtype=np.float32)
+    
+    async def run():
+        await asyncio.gather(*(centroids.update("user-1", added=[vector]) for _ in range(10)))
+    
+    asyncio.run(run())
+    assert store.centroids["user-1"][1] == 10
+    assert centroids.local_locks == {}
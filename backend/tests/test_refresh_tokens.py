@@ -0,0 +1,127 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("motor")
+pytest.importorskip("redis")
+pytest.importorskip("fastapi")
+
+from app.core import refresh_tokens
+from app.core.refresh_tokens import MongoRefreshTokenStore, RedisRefreshTokenStore
+
+class FakeTokenCollection:
+    """Just enough of a Motor collection for refresh tokens, matching on token and revoked."""
+    
+    def __init__(self):
+        self.documents = []
+    
+    def _matches(self, document, query):
+        return document["token"] == query["token"] and document["revoked"] == query.get("revoked", document["revoked"])
+    
+    async def insert_one(self, document):
+        self.documents.append(dict(document))
+    
+    async def find_one_and_update(self, query, update):
+        for document in self.documents:
+            if self._matches(document, query):
+                before = dict(document)
+                document.update(update["$set"])
+                return before
+        return None
+    
+    async def update_one(self, query, update):
+        class Result:
+            modified_count = 0
+        for document in self.documents:
+            if self._matches(document, query):
+                document.update(update["$set"])
+                Result.modified_count = 1
+                break
+        return Result
+    
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            query, update = operation._filter, operation._doc
+            matches = [document for document in self.documents if document["token"] == query["token"]]
+            for document in matches:
+                document.update(update.get("$set", {}))
+            if not matches and operation._upsert:
+                self.documents.append(dict(update["$setOnInsert"]))
+
+class UnavailableRedis:
+    def __getattr__(self, name):
+        raise ConnectionError("Redis is down")
+
+def test_rotated_token_can_only_be_used_once(monkeypatch):
+    """Test that rotation revokes the old token and issues a new one for the same user"""
+    collection = FakeTokenCollection()
+    monkeypatch.setattr(refresh_tokens.mongodb, "get_collection", lambda name: collection)
+    store = MongoRefreshTokenStore(timedelta(days=7))
+    token = store.new_token("user-1", user_agent="browser")
+    asyncio.run(store.issue(token))
+    
+    old_token, new_token = asyncio.run(store.rotate(token.token, user_agent="browser"))
+    assert old_token.id == token.id
+    assert new_token.user_id == "user-1" and new_token.token != token.token
+    assert asyncio.run(store.rotate(token.token)) is None
+    assert asyncio.run(store.rotate(new_token.token)) is not None
+
+def test_redis_store_fails_closed_while_redis_is_down(monkeypatch):
+    """Test that tokens are still issued to MongoDB but not refreshed while Redis is unavailable"""
+    collection = FakeTokenCollection()
+    monkeypatch.setattr(refresh_tokens.mongodb, "get_collection", lambda name: collection)
+    monkeypatch.setattr(refresh_tokens.redis_db, "get_client", lambda: UnavailableRedis())
+    store = RedisRefreshTokenStore(timedelta(days=7))
+    token = store.new_token("user-1")
+    asyncio.run(store.issue(token))
+    
+    assert len(collection.documents) == 1
+    assert asyncio.run(store.rotate(token.token)) is None
+    assert collection.documents[0]["revoked"] is False
+
+class ScriptedRedis:
+    """Redis holding fixed token values, accepting every script."""
+    
+    def __init__(self, values):
+        self.values = values
+    
+    async def get(self, key):
+        return self.values.get(key)
+    
+    def register_script(self, source):
+        async def run(keys, args):
+            return 1 if "PTTL" in source and "SADD" in source else None
+        return run
+
+def test_redis_rotation_reaches_mongo_on_flush(monkeypatch):
+    """Test that a Redis rotation doesn't touch MongoDB until the buffered writes are flushed"""
+    collection = FakeTokenCollection()
+    monkeypatch.setattr(refresh_tokens.mongodb, "get_collection", lambda name: collection)
+    store = RedisRefreshTokenStore(timedelta(days=7))
+    token = store.new_token("user-1")
+    collection.documents.append(token.dict())
+    redis_client = ScriptedRedis({store._token_key(token.token): store._serialize(token).encode("utf-8")})
+    monkeypatch.setattr(refresh_tokens.redis_db, "get_client", lambda: redis_client)
+    
+    old_token, new_token = asyncio.run(store.rotate(token.token))
+    assert old_token.id == token.id
+    assert len(collection.documents) == 1 and collection.documents[0]["revoked"] is False
+    
+    assert asyncio.run(store.flush()) == 2
+    assert [document["revoked"] for document in collection.documents] == [True, False]
+    assert collection.documents[1]["token"] == new_token.token
+    assert asyncio.run(store.flush()) == 0
+
+def test_token_missing_from_redis_is_read_from_mongo(monkeypatch):
+    """Test that tokens issued before the switch to Redis are still accepted"""
+    collection = FakeTokenCollection()
+    monkeypatch.setattr(refresh_tokens.mongodb, "get_collection", lambda name: collection)
+    monkeypatch.setattr(refresh_tokens.redis_db, "get_client", lambda: ScriptedRedis({}))
+    store = RedisRefreshTokenStore(timedelta(days=7))
+    token = store.new_token("user-1")
+    collection.documents.append(token.dict())
+    
+    rotated = asyncio.run(store.rotate(token.token))
+    assert rotated is not None and rotated[1].user_id == "user-1"
+    assert collection.documents[0]["revoked"] is True
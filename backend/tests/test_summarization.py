@@ -0,0 +1,76 @@
+import re
+
+import numpy as np
+
+from app.core.summarization import (
+    EXCERPT_SEPARATOR, count_tokens, truncate_to_budget, chunk_text, max_map_reduce_chunks, sample_chunks,
+    split_sentences, rank_sentences_mmr
+)
+
+def _document(paragraphs: int) -> str:
+    return "\n\n".join(
+        f"Paragraph {i} talks about topic {i}. It has a second sentence with more detail." for i in range(paragraphs)
+    )
+
+def test_short_text_is_not_truncated():
+    """Test that text within the budget is returned unchanged"""
+    text = _document(3)
+    assert truncate_to_budget(text, count_tokens(text)) == text
+
+def test_truncation_fits_budget_and_samples_the_whole_document():
+    """Test that long text is cut to the budget, keeping the head and excerpts from later on"""
+    text = _document(500)
+    truncated = truncate_to_budget(text, 500)
+    assert count_tokens(truncated) <= 500
+    assert truncated.startswith("Paragraph 0 ")
+    assert EXCERPT_SEPARATOR in truncated
+    last_excerpt = truncated.split(EXCERPT_SEPARATOR)[-1]
+    assert max(int(n) for n in re.findall(r"Paragraph (\d+)", last_excerpt)) > 300
+
+def test_chunks_respect_token_limit_and_keep_all_text():
+    """Test that chunking splits on paragraph boundaries without losing text"""
+    text = _document(200)
+    chunks = chunk_text(text, 300)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 300 for chunk in chunks)
+    assert all(f"Paragraph {i} " in "".join(chunks) for i in range(200))
+
+def test_oversized_paragraph_is_split():
+    """Test that a paragraph longer than a chunk is still split"""
+    chunks = chunk_text("word " * 5000, 200)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 200 for chunk in chunks)
+
+def test_chunk_cap_and_sampling():
+    """Test that the token cap limits the number of chunks and sampling keeps the first chunk"""
+    max_chunks = max_map_reduce_chunks(token_cap=10000, chunk_tokens=2000, summary_tokens=150)
+    assert max_chunks * (2000 + 2 * 150) + 150 <= 10000
+    chunks = [f"chunk {i}" for i in range(20)]
+    sampled = sample_chunks(chunks, max_chunks)
+    assert len(sampled) == max_chunks
+    assert sampled[0] == "chunk 0"
+    assert sample_chunks(chunks[:2], max_chunks) == chunks[:2]
+
+def test_split_sentences_drops_fragments():
+    """Test that sentence splitting normalizes whitespace and drops short fragments"""
+    text = "First sentence is long enough.  Ok.\nSecond   sentence is long enough too!\n\nThird one follows here?"
+    assert split_sentences(text) == [
+        "First sentence is long enough.",
+        "Second sentence is long enough too!",
+        "Third one follows here?"
+    ]
+
+def test_mmr_prefers_central_sentences_and_skips_duplicates():
+    """Test that MMR picks the central sentence first and avoids near-duplicates"""
+    embeddings = np.array([
+        [1.0, 0.0, 0.0],
+        [0.9, 0.1, 0.0],
+        [0.9, 0.1, 0.0],  # Duplicate of sentence 1
+        [0.0, 1.0, 0.0],
+        [0.0, 0.0, 1.0]
+    ])
+    ranking = rank_sentences_mmr(embeddings, diversity=0.5)
+    assert ranking[0] in (0, 1, 2)
+    assert sorted(ranking) == list(range(5))
+    assert ranking[1] not in (0, 1, 2)
+    assert len(rank_sentences_mmr(embeddings, limit=2)) == 2
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("motor")
+
+from app.db import text_store as text_store_module
+from app.db.text_store import TextStore
+
+def _matches(document, query):
+    for key, expected in query.items():
+        value = document
+        for part in key.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if isinstance(expected, dict) and "$lte" in expected:
+            if value is None or value > expected["$lte"]:
+                return False
+        elif isinstance(expected, dict) and "$exists" in expected:
+            if (value is not None) != expected["$exists"]:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+class FakeCollection:
+    """Just enough of a Motor collection for reference counters, GridFS files and documents."""
+    
+    def __init__(self):
+        self.documents = []
+    
+    async def find_one(self, query, projection=None):
+        return next((document for document in self.documents if _matches(document, query)), None)
+    
+    def find(self, query, projection=None):
+        async def matches():
+            for document in list(self.documents):
+                if _matches(document, query):
+                    yield document
+        return matches()
+    
+    async def count_documents(self, query, limit=0):
+        return sum(1 for document in self.documents if _matches(document, query))
+    
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        document = await self.find_one(query)
+        if document is None:
+            if not upsert:
+                return None
+            document = {**query, **update.get("$setOnInsert", {})}
+            self.documents.append(document)
+        for field, amount in update["$inc"].items():
+            document[field] = document.get(field, 0) + amount
+        return dict(document)
+    
+    async def delete_one(self, query):
+        class Result:
+            deleted_count = 0
+        for document in self.documents:
+            if _matches(document, query):
+                self.documents.remove(document)
+                Result.deleted_count = 1
+                break
+        return Result
+
+class FakeBucket:
+    def __init__(self, files):
+        self.files = files
+        self.next_id = 0
+    
+    async def upload_from_stream(self, filename, data, metadata=None):
+        self.next_id += 1
+        self.files.documents.append({"_id": self.next_id, "filename": filename, "metadata": metadata})
+    
+    async def delete(self, file_id):
+        self.files.documents = [file for file in self.files.documents if file["_id"] != file_id]
+
+@pytest.fixture
+def store(monkeypatch):
+    collections = {"document_texts.refs": FakeCollection(), "document_texts.files": FakeCollection(), "documents": FakeCollection()}
+    monkeypatch.setattr(text_store_module.mongodb, "get_collection", lambda name: collections[name])
+    store = TextStore()
+    store.bucket_name = "document_texts"
+    store.bucket = FakeBucket(collections["document_texts.files"])
+    return store, collections
+
+def test_text_is_deleted_with_its_last_reference(store):
+    """Test that shared text survives until every referencing document released it"""
+    store, collections = store
+    
+    async def run():
+        first = await store.put("shared text")
+        second = await store.put("shared text")
+        assert first == second
+        assert len(collections["document_texts.files"].documents) == 1
+        assert await store.put("shared text", previous_hash=first) == first  # Same document again
+        assert not await store.release(first)
+        assert await store.release(first)
+    
+    asyncio.run(run())
+    assert collections["document_texts.files"].documents == []
+    assert collections["document_texts.refs"].documents == []
+
+def test_put_after_release_stores_a_new_generation(store):
+    """Test that text stored again while its old blob is being deleted gets its own blob"""
+    store, collections = store
+    
+    async def run():
+        content_hash = await store.put("text")
+        old_generation = collections["document_texts.refs"].documents[0]["generation"]
+        # The counter reached zero and was deleted, but the old blob isn't deleted yet
+        collections["document_texts.refs"].documents.clear()
+        await store.put("text")
+        await store._delete_files({"filename": content_hash, "metadata.generation": old_generation})
+        return content_hash
+    
+    content_hash = asyncio.run(run())
+    files = collections["document_texts.files"].documents
+    assert len(files) == 1 and files[0]["filename"] == content_hash
+    assert files[0]["metadata"]["generation"] == collections["document_texts.refs"].documents[0]["generation"]
+
+def test_legacy_text_is_kept_while_referenced(store):
+    """Test that text stored before reference counting is only deleted once unreferenced"""
+    store, collections = store
+    collections["document_texts.files"].documents.append({"_id": 99, "filename": "legacy", "metadata": {"codec": "zlib"}})
+    collections["documents"].documents.append({"id": "doc-1", "content_hash": "legacy"})
+    
+    assert not asyncio.run(store.release("legacy"))
+    collections["documents"].documents.clear()
+    assert asyncio.run(store.release("legacy"))
+    assert collections["document_texts.files"].documents == []